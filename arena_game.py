@@ -0,0 +1,67 @@
+"""
+Pyxel frontend for the multiplayer arena. Start a server with python -m common.arena_server, then:
+
+    python arena_game.py [host] [port]
+"""
+
+import sys
+import pyxel, settings
+from common.arena_client import ArenaClient
+from common.asset_manager import AssetManager
+from common.renderer import LayeredRenderer, ViewportRenderer
+from snek_game import center_text
+
+class ArenaGame:
+    """Draws the grid from an arena server and sends it the player's steering. The server runs the game."""
+    def __init__(self, host: str = "127.0.0.1", port: int = settings.ARENA_PORT):
+        """Connect to the server, then open the window."""
+        self._client = ArenaClient(host, port)
+        pyxel.init(
+            width = settings.GRID_WIDTH * 8,
+            height = (settings.GRID_HEIGHT * 8) + 8,
+            title = settings.TITLE,
+            fps = settings.FPS,
+            display_scale = settings.SCALE
+            )
+        AssetManager().load_image_banks()
+        #Arenas bigger than the screen scroll with the player's snake
+        if (self._client.width, self._client.height) == (settings.GRID_WIDTH, settings.GRID_HEIGHT):
+            self._renderer = LayeredRenderer()
+        else:
+            self._renderer = ViewportRenderer()
+        self._drawn_grid = None #Grid shown on screen, a new one (from a keyframe) needs a full repaint
+        pyxel.run(self.update, self.draw)
+
+    def update(self):
+        """Sends steering and applies what the server sent."""
+        keys = ((pyxel.KEY_UP, pyxel.KEY_W, "up"), (pyxel.KEY_DOWN, pyxel.KEY_S, "down"),
+                (pyxel.KEY_LEFT, pyxel.KEY_A, "left"), (pyxel.KEY_RIGHT, pyxel.KEY_D, "right"))
+        for arrow_key, letter_key, name in keys:
+            if pyxel.btnp(arrow_key) or pyxel.btnp(letter_key):
+                self._client.steer(settings.DIRECTIONS[name])
+        if pyxel.btnp(pyxel.KEY_SPACE) and not self._client.alive:
+            self._client.respawn()
+        if not self._client.poll():
+            pyxel.quit()
+
+    def draw(self):
+        """Draws the grid, repainting everything after a keyframe and only the updated tiles otherwise."""
+        client, grid = self._client, self._client.grid
+        if grid is None:
+            return
+        moved = client.alive and self._renderer.follow(grid, client.head)
+        if self._drawn_grid is not grid or moved:
+            if self._drawn_grid is None and isinstance(self._renderer, ViewportRenderer):
+                self._renderer.center_on(grid, client.head)
+            pyxel.cls(settings.BACKGROUND_COLOR)
+            self._renderer.draw_all_tiles(grid)
+            self._drawn_grid = grid
+        else:
+            self._renderer.draw_updated_tiles(grid)
+
+        pyxel.rect(0, 0, pyxel.width, 10, 1)
+        text = f"Score: {client.score}" if client.alive else "press SPACE to respawn"
+        pyxel.text(center_text(text, pyxel.width), 3, text, pyxel.COLOR_WHITE)
+
+if __name__ == "__main__":
+    ArenaGame(*sys.argv[1:2], *(int(port) for port in sys.argv[2:3]))
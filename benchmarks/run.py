@@ -0,0 +1,324 @@
+"""
+Benchmarks for the grid, snake, item and render hot paths, plus end-to-end ticks per second and cold start time.
+Runs against a stub pyxel module, so no window is needed.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+"""
+
+import argparse, contextlib, json, os, platform, random, subprocess, sys, time
+
+# Make the game importable when run as a script, and draw into the stub instead of a window
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchmarks.stub_pyxel as stub_pyxel
+sys.modules["pyxel"] = stub_pyxel
+
+import settings
+import common.item_manager as item_manager
+import common.utils as utils
+from common.arena import Arena
+from common.assets import PyxresTilemap
+from common.engine import SnekEngine
+from common.grid import Grid, TILE_CODES
+from common.item_manager import ItemManager
+from common.level_cache import LevelCache
+from common.policies import Autopilot, cautious
+from common.renderer import GridRenderer, LayeredRenderer, ViewportRenderer
+from common.snake import Snake
+
+GRID_SIZES = (32, 64, 128, 256, 512)
+QUICK_GRID_SIZES = (32, 128)
+SNAKE_FILLS = (0.0, 0.5, 0.9) #Snake length as a fraction of the grid, on top of the starting length
+DEFAULT_THRESHOLD = 0.2 #Relative slowdown that counts as a regression
+
+def measure(function, number: int, repeat: int = 5) -> float:
+    """Returns the best time per call in seconds over several runs of number calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def result(seconds_per_op: float, **counts) -> dict:
+    """Builds a result entry. Extra counts (e.g. blits) are compared exactly."""
+    return {"seconds_per_op": seconds_per_op, "ops_per_second": 1 / seconds_per_op if seconds_per_op else None, **counts}
+
+def cycle_directions(grid: Grid) -> list:
+    """Returns, for every grid index, the direction to move along a cycle that visits every tile.
+    The cycle runs up column 0 and snakes back and forth across the remaining columns, so a snake
+    started on column 0 facing up can follow it forever. Needs an even grid height."""
+    up, right, down, left = (settings.DIRECTIONS[name] for name in ("up", "right", "down", "left"))
+    directions = [up] * grid.total_tiles
+    for y in range(grid.height):
+        going_right = y % 2 == 0
+        for x in range(1, grid.width):
+            index = grid.index(x, y)
+            if going_right:
+                directions[index] = right if x < grid.width - 1 else down
+            else:
+                directions[index] = left if x > 1 else down
+        directions[grid.index(0, y)] = right if y == 0 else up
+    directions[grid.index(1, grid.height - 1)] = left #The last row returns to column 0
+    return directions
+
+class NoLevels:
+    """Level source for OpenFieldEngine, which never loads a level."""
+    def get(self, level: int):
+        raise KeyError(level)
+
+class OpenFieldEngine(SnekEngine):
+    """Engine on an empty grid of any size, with the snake on column 0 of cycle_directions()."""
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        super().__init__(levels = NoLevels(), seed = seed)
+    def initialize_grid(self, level: int) -> Grid:
+        return Grid(None, self.size, self.size)
+    def initialize_snake(self) -> Snake:
+        return Snake(self.grid, utils.Point(0, self.size - settings.SNAKE_START_LENGTH - 2))
+
+def grow_along_cycle(engine: SnekEngine, directions: list, extra_length: int):
+    """Grows the snake by extra_length tiles while following the cycle."""
+    for _ in range(extra_length):
+        engine.snake.move_forward(directions[engine.snake.head], elongate_snake = True)
+
+def bench_update_tile(results: dict, quick: bool):
+    rng = random.Random(1)
+    grid = Grid(None, 64, 64)
+    cells = [(rng.randrange(64), rng.randrange(64)) for _ in range(1024)]
+    tile_types = ["item_apple", "empty", "wall", "empty"]
+    state = {"i": 0}
+    def update_tile():
+        i = state["i"] = (state["i"] + 1) & 1023
+        grid.update_tile(*cells[i], tile_types[i & 3])
+    results["grid.update_tile"] = result(measure(update_tile, 2000 if quick else 20000))
+    def set_tile():
+        i = state["i"] = (state["i"] + 1) & 1023
+        grid.set_tile(i, i & 1)
+    results["grid.set_tile"] = result(measure(set_tile, 2000 if quick else 20000))
+
+def bench_neighbors(results: dict, quick: bool):
+    grid = Grid(None, 64, 64)
+    tiles = [grid.tile_at(i) for i in range(grid.total_tiles)]
+    state = {"i": 0}
+    def get_neighbor():
+        i = state["i"] = (state["i"] + 1) % grid.total_tiles
+        grid.get_neighbor(tiles[i], i & 3)
+    results["grid.get_neighbor"] = result(measure(get_neighbor, 2000 if quick else 20000))
+    def neighbor():
+        i = state["i"] = (state["i"] + 1) % grid.total_tiles
+        grid.neighbor(i, i & 3)
+    results["grid.neighbor"] = result(measure(neighbor, 2000 if quick else 20000))
+
+def bench_snake(results: dict, quick: bool):
+    for size in (QUICK_GRID_SIZES if quick else GRID_SIZES):
+        for fill in SNAKE_FILLS:
+            engine = OpenFieldEngine(size)
+            directions = cycle_directions(engine.grid)
+            grow_along_cycle(engine, directions, int((engine.grid.total_tiles - engine.snake.length - 1) * fill))
+            snake = engine.snake
+            def move_forward():
+                snake.move_forward(directions[snake.head])
+            results[f"snake.move_forward[{size}x{size},fill={fill}]"] = result(
+                measure(move_forward, 1000 if quick else 5000), length = snake.length)
+
+def bench_items(results: dict, quick: bool):
+    grid = Grid(None, 64, 64)
+    items = ItemManager(grid, rng = random.Random(1))
+    def spawn_and_remove():
+        items.spawn_item()
+        items.remove_item(next(iter(items.items)))
+    results["item_manager.spawn_item"] = result(measure(spawn_and_remove, 2000 if quick else 20000))
+    items = ItemManager(grid, rng = random.Random(1))
+    results["item_manager.update"] = result(measure(items.update, 2000 if quick else 20000), items = len(items.items))
+
+def bench_load_level(results: dict, quick: bool):
+    tilemap = PyxresTilemap(settings.ASSET_FILE)
+    level = settings.LEVELS[settings.STARTING_LEVEL]
+    def load_level():
+        Grid(tilemap, settings.GRID_WIDTH, settings.GRID_HEIGHT, level['x'], level['y'])
+    results["grid.load_level"] = result(measure(load_level, 5 if quick else 20))
+    compiled = LevelCache().get(settings.STARTING_LEVEL)
+    grid = Grid(None, settings.GRID_WIDTH, settings.GRID_HEIGHT)
+    results["grid.load_compiled_level"] = result(measure(lambda: grid.load_compiled_level(compiled), 200 if quick else 2000))
+
+@contextlib.contextmanager
+def apples_only():
+    """Only spawns apples while active, so a snake following the cycle never dies from a bomb."""
+    items_table = item_manager.ITEM_TABLE
+    item_manager.ITEM_TABLE = utils.AliasTable({TILE_CODES["item_apple"]: 1.0})
+    try:
+        yield
+    finally:
+        item_manager.ITEM_TABLE = items_table
+
+def bench_draw(results: dict, quick: bool):
+    for prefix, renderer_class in (("renderer", GridRenderer), ("layered_renderer", LayeredRenderer)):
+        renderer = renderer_class()
+        grid = SnekEngine(seed = 1).grid
+        renderer.draw_all_tiles(grid) #Prerenders the static layer, if there is one
+        stub_pyxel.reset_calls()
+        renderer.draw_all_tiles(grid)
+        blits = stub_pyxel.calls["blt"]
+        results[f"{prefix}.draw_all_tiles"] = result(measure(lambda: renderer.draw_all_tiles(grid), 20 if quick else 100), blits = blits)
+
+        with apples_only():
+            engine = OpenFieldEngine(settings.GRID_WIDTH)
+            directions = cycle_directions(engine.grid)
+            renderer.draw_all_tiles(engine.grid)
+            def step_and_draw():
+                engine.step(directions[engine.snake.head])
+                renderer.draw_updated_tiles(engine.grid)
+            stub_pyxel.reset_calls()
+            step_and_draw()
+            blits = stub_pyxel.calls["blt"]
+            results[f"engine.step+{prefix}.draw_updated_tiles"] = result(measure(step_and_draw, 100 if quick else 500), blits = blits)
+
+def bench_ticks(results: dict, quick: bool):
+    ticks, repeat = (200, 3) if quick else (1000, 5)
+    with apples_only():
+        for size in (QUICK_GRID_SIZES if quick else GRID_SIZES):
+            for fill in SNAKE_FILLS:
+                engine = OpenFieldEngine(size)
+                directions = cycle_directions(engine.grid)
+                # Leave room for every apple that spawns during the run, so the snake never fills the grid
+                room = engine.grid.total_tiles - engine.snake.length - 1
+                apples = ticks * repeat // engine.item_manager.spawn_interval + 2
+                grow_along_cycle(engine, directions, min(int(room * fill), room - apples))
+                def step():
+                    engine.step(directions[engine.snake.head])
+                seconds_per_tick = measure(step, ticks, repeat)
+                assert not engine.game_over
+                results[f"engine.step[{size}x{size},fill={fill}]"] = result(seconds_per_tick, length = engine.snake.length)
+
+def bench_autopilot(results: dict, quick: bool):
+    ticks, repeat = (100, 2) if quick else (300, 3)
+    with apples_only():
+        for size in (QUICK_GRID_SIZES if quick else GRID_SIZES):
+            engine = OpenFieldEngine(size)
+            autopilot = Autopilot()
+            def step():
+                engine.step(autopilot(engine))
+            step()
+            results[f"autopilot+engine.step[{size}x{size}]"] = result(measure(step, ticks, repeat), score = engine.score)
+            # What planning would cost per tick without the incremental updates
+            results[f"distance_field.rebuild[{size}x{size}]"] = result(measure(autopilot.field.rebuild, 2 if quick else 5, 2))
+
+WORLD_SIZES = (256, 1024, 4096)
+QUICK_WORLD_SIZES = (256, 1024)
+
+def bench_world(results: dict, quick: bool):
+    """Big chunked worlds, which should cost the same per tick and per frame whatever their size."""
+    for size in (QUICK_WORLD_SIZES if quick else WORLD_SIZES):
+        engine = SnekEngine(seed = 1, world_size = (size, size))
+        renderer = ViewportRenderer()
+        renderer.center_on(engine.grid, engine.snake.head)
+        renderer.draw_all_tiles(engine.grid)
+        def step_and_draw():
+            if engine.game_over:
+                engine.reset(engine.level)
+            engine.step(cautious(engine))
+            if renderer.follow(engine.grid, engine.snake.head):
+                renderer.draw_all_tiles(engine.grid)
+            else:
+                renderer.draw_updated_tiles(engine.grid)
+        stub_pyxel.reset_calls()
+        seconds_per_tick = measure(step_and_draw, 200 if quick else 1000, 3)
+        results[f"world.step+draw[{size}x{size}]"] = result(seconds_per_tick, chunks = engine.grid.allocated_chunks())
+
+def bench_snapshot(results: dict, quick: bool):
+    """Packing and restoring the full game state, e.g. every tick for rewinding."""
+    for size in (QUICK_GRID_SIZES if quick else GRID_SIZES):
+        engine = OpenFieldEngine(size)
+        grow_along_cycle(engine, cycle_directions(engine.grid), (engine.grid.total_tiles - engine.snake.length - 1) // 2)
+        snapshot = engine.snapshot()
+        results[f"engine.snapshot[{size}x{size}]"] = result(measure(engine.snapshot, 100 if quick else 1000), bytes = len(snapshot))
+        results[f"engine.restore[{size}x{size}]"] = result(measure(lambda: engine.restore(snapshot), 100 if quick else 1000))
+
+ARENA_BOTS = ((64, 60), (256, 500)) #Arena size, bot snakes
+QUICK_ARENA_BOTS = ((256, 500),)
+
+def bench_arena(results: dict, quick: bool):
+    """Headless multi-snake arenas full of bots, stepping every snake at once."""
+    for size, bots in (QUICK_ARENA_BOTS if quick else ARENA_BOTS):
+        arena = Arena(size, size, seed = 1, track_updates = False)
+        arena.add_bots(bots)
+        seconds_per_tick = measure(arena.step, 200 if quick else 1000, 3)
+        results[f"arena.step[{size}x{size},bots={bots}]"] = result(seconds_per_tick)
+
+def bench_startup(results: dict, quick: bool):
+    """Cold start of a headless game in a fresh interpreter, from launch to the end of its first tick."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-m", "snek", "--headless", "--ticks", "1", "--seed", "1"]
+    run_game = lambda: subprocess.run(command, cwd = root, check = True, stdout = subprocess.DEVNULL)
+    run_game() #Compile the level cache and bytecode first, they're only built once
+    results["startup.headless"] = result(measure(run_game, 1, 5 if quick else 20))
+
+BENCHMARKS = (bench_update_tile, bench_neighbors, bench_snake, bench_items, bench_load_level, bench_draw, bench_ticks,
+              bench_autopilot, bench_world, bench_snapshot, bench_arena, bench_startup)
+
+def run(quick: bool = False) -> dict:
+    """Runs every benchmark and returns the results with some details about the machine."""
+    results = {}
+    for benchmark in BENCHMARKS:
+        benchmark(results, quick)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Prints current results against a baseline and returns the names of the benchmarks that regressed.
+    Timings regress when they are more than threshold slower; counts regress when they go up at all."""
+    regressions = []
+    print(f"{'benchmark':<55} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, entry in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<55} {'-':>12} {entry['seconds_per_op'] * 1e6:>10.2f}us {'new':>8}")
+            continue
+        change = entry["seconds_per_op"] / old["seconds_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            flag = " SLOWER"
+            regressions.append(name)
+        for count in ("blits",):
+            if count in entry and count in old and entry[count] > old[count]:
+                flag += f" {count} {old[count]} -> {entry[count]}"
+                regressions.append(name)
+        print(f"{name:<55} {old['seconds_per_op'] * 1e6:>10.2f}us {entry['seconds_per_op'] * 1e6:>10.2f}us {change:>+8.1%}{flag}")
+    return regressions
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help = "write results to this JSON file")
+    parser.add_argument("--compare", metavar = "BASELINE", help = "compare against a stored results file and fail on regressions")
+    parser.add_argument("--threshold", type = float, default = DEFAULT_THRESHOLD,
+                        help = "relative slowdown that counts as a regression (default %(default)s)")
+    parser.add_argument("--quick", action = "store_true", help = "fewer iterations and grid sizes")
+    options = parser.parse_args(arguments)
+
+    current = run(options.quick)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(current, output, indent = 2)
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            regressions = compare(current, json.load(baseline_file), options.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            return 1
+    elif not options.output:
+        json.dump(current, sys.stdout, indent = 2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
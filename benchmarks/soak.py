@@ -0,0 +1,267 @@
+"""
+Soak test: plays millions of ticks without a window, restarting after every game over like a kiosk would,
+and watches for memory creep. Every interval it samples tracemalloc and the number of live objects of each type,
+records the sizes of the game's long-lived containers and checks that the game state is still consistent.
+At the end it reports what grew and exits with 1 if an invariant broke or memory grew past --max-growth.
+
+    python -m benchmarks.soak --ticks 1000000
+    python -m benchmarks.soak --ticks 5000000 --policy random --render --rewind --output soak.json
+"""
+
+import argparse, gc, json, os, random, sys, time, tracemalloc
+from collections import Counter
+
+# Make the game importable when run as a script, and draw into the stub instead of a window
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchmarks.stub_pyxel as stub_pyxel
+sys.modules["pyxel"] = stub_pyxel
+
+import settings
+from common.engine import SnekEngine
+from common.grid import EMPTY, TILE_CODES, ANIMATION_FRAMES
+from common.policies import POLICIES, load_policy
+from common.renderer import LayeredRenderer
+from common.snapshot_ring import SnapshotRing
+
+DEFAULT_TICKS = 1000000
+DEFAULT_SAMPLES = 20 #Samples taken over the run, after the first one
+WARMUP_FRACTION = 0.05 #Share of the run played before the baseline sample, so caches and pools have filled
+TOP_GROWTH = 10 #Lines of each growth table in the report
+
+SNAKE_CODES = frozenset(TILE_CODES[tile_type] for tile_type in
+                        ("snake_head", "snake_body_straight", "snake_body_left", "snake_body_right", "snake_tail"))
+ITEM_CODES = frozenset(TILE_CODES[tile_type] for tile_type in settings.ITEM_PROBABILITY)
+
+def random_policy(rng: random.Random):
+    """Returns a policy that asks for a random direction, or nothing, every tick."""
+    choices = [None, *settings.DIRECTIONS.values()]
+    return lambda engine: rng.choice(choices)
+
+def check_invariants(engine: SnekEngine) -> list:
+    """Returns a description of everything wrong with the engine's state, or an empty list."""
+    grid, snake, items = engine.grid, engine.snake, engine.item_manager
+    problems = []
+    empty_count = grid.types.count(EMPTY)
+    occupied = grid.total_tiles - empty_count
+    if len(grid.empty_tiles) + occupied != grid.total_tiles:
+        problems.append(f"{len(grid.empty_tiles)} indexed empty tiles + {occupied} occupied != {grid.total_tiles} tiles")
+    stale = sum(1 for index in grid.empty_tiles if grid.types[index] != EMPTY)
+    if stale:
+        problems.append(f"{stale} indexed empty tiles aren't empty")
+    if engine.regions is not None:
+        region_empty = sum(engine.regions.empty_count(region) for region in range(len(engine.regions.sizes)))
+        if region_empty != empty_count:
+            problems.append(f"regions index {region_empty} empty tiles, the grid has {empty_count}")
+    cells = list(snake.cells())
+    if len(set(cells)) != snake.length or not all(snake.occupies(cell) for cell in cells):
+        problems.append(f"snake of length {snake.length} covers {len(set(cells))} distinct tiles")
+    if not engine.game_over: #Dying can overwrite the head, e.g. with an explosion
+        not_snake = sum(1 for cell in cells if grid.types[cell] not in SNAKE_CODES)
+        if not_snake:
+            problems.append(f"{not_snake} snake cells aren't snake tiles")
+        not_items = sum(1 for index in items.items if grid.types[index] not in ITEM_CODES)
+        if not_items:
+            problems.append(f"{not_items} tracked items aren't item tiles")
+    not_animated = sum(1 for index in grid.animated_tiles if not ANIMATION_FRAMES[grid.types[index]])
+    if not_animated:
+        problems.append(f"{not_animated} animations on tiles without animation frames")
+    scheduled = sum(len(due) for due in grid.animated_tiles._due.values())
+    if scheduled > len(grid.animated_tiles):
+        problems.append(f"{scheduled} scheduled animation frames for {len(grid.animated_tiles)} animations")
+    if len(grid.updated_tiles) > grid.total_tiles:
+        problems.append(f"{len(grid.updated_tiles)} updated tiles on a grid of {grid.total_tiles}")
+    despawn_limit = items.despawn_interval // items.spawn_interval + 1
+    if len(items._despawn_queue) > despawn_limit:
+        problems.append(f"{len(items._despawn_queue)} queued despawns, at most {despawn_limit} can be due")
+    return problems
+
+def container_sizes(engine: SnekEngine) -> dict:
+    """Returns the sizes of the containers that live as long as a game or longer."""
+    grid = engine.grid
+    return {
+        "grid.updated_tiles": len(grid.updated_tiles),
+        "grid.animated_tiles": len(grid.animated_tiles),
+        "grid.listeners": len(grid.listeners),
+        "items": len(engine.item_manager.items),
+        "despawn_queue": len(engine.item_manager._despawn_queue),
+        "snake.length": engine.snake.length,
+    }
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    """Returns a tracemalloc snapshot without the allocations made by the soak test and tracemalloc themselves."""
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                      tracemalloc.Filter(False, __file__)))
+def object_counts() -> Counter:
+    """Returns the number of objects tracked by the garbage collector, by type name."""
+    return Counter(type(instance).__name__ for instance in gc.get_objects())
+
+class Soak:
+    """Plays one long session and keeps the samples."""
+
+    def __init__(self, policy, level: int = settings.STARTING_LEVEL, seed: int = 0,
+                 render: bool = False, rewind: bool = False):
+        self.policy = policy
+        self.level = level
+        self.engine = SnekEngine(level = level, seed = seed)
+        self.renderer = LayeredRenderer() if render else None
+        self.history = SnapshotRing(settings.REWIND_SECONDS * settings.TICK_RATE + 1) if rewind else None
+        self.rng = random.Random(seed) #Decides when to rewind
+        self.drawn_grid = None
+        self.games = 1
+        self.rewinds = 0
+        self.samples = []
+        self.problems = [] #(tick, description) of every broken invariant
+        self._baseline_snapshot = None
+        self._baseline_objects = None
+
+    def play(self, ticks: int):
+        """Plays ticks ticks, restarting the level after each game over."""
+        engine, renderer, history = self.engine, self.renderer, self.history
+        for _ in range(ticks):
+            if engine.game_over:
+                engine.reset(self.level)
+                self.games += 1
+                if history is not None:
+                    history.clear()
+            elif history is not None and self.rng.random() < 0.001:
+                history.rollback(engine, settings.TICK_RATE)
+                self.rewinds += 1
+                self.drawn_grid = None #Restored in place, so repaint everything like the game does
+            engine.step(self.policy(engine))
+            if history is not None:
+                history.push(engine)
+            if renderer is not None:
+                if self.drawn_grid is not engine.grid:
+                    renderer.draw_all_tiles(engine.grid)
+                    self.drawn_grid = engine.grid
+                else:
+                    renderer.draw_updated_tiles(engine.grid)
+        stub_pyxel.reset_calls()
+
+    def sample(self, started: float):
+        """Records memory use, object counts and container sizes, and checks the invariants."""
+        gc.collect()
+        for problem in check_invariants(self.engine):
+            self.problems.append((self.engine.tick, problem))
+        current, peak = tracemalloc.get_traced_memory()
+        if self._baseline_snapshot is None:
+            self._baseline_snapshot = take_snapshot()
+        objects = object_counts()
+        if self._baseline_objects is None:
+            self._baseline_objects = objects
+        self.samples.append({
+            "tick": self.engine.tick,
+            "seconds": time.perf_counter() - started,
+            "games": self.games,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "objects": sum(objects.values()),
+            "containers": container_sizes(self.engine),
+        })
+
+    def growth(self) -> dict:
+        """Returns what grew between the baseline sample and now: memory by source line and objects by type."""
+        gc.collect()
+        objects = object_counts() #Before the snapshot and its comparison add objects of their own
+        objects.subtract(self._baseline_objects)
+        lines = take_snapshot().compare_to(self._baseline_snapshot, "lineno")
+        return {
+            "lines": [(str(line.traceback), line.size_diff, line.count_diff)
+                      for line in lines if line.size_diff > 0][:TOP_GROWTH],
+            "objects": [(name, count) for name, count in objects.most_common(TOP_GROWTH) if count > 0],
+        }
+
+def bytes_per_million_ticks(samples: list) -> float:
+    """Returns the least-squares slope of traced memory against ticks, in bytes per million ticks."""
+    if len(samples) < 2:
+        return 0.0
+    ticks = [sample["tick"] for sample in samples]
+    memory = [sample["traced_bytes"] for sample in samples]
+    mean_tick, mean_memory = sum(ticks) / len(ticks), sum(memory) / len(memory)
+    variance = sum((tick - mean_tick) ** 2 for tick in ticks)
+    covariance = sum((tick - mean_tick) * (used - mean_memory) for tick, used in zip(ticks, memory))
+    return covariance / variance * 1000000 if variance else 0.0
+
+def run_soak(policy, ticks: int = DEFAULT_TICKS, samples: int = DEFAULT_SAMPLES, level: int = settings.STARTING_LEVEL,
+             seed: int = 0, render: bool = False, rewind: bool = False) -> dict:
+    """Plays a warmup, takes the baseline sample, then plays the rest of the ticks sampling at even intervals.
+    Returns the samples, the growth since the baseline and any broken invariants."""
+    soak = Soak(policy, level, seed, render, rewind)
+    warmup = int(ticks * WARMUP_FRACTION)
+    interval = max(1, (ticks - warmup) // samples)
+    tracemalloc.start()
+    started = time.perf_counter()
+    soak.play(warmup)
+    soak.sample(started)
+    played = warmup
+    while played < ticks:
+        soak.play(min(interval, ticks - played))
+        played = min(played + interval, ticks)
+        soak.sample(started)
+    growth = soak.growth()
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - started
+    return {
+        "ticks": ticks,
+        "seconds": elapsed,
+        "games": soak.games,
+        "rewinds": soak.rewinds,
+        "bytes_per_million_ticks": bytes_per_million_ticks(soak.samples),
+        "samples": soak.samples,
+        "growth": growth,
+        "problems": soak.problems,
+    }
+
+def print_report(report: dict):
+    """Prints the samples and the growth tables."""
+    print(f"{'tick':>10} {'games':>7} {'traced':>10} {'objects':>8}  containers")
+    for sample in report["samples"]:
+        containers = " ".join(f"{name}={size}" for name, size in sample["containers"].items())
+        print(f"{sample['tick']:>10} {sample['games']:>7} {sample['traced_bytes'] / 1024:>8.1f}Ki {sample['objects']:>8}  {containers}")
+    first, last = report["samples"][0], report["samples"][-1]
+    print(f"{report['ticks']} ticks, {report['games']} games, {report['rewinds']} rewinds in {report['seconds']:.1f}s "
+          f"({report['ticks'] / report['seconds']:.0f} ticks/s with tracing)")
+    print(f"traced memory {first['traced_bytes'] / 1024:.1f}KiB -> {last['traced_bytes'] / 1024:.1f}KiB, "
+          f"trend {report['bytes_per_million_ticks'] / 1024:+.1f}KiB per million ticks; "
+          f"objects {first['objects']} -> {last['objects']}")
+    if report["growth"]["lines"]:
+        print("memory growth since the baseline by line:")
+        for line, size, count in report["growth"]["lines"]:
+            print(f"  {size / 1024:+9.1f}KiB {count:+8} blocks  {line}")
+    if report["growth"]["objects"]:
+        print("object growth since the baseline by type:")
+        for name, count in report["growth"]["objects"]:
+            print(f"  {count:+8}  {name}")
+    for tick, problem in report["problems"]:
+        print(f"invariant broken at tick {tick}: {problem}")
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type = int, default = DEFAULT_TICKS, help = "ticks to play (default %(default)s)")
+    parser.add_argument("--samples", type = int, default = DEFAULT_SAMPLES, help = "samples after the baseline (default %(default)s)")
+    parser.add_argument("--policy", default = "random",
+                        help = f"random, a built-in policy ({', '.join(POLICIES)}) or module:function (default %(default)s)")
+    parser.add_argument("--level", type = int, default = settings.STARTING_LEVEL, choices = list(settings.LEVELS))
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--render", action = "store_true", help = "draw every tick with the layered renderer into the stub")
+    parser.add_argument("--rewind", action = "store_true", help = "keep a rewind history like the game and rewind now and then")
+    parser.add_argument("--max-growth", type = float, metavar = "KIB",
+                        help = "fail if traced memory trends up by more than this many KiB per million ticks")
+    parser.add_argument("--output", help = "write the report to this JSON file")
+    options = parser.parse_args(arguments)
+
+    policy = random_policy(random.Random(options.seed)) if options.policy == "random" else load_policy(options.policy)
+    report = run_soak(policy, options.ticks, options.samples, options.level, options.seed, options.render, options.rewind)
+    print_report(report)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(report, output, indent = 2)
+    if report["problems"]:
+        return 1
+    if options.max_growth is not None and report["bytes_per_million_ticks"] > options.max_growth * 1024:
+        print(f"memory grew faster than {options.max_growth}KiB per million ticks")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
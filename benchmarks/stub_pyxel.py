@@ -0,0 +1,50 @@
+"""
+Stand-in for the pyxel module that draws nothing and counts drawing calls,
+so the renderer can be benchmarked without opening a window.
+"""
+
+from collections import Counter
+
+FONT_WIDTH = 4
+COLOR_WHITE = 7
+COLOR_RED = 8
+COLOR_YELLOW = 10
+KEY_SPACE, KEY_UP, KEY_W, KEY_DOWN, KEY_S, KEY_LEFT, KEY_A, KEY_RIGHT, KEY_D, KEY_F1, KEY_F2, KEY_F3, KEY_F5, KEY_F9, KEY_TAB, KEY_BACKSPACE = range(16)
+width = 0
+height = 0
+calls = Counter() #Drawing function name -> number of calls since the last reset_calls()
+
+def reset_calls():
+    """Zeroes the call counters."""
+    calls.clear()
+
+def _counted(name: str):
+    def draw(*args, **kwargs):
+        calls[name] += 1
+    draw.__name__ = name
+    return draw
+
+blt = _counted("blt")
+bltm = _counted("bltm")
+cls = _counted("cls")
+rect = _counted("rect")
+text = _counted("text")
+
+class Image:
+    """Image bank that counts drawing calls under image.<name>."""
+    blt = staticmethod(_counted("image.blt"))
+    cls = staticmethod(_counted("image.cls"))
+    rect = staticmethod(_counted("image.rect"))
+images = [Image() for _ in range(3)]
+
+def init(width_: int = 0, height_: int = 0, **kwargs):
+    global width, height
+    width, height = kwargs.get("width", width_), kwargs.get("height", height_)
+def load(*args, **kwargs):
+    pass
+def camera(*args):
+    pass
+def btn(key: int) -> bool:
+    return False
+def btnp(key: int, *args, **kwargs) -> bool:
+    return False
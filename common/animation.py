@@ -0,0 +1,70 @@
+import struct
+
+STATE_HEADER = struct.Struct("<qI") #Tick, number of animations
+# Grid index, cycles remaining, tile code after animation, rotation after animation, ticks per frame, due tick
+ANIMATION = struct.Struct("<IiBBHq")
+
+class AnimationScheduler:
+    """Keeps track of animated tiles, grouped by the tick their next frame is due.
+    Each tick only the animations that are due are handed out, and any animation can be
+    stopped in O(1) without disturbing the others."""
+
+    def __init__(self):
+        self.tick = 0
+        self._animations = {} #Grid index -> [cycles remaining, tile code after animation, rotation after animation, ticks per frame, due tick]
+        self._due = {} #Tick -> set of grid indices whose next frame is due on that tick
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._animations
+    def __len__(self) -> int:
+        return len(self._animations)
+    def __iter__(self):
+        return iter(self._animations)
+    def __getitem__(self, index: int) -> list:
+        """Returns [cycles remaining, tile code after animation, rotation after animation, ticks per frame, due tick]."""
+        return self._animations[index]
+
+    def start(self, index: int, cycles: int, tile_code_after_animation: int, rotation_after_animation: int,
+              ticks_per_frame: int = 1):
+        """Starts (or restarts) an animation with its first frame change due ticks_per_frame ticks from now."""
+        self.stop(index)
+        self._animations[index] = [cycles, tile_code_after_animation, rotation_after_animation, ticks_per_frame, 0]
+        self.reschedule(index)
+    def stop(self, index: int) -> list:
+        """Stops an animation and returns its state, or None if the tile wasn't animated."""
+        animation = self._animations.pop(index, None)
+        if animation is not None:
+            due = self._due.get(animation[4])
+            if due is not None:
+                due.discard(index)
+                if not due:
+                    del self._due[animation[4]]
+        return animation
+    def reschedule(self, index: int):
+        """Schedules the next frame change of an animation."""
+        animation = self._animations[index]
+        animation[4] = self.tick + animation[3]
+        self._due.setdefault(animation[4], set()).add(index)
+    def pack_state(self, output: bytearray):
+        """Appends the scheduler state to output."""
+        output += STATE_HEADER.pack(self.tick, len(self._animations))
+        for index, animation in self._animations.items():
+            output += ANIMATION.pack(index, *animation)
+    def unpack_state(self, data: memoryview, offset: int) -> int:
+        """Restores a state written by pack_state() at offset in data and returns the offset after it."""
+        self.tick, count = STATE_HEADER.unpack_from(data, offset)
+        offset += STATE_HEADER.size
+        self.clear()
+        for index, *animation in ANIMATION.iter_unpack(data[offset:offset + count * ANIMATION.size]):
+            self._animations[index] = animation
+            self._due.setdefault(animation[4], set()).add(index)
+        return offset + count * ANIMATION.size
+    def clear(self):
+        """Stops every animation."""
+        self._animations.clear()
+        self._due.clear()
+    def advance(self) -> set:
+        """Moves on to the next tick and returns the grid indices whose next frame is due.
+        They stay animated but aren't scheduled again until reschedule() is called."""
+        self.tick += 1
+        return self._due.pop(self.tick, set())
@@ -0,0 +1,361 @@
+"""
+Many snakes sharing one grid, for multiplayer games and crowds of bots. Nothing here does any networking,
+see arena_server for that.
+
+Snakes are stored in NumPy arrays like BatchEnv's games, one slot per snake, and every head moves in one
+vectorized pass per tick. Two arrays the size of the grid index the snakes by cell: the slot of the snake
+on every cell, and for every snake cell the next cell towards its head, so each snake is a linked list
+through the grid. Moving a snake only touches its head and tail, and finding out whose body a head ran
+into is a single lookup, however many snakes there are and however long they get.
+
+The rules differ from SnekEngine's in two ways. Lemons are worth 3 points but don't reverse controls, and a head
+can move onto its own tail when that tail is moving away this tick, the same as onto any other snake's tail.
+"""
+
+import settings, random
+import numpy as np
+from common.engine import ITEM_APPLE, ITEM_LEMON, ITEM_BOMB
+from common.grid import Grid, TILE_NAMES, EMPTY
+from common.item_manager import ItemManager
+from common.level_cache import LevelCache
+from common.snake import SNAKE_HEAD, SNAKE_BODY_STRAIGHT, SNAKE_BODY_LEFT, SNAKE_BODY_RIGHT, SNAKE_TAIL
+
+ITEM_POINTS = {ITEM_APPLE: 1, ITEM_LEMON: 3} #Lemons don't reverse controls in arenas, they're just worth more
+NO_OWNER = -1
+BOT_STRAIGHT_BIAS = 0.9 #Added to the random preference for going straight, so bots turn now and then when they don't have to
+
+# Tile code lookups for whole arrays of tiles
+POINTS = np.zeros(256, dtype = np.int64) #Points for eating the tile
+POINTS[list(ITEM_POINTS)] = list(ITEM_POINTS.values())
+PASSABLE = np.zeros(256, dtype = bool) #Whether a head can move onto the tile, not counting tails moving out of the way
+PASSABLE[[EMPTY, *ITEM_POINTS]] = True
+BODY_CODES = np.array([SNAKE_BODY_STRAIGHT, SNAKE_BODY_RIGHT, SNAKE_BODY_STRAIGHT, SNAKE_BODY_LEFT], dtype = np.uint8) #By turn
+BOT_TURNS = np.array([0, 1, 3]) #Straight, right, left
+START_CODES = np.array([SNAKE_HEAD] + [SNAKE_BODY_STRAIGHT] * settings.SNAKE_START_LENGTH + [SNAKE_TAIL], dtype = np.uint8)
+
+class EmptyTiles:
+    """Stands in for Grid.empty_tiles on arena grids, whose snake tiles are written in bulk rather than through
+    set_tile(). Reads the grid's tile types instead of keeping an index, and picks random empty tiles by trying
+    random tiles, which takes a few tries at most unless the arena is nearly full."""
+    __slots__ = ("types", "array")
+
+    MAX_TRIES = 64 #Random tries before choice() falls back to listing the empty tiles
+
+    def __init__(self, grid: Grid):
+        self.types = grid.types
+        self.array = np.frombuffer(grid.types, dtype = np.uint8)
+
+    def __len__(self) -> int:
+        return self.array.size - np.count_nonzero(self.array) #EMPTY is 0
+    def __contains__(self, index: int) -> bool:
+        return self.types[index] == EMPTY
+    def add(self, index: int):
+        pass
+    def discard(self, index: int):
+        pass
+    def choice(self, rng: random.Random = random) -> int:
+        """Returns a uniformly random empty tile."""
+        for _ in range(self.MAX_TRIES):
+            index = rng.randrange(len(self.types))
+            if self.types[index] == EMPTY:
+                return index
+        empty = np.flatnonzero(self.array == EMPTY)
+        if empty.size == 0:
+            raise IndexError("Cannot choose from an empty set")
+        return int(empty[rng.randrange(empty.size)])
+
+class Player:
+    """A player's view of their slot in an arena, with or without a snake."""
+    __slots__ = ("arena", "player_id", "slot", "death_cause")
+
+    def __init__(self, arena: "Arena", player_id: int, slot: int):
+        self.arena = arena
+        self.player_id = player_id
+        self.slot = slot
+        self.death_cause = None #What ended the last snake: "self", "snake", "head-on", or the tile type it ran into
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.arena.alive[self.slot])
+    @property
+    def score(self) -> int:
+        return int(self.arena.scores[self.slot])
+    @property
+    def kills(self) -> int:
+        return int(self.arena.kills[self.slot])
+    @property
+    def head(self) -> int:
+        """Returns the grid index of the snake's head. Only meaningful while alive."""
+        return int(self.arena.heads[self.slot])
+    @property
+    def length(self) -> int:
+        return int(self.arena.lengths[self.slot])
+
+class Arena:
+    """Shared grid with any number of snakes, advanced one tick at a time. All heads move at once:
+    tails move out of the way in the same tick unless their snake is eating, a head that lands on any snake's
+    body dies and the body's owner gets the kill, and when heads meet on a tile only a unique longest survives.
+    Dead snakes are cleared off the grid. Players spawn again by asking, bots spawn again on their own.
+    Grid listeners aren't told about snake moves, which skip set_tile(). updated_tiles is kept up to date
+    unless track_updates is False, which saves a set update per tick when nothing draws or sends the grid."""
+
+    SPAWN_TRIES = 64 #Random tiles tried when looking for room for a new snake
+    INITIAL_SLOTS = 16
+
+    def __init__(self, width: int = settings.GRID_WIDTH, height: int = settings.GRID_HEIGHT,
+                 level: int = settings.STARTING_LEVEL, levels: LevelCache = None, seed: int = None,
+                 track_updates: bool = True):
+        """Arenas the size of a level play on that level, other sizes (or a level of None) start out empty."""
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.rng = random.Random(self.seed)
+        self.bot_rng = np.random.default_rng(self.seed)
+        self.grid = Grid(None, width, height)
+        if level is not None and (width, height) == (settings.GRID_WIDTH, settings.GRID_HEIGHT):
+            self.grid.load_compiled_level((levels if levels is not None else LevelCache()).get(level))
+        self.grid.empty_tiles = EmptyTiles(self.grid)
+        self.item_manager = ItemManager(self.grid, rng = self.rng)
+        self.players = {} #Player id -> Player, in the order they joined
+        self.tick = 0
+        self.track_updates = track_updates
+        self._next_id = 1
+
+        # Views of the grid's buffers, so bulk writes show up in the grid
+        self.types = np.frombuffer(self.grid.types, dtype = np.uint8)
+        self.rotations = np.frombuffer(self.grid.rotations, dtype = np.uint8)
+        self.neighbors = np.frombuffer(self.grid.neighbors, dtype = np.uint32).astype(np.int64) #4 per tile, like Grid.neighbors
+        # Indexes by cell
+        self.owners = np.full(self.grid.total_tiles, NO_OWNER, dtype = np.int64) #Slot of the snake on each cell
+        self.toward_head = np.zeros(self.grid.total_tiles, dtype = np.int64) #Next cell towards the head, on snake cells
+
+        # Per slot
+        slots = self.INITIAL_SLOTS
+        self._eating = np.zeros(slots, dtype = bool) #Scratch space for move_snakes()
+        self.players_by_slot = [None] * slots
+        self.in_use = np.zeros(slots, dtype = bool)
+        self.alive = np.zeros(slots, dtype = bool)
+        self.is_bot = np.zeros(slots, dtype = bool)
+        self.heads = np.zeros(slots, dtype = np.int64)
+        self.tails = np.zeros(slots, dtype = np.int64)
+        self.lengths = np.zeros(slots, dtype = np.int64)
+        self.directions = np.zeros(slots, dtype = np.int64)
+        self.requested = np.full(slots, -1, dtype = np.int64) #Direction to turn on the next tick, or -1
+        self.scores = np.zeros(slots, dtype = np.int64)
+        self.kills = np.zeros(slots, dtype = np.int64)
+
+    @property
+    def snake_count(self) -> int:
+        """Returns how many snakes are alive."""
+        return int(np.count_nonzero(self.alive))
+
+    def _grow_slots(self):
+        """Doubles the number of slots."""
+        size = self.in_use.size
+        for name in ("_eating", "in_use", "alive", "is_bot", "heads", "tails", "lengths", "directions", "requested", "scores", "kills"):
+            array = getattr(self, name)
+            grown = np.full(2 * size, -1 if name == "requested" else 0, dtype = array.dtype)
+            grown[:size] = array
+            setattr(self, name, grown)
+        self.players_by_slot.extend([None] * size)
+
+    def join(self, bot: bool = False) -> Player:
+        """Adds a player and spawns their snake if there is room. Bots are steered by steer_bots()."""
+        free = np.flatnonzero(~self.in_use)
+        if free.size == 0:
+            self._grow_slots()
+            free = np.flatnonzero(~self.in_use)
+        slot = int(free[0])
+        player = Player(self, self._next_id, slot)
+        self._next_id += 1
+        self.players[player.player_id] = player
+        self.players_by_slot[slot] = player
+        self.in_use[slot] = True
+        self.is_bot[slot] = bot
+        self.spawn(player)
+        return player
+    def add_bots(self, count: int) -> list:
+        """Adds bot players and returns them."""
+        return [self.join(bot = True) for _ in range(count)]
+    def leave(self, player_id: int):
+        """Removes a player and their snake."""
+        player = self.players.pop(player_id, None)
+        if player is None:
+            return
+        if self.alive[player.slot]:
+            self.clear_snakes([player.slot])
+        self.in_use[player.slot] = False
+        self.is_bot[player.slot] = False
+        self.players_by_slot[player.slot] = None
+
+    def find_spawn_position(self) -> list:
+        """Returns the cells, head first, of a random place with room for a new snake facing up and a free tile
+        ahead of it, or None."""
+        grid = self.grid
+        if not grid.empty_tiles:
+            return None
+        down = settings.DIRECTIONS["down"]
+        for _ in range(self.SPAWN_TRIES):
+            cell = grid.empty_tiles.choice(self.rng) #The tile ahead
+            cells = []
+            for _ in range(settings.SNAKE_START_LENGTH + 2):
+                cell = grid.neighbor(cell, down)
+                if grid.types[cell] != EMPTY:
+                    break
+                cells.append(cell)
+            else:
+                return cells
+        return None
+    def spawn(self, player: Player) -> bool:
+        """Gives a player without a snake a new one facing up, starting from a score of 0.
+        Returns False if there's no room."""
+        slot = player.slot
+        if self.alive[slot]:
+            return True
+        cells = self.find_spawn_position()
+        if cells is None:
+            return False
+        self.types[cells] = START_CODES
+        self.rotations[cells] = settings.DIRECTIONS["up"]
+        self.owners[cells] = slot
+        self.toward_head[cells[1:]] = cells[:-1]
+        if self.track_updates:
+            self.grid.updated_tiles.update(cells)
+        self.alive[slot] = True
+        self.heads[slot], self.tails[slot], self.lengths[slot] = cells[0], cells[-1], len(cells)
+        self.directions[slot] = settings.DIRECTIONS["up"]
+        self.requested[slot] = -1
+        self.scores[slot] = self.kills[slot] = 0
+        player.death_cause = None
+        return True
+    def clear_snakes(self, slots: list):
+        """Takes snakes off the grid, following each one from its tail to its head."""
+        cells = []
+        toward_head = self.toward_head
+        for slot in slots:
+            cell = int(self.tails[slot])
+            for _ in range(int(self.lengths[slot])):
+                cells.append(cell)
+                cell = int(toward_head[cell])
+        self.types[cells] = EMPTY
+        self.rotations[cells] = 0
+        self.owners[cells] = NO_OWNER
+        if self.track_updates:
+            self.grid.updated_tiles.update(cells)
+        self.alive[slots] = False
+
+    def steer(self, player_id: int, direction: int):
+        """Sets the direction a player's snake turns on the next tick."""
+        player = self.players.get(player_id)
+        if player is not None:
+            self.requested[player.slot] = direction
+    def steer_bots(self):
+        """Picks a direction for every bot at once: a random one of the ways that don't run into anything
+        on the next tick, usually straight ahead. Other heads might be moving onto the same tile."""
+        bots = np.flatnonzero(self.alive & self.is_bot)
+        if bots.size == 0:
+            return
+        options = (self.directions[bots][:, None] + BOT_TURNS) & 3
+        cells = self.neighbors[(self.heads[bots][:, None] << 2) | options]
+        preference = self.bot_rng.random(options.shape)
+        preference[:, 0] += BOT_STRAIGHT_BIAS
+        preference[~PASSABLE[self.types[cells]]] = -1.0
+        self.requested[bots] = np.take_along_axis(options, preference.argmax(axis = 1)[:, None], axis = 1)[:, 0]
+
+    def step(self):
+        """Advances the arena one tick, moving every snake at once."""
+        self.grid.update()
+        self.steer_bots()
+        slots = np.flatnonzero(self.alive)
+        if slots.size:
+            self.move_snakes(slots)
+        self.item_manager.update()
+        self.tick += 1
+        for slot in np.flatnonzero(self.is_bot & ~self.alive).tolist():
+            self.spawn(self.players_by_slot[slot])
+    def move_snakes(self, slots: np.ndarray):
+        """Moves the snakes in slots one tile each, resolving every collision in one pass."""
+        types, rotations, owners = self.types, self.rotations, self.owners
+
+        # Turn unless that means doubling back
+        heads, current, requested = self.heads[slots], self.directions[slots], self.requested[slots]
+        turning = (requested >= 0) & (requested != current) & (requested != (current + 2) % 4)
+        directions = np.where(turning, requested, current)
+        targets = self.neighbors[(heads << 2) | directions]
+        target_codes = types[targets]
+        eating = POINTS[target_codes] > 0
+
+        # A head can move onto a tail that is moving away this tick, but not onto the rest of a body
+        self._eating[slots] = eating
+        target_owners = owners[targets]
+        on_snake = target_owners != NO_OWNER
+        onto_moving_tail = on_snake & (targets == self.tails[target_owners]) & ~self._eating[target_owners]
+        hit_body = on_snake & ~onto_moving_tail
+        dies = hit_body | ~(PASSABLE[target_codes] | on_snake)
+        np.add.at(self.kills, target_owners[hit_body & (target_owners != slots)], 1) #Body hits count for the body's owner
+
+        # Heads on the same tile: only a unique longest survives, and gets the kills
+        head_on = np.zeros(slots.size, dtype = bool)
+        sorted_targets = np.sort(targets)
+        if (sorted_targets[1:] == sorted_targets[:-1]).any():
+            _, group, group_sizes = np.unique(targets, return_inverse = True, return_counts = True)
+            contested = group_sizes[group] > 1
+            lengths = self.lengths[slots]
+            longest = np.zeros(group_sizes.size, dtype = np.int64)
+            np.maximum.at(longest, group, lengths)
+            is_longest = lengths == longest[group]
+            longest_count = np.bincount(group, weights = is_longest, minlength = group_sizes.size)
+            head_on = contested & ~(is_longest & (longest_count[group] == 1))
+            winners = contested & ~head_on
+            np.add.at(self.kills, slots[winners], group_sizes[group[winners]] - 1)
+            dies |= head_on
+        if dies.any():
+            self.record_deaths(slots[dies], hit_body[dies], head_on[dies], target_codes[dies], target_owners[dies], targets[dies])
+
+        survivors = ~dies
+        moving, eating = slots[survivors], eating[survivors]
+        heads, targets, directions = heads[survivors], targets[survivors], directions[survivors]
+        target_codes = target_codes[survivors]
+
+        # Tails move up unless their snake is eating, before any head moves onto them
+        shrinking = moving[~eating]
+        old_tails = self.tails[shrinking]
+        new_tails = self.toward_head[old_tails]
+        types[old_tails] = EMPTY
+        rotations[old_tails] = 0
+        owners[old_tails] = NO_OWNER
+        types[new_tails] = SNAKE_TAIL
+        rotations[new_tails] = rotations[self.toward_head[new_tails]] #Points the same way as the body tile in front
+        self.tails[shrinking] = new_tails
+        # Dead snakes come off next, which can free tiles that surviving heads move onto
+        if dies.any():
+            self.clear_snakes(slots[dies].tolist())
+
+        # Heads move, leaving a body tile that turns the way the snake turned
+        types[heads] = BODY_CODES[(directions - rotations[heads]) % 4]
+        types[targets] = SNAKE_HEAD
+        rotations[targets] = directions
+        owners[targets] = moving
+        self.toward_head[heads] = targets
+        self.heads[moving] = targets
+        self.directions[moving] = directions
+        self.lengths[moving] += eating
+        self.scores[moving] += POINTS[target_codes]
+        for index in targets[eating].tolist():
+            self.item_manager.remove_item(index, clear_tile = False)
+        if self.track_updates:
+            self.grid.updated_tiles.update(np.concatenate((heads, targets, old_tails, new_tails)).tolist())
+    def record_deaths(self, slots: np.ndarray, hit_body: np.ndarray, head_on: np.ndarray,
+                      target_codes: np.ndarray, target_owners: np.ndarray, targets: np.ndarray):
+        """Sets the death causes of snakes dying this tick and sets off the bombs they ran into."""
+        for slot, body, head_to_head, tile_code, owner, index in zip(
+                slots.tolist(), hit_body.tolist(), head_on.tolist(), target_codes.tolist(), target_owners.tolist(), targets.tolist()):
+            player = self.players_by_slot[slot]
+            if head_to_head:
+                player.death_cause = "head-on"
+            elif body:
+                player.death_cause = "self" if owner == slot else "snake"
+            else:
+                player.death_cause = TILE_NAMES[tile_code]
+                if tile_code == ITEM_BOMB:
+                    self.item_manager.remove_item(index, clear_tile = False) #So its despawn can't clear whatever is there later
+                    self.grid.update_tile(*self.grid.coordinates(index), "animation.exploding_bomb",
+                                          is_animated = True, animation_cycles = 1)
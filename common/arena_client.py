@@ -0,0 +1,76 @@
+"""
+Client side of the arena protocol for frontends with their own frame loop, like Pyxel's.
+Nothing blocks after connecting: call poll() once a frame to apply whatever the server has sent.
+"""
+
+import socket
+from common.arena_protocol import (frame, split_messages, apply_keyframe, apply_delta, WELCOME, WELCOME_PAYLOAD,
+                                   KEYFRAME, DELTA, STATUS, STATUS_PAYLOAD, STEER, STEER_PAYLOAD, RESPAWN)
+from common.grid import Grid
+
+class ArenaClient:
+    """Connection to an arena server with a copy of its grid for drawing.
+    The grid is replaced by a new one on every keyframe, so renderers see a new grid and repaint everything,
+    and deltas mark the tiles they change as updated like the simulation would."""
+
+    RECEIVE_SIZE = 65536
+
+    def __init__(self, host: str, port: int, timeout: float = 5.0):
+        self._socket = socket.create_connection((host, port), timeout = timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = bytearray()
+        self.player_id = None
+        self.width = self.height = self.tick_rate = None
+        self.grid = None #Set by the first keyframe
+        self.tick = 0
+        self.score = 0
+        self.head = 0 #Grid index of the player's snake's head
+        self.alive = False
+        self.connected = True
+        while self.player_id is None: #Wait for the welcome message, applying the keyframe that usually comes with it
+            if not self._receive():
+                raise ConnectionError("Arena server closed the connection before welcoming the player")
+            self.handle_messages()
+        self._socket.setblocking(False)
+
+    def _receive(self) -> bool:
+        """Reads what has arrived into the buffer. Returns False once the server has closed the connection."""
+        data = self._socket.recv(self.RECEIVE_SIZE)
+        if not data:
+            self.connected = False
+            return False
+        self._buffer += data
+        return True
+
+    def poll(self) -> bool:
+        """Applies every message received since the last call. Returns whether still connected."""
+        try:
+            while self._receive():
+                pass
+        except BlockingIOError:
+            pass
+        self.handle_messages()
+        return self.connected
+    def handle_messages(self):
+        """Applies every complete message in the buffer, in the order they arrived."""
+        for message_type, payload in split_messages(self._buffer):
+            if message_type == WELCOME:
+                self.player_id, self.width, self.height, self.tick_rate = WELCOME_PAYLOAD.unpack(payload)
+            elif message_type == KEYFRAME:
+                grid = Grid(None, self.width, self.height)
+                self.tick = apply_keyframe(grid, payload)
+                self.grid = grid
+            elif message_type == DELTA and self.grid is not None:
+                self.tick = apply_delta(self.grid, payload)
+            elif message_type == STATUS:
+                self.score, self.head, self.alive = STATUS_PAYLOAD.unpack(payload)
+
+    def steer(self, direction: int):
+        """Asks for the player's snake to turn."""
+        self._socket.sendall(frame(STEER, STEER_PAYLOAD.pack(direction)))
+    def respawn(self):
+        """Asks for a new snake after the last one died."""
+        self._socket.sendall(frame(RESPAWN))
+    def close(self):
+        self._socket.close()
+        self.connected = False
@@ -0,0 +1,86 @@
+"""
+Load test for the arena server: hundreds of bot connections steering at random, reporting
+how much each one receives and how evenly the ticks arrive.
+
+    python -m common.arena_server --size 128 &
+    python -m common.arena_loadtest --clients 300 --seconds 30
+"""
+
+import settings, argparse, asyncio, random, sys, time
+from common.arena_protocol import (frame, FRAME_HEADER, KEYFRAME, DELTA,
+                                   STATUS, STATUS_PAYLOAD, STEER, STEER_PAYLOAD, RESPAWN)
+
+TURN_PROBABILITY = 0.2 #Chance of a bot steering each tick
+
+class BotStats:
+    """What one bot connection received."""
+    __slots__ = ("bytes", "keyframes", "deltas", "gaps", "deaths")
+
+    def __init__(self):
+        self.bytes = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.gaps = [] #Seconds between consecutive tick messages
+        self.deaths = 0
+
+async def run_bot(host: str, port: int, seconds: float, rng: random.Random) -> BotStats:
+    """Connects, steers at random and respawns after dying until time is up."""
+    stats = BotStats()
+    reader, writer = await asyncio.open_connection(host, port)
+    deadline = time.perf_counter() + seconds
+    last_tick = None
+    try:
+        while time.perf_counter() < deadline:
+            header = await reader.readexactly(FRAME_HEADER.size)
+            length, message_type = FRAME_HEADER.unpack(header)
+            payload = await reader.readexactly(length)
+            stats.bytes += len(header) + length
+            if message_type in (KEYFRAME, DELTA):
+                now = time.perf_counter()
+                if last_tick is not None:
+                    stats.gaps.append(now - last_tick)
+                last_tick = now
+                if message_type == KEYFRAME:
+                    stats.keyframes += 1
+                else:
+                    stats.deltas += 1
+                if rng.random() < TURN_PROBABILITY:
+                    writer.write(frame(STEER, STEER_PAYLOAD.pack(rng.randrange(4))))
+            elif message_type == STATUS and not STATUS_PAYLOAD.unpack(payload)[2]:
+                stats.deaths += 1
+                writer.write(frame(RESPAWN))
+    finally:
+        writer.close()
+    return stats
+
+def percentile(values: list, percent: int) -> float:
+    """Returns the nearest-rank percentile of values."""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, -(-percent * len(values) // 100) - 1))] if values else 0.0
+
+async def run_load_test(host: str, port: int, clients: int, seconds: float, seed: int = 0) -> list:
+    """Runs every bot at once and returns their stats."""
+    return await asyncio.gather(*(run_bot(host, port, seconds, random.Random(seed + i)) for i in range(clients)))
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = settings.ARENA_PORT)
+    parser.add_argument("--clients", type = int, default = 100, help = "bot connections (default %(default)s)")
+    parser.add_argument("--seconds", type = float, default = 10, help = "how long each bot plays (default %(default)s)")
+    parser.add_argument("--seed", type = int, default = 0)
+    options = parser.parse_args(arguments)
+
+    results = asyncio.run(run_load_test(options.host, options.port, options.clients, options.seconds, options.seed))
+    gaps = [gap for stats in results for gap in stats.gaps]
+    received = [stats.bytes / options.seconds for stats in results]
+    print(f"{len(results)} clients for {options.seconds:.0f}s: "
+          f"{sum(received) / len(received) / 1024:.1f}KiB/s per client (max {max(received) / 1024:.1f}), "
+          f"{sum(stats.keyframes for stats in results)} keyframes, {sum(stats.deltas for stats in results)} deltas, "
+          f"{sum(stats.deaths for stats in results)} deaths")
+    print("tick gap p50/95/99 " + "/".join(f"{percentile(gaps, percent) * 1000:.1f}" for percent in (50, 95, 99))
+          + f"ms (expected {1000 / settings.TICK_RATE:.1f}ms)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
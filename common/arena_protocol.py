@@ -0,0 +1,100 @@
+"""
+Binary messages between the arena server and its clients. Every message is a length-prefixed frame:
+payload length and message type, then the payload.
+
+Each tick the server sends one of two grid messages: a keyframe with every tile, zlib-compressed, or a delta
+with only the tiles updated that tick. Delta tiles are sorted by index and each index is stored as the gap
+from the previous one in a variable-length integer, so a tick of scattered changes costs about 4 bytes a tile.
+"""
+
+import struct, zlib
+from common.grid import Grid
+
+FRAME_HEADER = struct.Struct("<IB") #Payload length, message type
+
+# Server to client
+WELCOME = 1 #Sent once on connecting
+WELCOME_PAYLOAD = struct.Struct("<IHHH") #Player id, grid width, grid height, ticks per second
+KEYFRAME = 2 #Every tile, so clients can sync from scratch
+DELTA = 3 #Only the tiles that changed this tick
+GRID_HEADER = struct.Struct("<qI") #Tick, then for keyframes the uncompressed size and for deltas the number of tiles
+STATUS = 4 #The receiving player's snake, sent when it changes
+STATUS_PAYLOAD = struct.Struct("<iI?") #Score, grid index of the head, alive
+
+# Client to server
+STEER = 16
+STEER_PAYLOAD = struct.Struct("<B") #Direction
+RESPAWN = 17 #No payload
+
+def frame(message_type: int, payload: bytes = b"") -> bytes:
+    """Returns a message ready to send."""
+    return FRAME_HEADER.pack(len(payload), message_type) + payload
+
+def split_messages(buffer: bytearray) -> list:
+    """Removes every complete message from the start of buffer and returns them as (message type, payload).
+    Partial messages are left in the buffer for when the rest arrives."""
+    messages = []
+    offset = 0
+    while len(buffer) - offset >= FRAME_HEADER.size:
+        length, message_type = FRAME_HEADER.unpack_from(buffer, offset)
+        end = offset + FRAME_HEADER.size + length
+        if end > len(buffer):
+            break
+        messages.append((message_type, bytes(buffer[offset + FRAME_HEADER.size:end])))
+        offset = end
+    del buffer[:offset]
+    return messages
+
+def encode_keyframe(grid: Grid, tick: int) -> bytes:
+    """Returns a keyframe message with every tile's type, rotation and animation frame."""
+    tiles = bytes(grid.types) + bytes(grid.rotations) + bytes(grid.frames)
+    return frame(KEYFRAME, GRID_HEADER.pack(tick, len(tiles)) + zlib.compress(tiles, 1))
+
+def encode_delta(grid: Grid, tick: int, indices) -> bytes:
+    """Returns a delta message with the type, rotation and animation frame of the tiles at indices."""
+    types, rotations, frames = grid.types, grid.rotations, grid.frames
+    body = bytearray()
+    previous = -1
+    for index in sorted(indices):
+        gap = index - previous - 1 #Varint, 7 bits per byte with the high bit set on all but the last
+        while gap >= 0x80:
+            body.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        body.append(gap)
+        body += bytes((types[index], rotations[index], frames[index]))
+        previous = index
+    return frame(DELTA, GRID_HEADER.pack(tick, len(indices)) + body)
+
+def apply_keyframe(grid: Grid, payload: bytes) -> int:
+    """Copies a keyframe's tiles into a grid of the right size and returns its tick.
+    Only the buffers the renderers read are written, so the grid's empty tiles and animations aren't kept up to date."""
+    tick, size = GRID_HEADER.unpack_from(payload)
+    tiles = zlib.decompress(payload[GRID_HEADER.size:], bufsize = size)
+    total = grid.total_tiles
+    if len(tiles) != 3 * total:
+        raise ValueError(f"Keyframe has {len(tiles) // 3} tiles but the grid has {total}")
+    grid.types[:] = tiles[:total]
+    grid.rotations[:] = tiles[total:2 * total]
+    grid.frames[:] = tiles[2 * total:]
+    return tick
+def apply_delta(grid: Grid, payload: bytes) -> int:
+    """Writes a delta's tiles into a grid, marks them as updated and returns its tick. Like apply_keyframe(),
+    only the buffers the renderers read are written."""
+    tick, count = GRID_HEADER.unpack_from(payload)
+    types, rotations, frames, updated_tiles = grid.types, grid.rotations, grid.frames, grid.updated_tiles
+    offset = GRID_HEADER.size
+    index = -1
+    for _ in range(count):
+        gap = shift = 0
+        while True:
+            byte = payload[offset]
+            offset += 1
+            gap |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        index += gap + 1
+        types[index], rotations[index], frames[index] = payload[offset:offset + 3]
+        offset += 3
+        updated_tiles.add(index)
+    return tick
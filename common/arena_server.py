@@ -0,0 +1,165 @@
+"""
+Authoritative multiplayer arena server. Runs one Arena at a fixed tick rate with asyncio, takes steering
+from players over TCP and sends every player the tiles that changed each tick (see arena_protocol).
+
+    python -m common.arena_server
+    python -m common.arena_server --size 128 --port 7777
+    python -m common.arena_server --size 256 --bots 500
+"""
+
+import settings, argparse, asyncio, sys
+from common.arena import Arena
+from common.arena_protocol import (frame, encode_keyframe, encode_delta, FRAME_HEADER, WELCOME, WELCOME_PAYLOAD,
+                                   STATUS, STATUS_PAYLOAD, STEER, STEER_PAYLOAD, RESPAWN)
+from common.profiler import FrameProfiler
+
+MAX_BUFFERED = 256 * 1024 #Bytes waiting to go to a client before it's skipped until it catches up
+STATS_INTERVAL = 5 #Seconds between stats lines
+
+class Client:
+    """A connected player's stream and what they've been sent."""
+    __slots__ = ("player", "writer", "needs_keyframe", "last_status", "bytes_sent")
+
+    def __init__(self, player, writer: asyncio.StreamWriter):
+        self.player = player
+        self.writer = writer
+        self.needs_keyframe = True #Sent a keyframe instead of the next delta, to sync from scratch
+        self.last_status = None
+        self.bytes_sent = 0
+
+    def send(self, message: bytes):
+        self.writer.write(message)
+        self.bytes_sent += len(message)
+
+class ArenaServer:
+    """Steps an arena settings.TICK_RATE times a second and broadcasts the changes.
+    Each tick's delta is encoded once and the same bytes go to every client. Clients that fall behind
+    are skipped instead of buffering without limit, and get a keyframe once they've caught up."""
+
+    def __init__(self, arena: Arena, tick_rate: int = settings.TICK_RATE,
+                 keyframe_interval: int = settings.ARENA_KEYFRAME_INTERVAL):
+        self.arena = arena
+        self.tick_rate = tick_rate
+        self.keyframe_interval = keyframe_interval
+        self.clients = {} #Player id -> Client
+        self.profiler = FrameProfiler(window = tick_rate * STATS_INTERVAL, budget = 1 / tick_rate)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Adds a player for the connection and applies their messages until they disconnect."""
+        player = self.arena.join()
+        client = self.clients[player.player_id] = Client(player, writer)
+        grid = self.arena.grid
+        client.send(frame(WELCOME, WELCOME_PAYLOAD.pack(player.player_id, grid.width, grid.height, self.tick_rate)))
+        try:
+            while True:
+                length, message_type = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                payload = await reader.readexactly(length)
+                if message_type == STEER:
+                    self.arena.steer(player.player_id, STEER_PAYLOAD.unpack(payload)[0] & 3)
+                elif message_type == RESPAWN:
+                    self.arena.spawn(player)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.clients[player.player_id]
+            self.arena.leave(player.player_id)
+            writer.close()
+
+    def tick(self):
+        """Advances the arena a tick and sends every client a keyframe or delta, and their status if it changed."""
+        profiler, arena = self.profiler, self.arena
+        profiler.begin_frame()
+        started = profiler.start()
+        arena.step()
+        profiler.stop("arena.step", started)
+
+        started = profiler.start()
+        grid = arena.grid
+        delta = encode_delta(grid, arena.tick, grid.updated_tiles)
+        grid.updated_tiles.clear()
+        keyframe = None
+        periodic_keyframe = arena.tick % self.keyframe_interval == 0
+        profiler.stop("encode", started)
+
+        started = profiler.start()
+        for client in self.clients.values():
+            if client.writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                client.needs_keyframe = True #Too far behind for deltas to make sense, skip it until it catches up
+                continue
+            if client.needs_keyframe or periodic_keyframe:
+                if keyframe is None:
+                    keyframe = encode_keyframe(grid, arena.tick)
+                client.send(keyframe)
+                client.needs_keyframe = False
+            else:
+                client.send(delta)
+            player = client.player
+            status = (player.score, player.head if player.alive else 0, player.alive)
+            if status != client.last_status:
+                client.send(frame(STATUS, STATUS_PAYLOAD.pack(*status)))
+                client.last_status = status
+        profiler.stop("send", started)
+        profiler.count("delta_bytes", len(delta))
+        profiler.count("players", len(self.clients))
+        profiler.end_frame()
+
+    async def run_ticks(self):
+        """Calls tick() on a fixed schedule. When ticks run late the schedule restarts rather than rushing to catch up."""
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            self.tick()
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                self.profiler.count("late_ticks")
+                next_tick, delay = loop.time(), 0
+            await asyncio.sleep(delay)
+    async def report(self):
+        """Prints tick times and bandwidth every few seconds."""
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            print(self.stats_line(), flush = True)
+    def stats_line(self) -> str:
+        """Returns percentiles of the recent ticks and the bandwidth per player."""
+        profiler = self.profiler
+        milliseconds = lambda name: "/".join(f"{value * 1000:.2f}" for value in profiler.percentiles(name))
+        players = max(1, len(self.clients))
+        bytes_per_second = sum(client.bytes_sent for client in self.clients.values()) / players
+        for client in self.clients.values():
+            client.bytes_sent = 0
+        late = sum(frame.get("late_ticks", 0) for frame in profiler.frames)
+        return (f"tick {self.arena.tick} players {len(self.clients)} tick p50/95/99 {milliseconds('frame_time')}ms "
+                f"(step {milliseconds('arena.step')} encode {milliseconds('encode')} send {milliseconds('send')}) "
+                f"late {late} {bytes_per_second / STATS_INTERVAL / 1024:.1f}KiB/s per player")
+
+    async def serve(self, host: str, port: int):
+        """Accepts players and runs the arena until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            print(f"Arena {self.arena.grid.width}x{self.arena.grid.height} listening on {host}:{port}", flush = True)
+            await asyncio.gather(self.run_ticks(), self.report())
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = settings.ARENA_PORT)
+    parser.add_argument("--size", type = int, default = settings.GRID_WIDTH, help = "arena width and height in tiles (default %(default)s)")
+    parser.add_argument("--level", type = int, default = settings.STARTING_LEVEL, choices = list(settings.LEVELS),
+                        help = "level for arenas the size of a level")
+    parser.add_argument("--bots", type = int, default = 0, help = "bot snakes to fill the arena with (default %(default)s)")
+    parser.add_argument("--seed", type = int)
+    options = parser.parse_args(arguments)
+
+    arena = Arena(options.size, options.size, options.level, seed = options.seed)
+    arena.add_bots(options.bots)
+    server = ArenaServer(arena)
+    try:
+        asyncio.run(server.serve(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""
+Loads the parts of the asset file a game needs, when it needs them, instead of all of it up front.
+"""
+
+import pyxel, settings
+from common.assets import read_image_bank
+from common.level_cache import LevelCache, next_level
+
+class AssetManager:
+    """Image banks are copied into Pyxel on first use. Levels come from the level cache, which decodes only
+    each level's region of the tilemap, and the level after the one being played is prepared in the background."""
+
+    def __init__(self, asset_file: str = settings.ASSET_FILE, levels: LevelCache = None):
+        self.asset_file = asset_file
+        self.levels = levels if levels is not None else LevelCache(asset_file)
+        self.loaded_banks = set()
+
+    def load_image_banks(self, banks: tuple = (settings.SPRITESHEET_NUMBER,)):
+        """Copies image banks from the asset file into Pyxel, skipping any already loaded."""
+        for bank in banks:
+            if bank not in self.loaded_banks:
+                pyxel.images[bank].set(0, 0, read_image_bank(self.asset_file, bank))
+                self.loaded_banks.add(bank)
+    def prefetch_next_level(self, level: int):
+        """Starts preparing the level after the specified one in settings.LEVELS, if there is one."""
+        self.levels.prefetch(next_level(level))
@@ -0,0 +1,39 @@
+"""
+Reads Pyxel resource files without importing Pyxel, so levels can be loaded headless.
+Only the entries asked for are decompressed, so big resource files cost no more than the parts in use.
+"""
+
+def read_resource(resource_file: str, name: str) -> str:
+    """Returns an entry of a .pyxres file in the pyxel 1.x format, e.g. "image0" or "tilemap0"."""
+    import zipfile #Takes longer to import than the rest of the engine, and cached levels never need it
+    with zipfile.ZipFile(resource_file) as resource:
+        try:
+            return resource.read(f"pyxel_resource/{name}").decode()
+        except KeyError:
+            raise ValueError(f"{resource_file} has no {name} in the pyxel 1.x format")
+
+def read_image_bank(resource_file: str, bank: int) -> list:
+    """Returns the rows of an image bank as strings of one hex digit per pixel, as pyxel.Image.set() takes them."""
+    return read_resource(resource_file, f"image{bank}").split()
+
+class PyxresTilemap:
+    """Read-only tilemap loaded straight from a .pyxres file.
+    Has the same pget() as pyxel.Tilemap, so it can be passed to Grid in its place.
+    With a region of (x, y, width, height) only those tiles are kept, and pget() still takes tilemap coordinates."""
+
+    def __init__(self, resource_file: str, tilemap_number: int = 0, region: tuple = None):
+        data = read_resource(resource_file, f"tilemap{tilemap_number}")
+        #Each row is a string of 4 hex digits per tile (2 for the x and 2 for the y sprite coordinate),
+        #followed by a final line with the image bank the tilemap uses
+        rows = data.split("\n")[:-1]
+        self.image_bank = int(data.rsplit("\n", 1)[-1] or 0)
+        self.width = len(rows[0]) // 4
+        self.height = len(rows)
+        self.region = region if region is not None else (0, 0, self.width, self.height)
+        region_x, region_y, region_width, region_height = self.region
+        self._rows = [row[region_x * 4:(region_x + region_width) * 4] for row in rows[region_y:region_y + region_height]]
+
+    def pget(self, x: int, y: int) -> tuple:
+        """Returns the (x,y) sprite coordinates, in tiles, of the tile at (x,y)."""
+        tile = self._rows[y - self.region[1]][(x - self.region[0]) * 4:(x - self.region[0]) * 4 + 4]
+        return (int(tile[:2], 16), int(tile[2:], 16))
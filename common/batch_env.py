@@ -0,0 +1,205 @@
+"""
+Many independent snake games stepped together with NumPy, for training and evaluating agents.
+Follows the same rules as SnekEngine, without animations or the body tile variants that only matter for drawing.
+"""
+
+import settings, random
+import numpy as np
+from common.assets import PyxresTilemap
+from common.grid import Grid, TILE_CODES, EMPTY, GAMEOVER_CODES
+
+SNAKE_HEAD = TILE_CODES["snake_head"]
+SNAKE_BODY = TILE_CODES["snake_body_straight"]
+SNAKE_TAIL = TILE_CODES["snake_tail"]
+ITEM_APPLE = TILE_CODES["item_apple"]
+ITEM_LEMON = TILE_CODES["item_lemon"]
+SPAWN_SAMPLES = 8 #Random tiles tried per spawn before falling back to searching the whole grid
+ITEM_DRAW = SPAWN_SAMPLES #Draw that picks the item type, after the tile samples
+KEY_DRAWS = SPAWN_SAMPLES + 1 #First draw of the per-tile keys when falling back, one per tile
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15) #SplitMix64 increment
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer, scrambles uint64 values into uniformly distributed bits."""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def uniform(seeds: np.ndarray, ticks: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """Returns random floats in [0, 1) with shape (len(seeds), len(draws)), one for each draw of each game.
+    Each number depends only on the game's seed, its tick and the draw number, like a counter-based generator,
+    so games never share random state however many are stepped together."""
+    counters = (ticks.astype(np.uint64)[:, None] << np.uint64(32)) | draws.astype(np.uint64)[None, :]
+    bits = mix64(seeds[:, None] + counters * GOLDEN_GAMMA)
+    return (bits >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+class BatchEnv:
+    """N games held as stacked arrays and advanced with a single vectorized step() call.
+    Finished games are reset automatically at the end of the step they ended in.
+    Every game has its own seed in game_seeds, and all of a game's randomness comes from it (see uniform()),
+    so a game is reproducible from its seed and directions alone: reset(mask, seeds) with the same seed plays
+    the same items in any slot of any batch. Seeds not given are derived from the batch seed, the slot and
+    how many games the slot has played."""
+
+    def __init__(self, num_games: int, level: int = settings.STARTING_LEVEL, seed: int = None, tilemap = None):
+        """Loads the level once and starts num_games games on it."""
+        tilemap = tilemap if tilemap is not None else PyxresTilemap(settings.ASSET_FILE)
+        level_grid = Grid(tilemap, settings.GRID_WIDTH, settings.GRID_HEIGHT,
+                          settings.LEVELS[level]['x'], settings.LEVELS[level]['y'])
+        self.num_games = num_games
+        self.width = level_grid.width
+        self.height = level_grid.height
+        self.total_tiles = level_grid.total_tiles
+        self.level_tiles = np.frombuffer(bytes(level_grid.types), dtype = np.uint8) #Level layout every game starts from
+        self.neighbors = np.frombuffer(level_grid.neighbors, dtype = np.uint32).reshape(-1, 4).astype(np.int64)
+        self.start_position = level_grid.index(*level_grid.character_start_position)
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+
+        self.spawn_ticks = round(settings.ITEM_SPAWN_INTERVAL * settings.TICK_RATE) #Rounded like ItemManager's
+        self.despawn_ticks = round(settings.ITEM_DESPAWN_INTERVAL * settings.TICK_RATE)
+        self.item_codes = np.array([TILE_CODES[item_type] for item_type in settings.ITEM_PROBABILITY], dtype = np.uint8)
+        self.item_thresholds = np.cumsum(list(settings.ITEM_PROBABILITY.values())) #Draw below each -> that item
+        self.max_items = -(-self.despawn_ticks // self.spawn_ticks) + 1 #Most items a game can have before they expire
+        self.gameover_lookup = np.zeros(256, dtype = bool) #Tile code -> whether moving onto it ends the game
+        self.gameover_lookup[list(GAMEOVER_CODES)] = True
+
+        games, tiles = num_games, self.total_tiles
+        self.tiles = np.empty((games, tiles), dtype = np.uint8) #Occupancy grid of tile codes
+        self.body = np.zeros((games, tiles), dtype = np.int64) #Ring buffer of snake cells, head at head_slot
+        self.head_slot = np.zeros(games, dtype = np.int64)
+        self.length = np.zeros(games, dtype = np.int64)
+        self.direction = np.zeros(games, dtype = np.int64)
+        self.item_tiles = np.full((games, self.max_items), -1, dtype = np.int64) #Tile of each live item, -1 for free slots
+        self.item_despawn_tick = np.zeros((games, self.max_items), dtype = np.int64) #Tick each item despawns on
+        self.score = np.zeros(games, dtype = np.int64)
+        self.controls_reversed = np.zeros(games, dtype = bool)
+        self.ticks = np.zeros(games, dtype = np.int64) #Ticks since each game started
+        self.last_spawn_tick = np.zeros(games, dtype = np.int64)
+        self.final_score = np.zeros(games, dtype = np.int64) #Score of the last finished game in each slot
+        self.game_seeds = np.zeros(games, dtype = np.uint64) #Seed of the game in each slot
+        self.games_played = np.zeros(games, dtype = np.uint64) #Games started in each slot, for deriving seeds
+        self._games = np.arange(games)
+
+        self.reset()
+
+    def reset(self, mask: np.ndarray = None, seeds: np.ndarray = None):
+        """Restarts the games selected by a boolean mask, or all of them, with the specified seeds (one per
+        selected game) or new ones derived from the batch seed."""
+        games = self._games if mask is None else np.flatnonzero(mask)
+        if games.size == 0:
+            return
+        if seeds is None:
+            slot_counters = (games.astype(np.uint64) << np.uint64(32)) | self.games_played[games]
+            seeds = mix64(mix64(np.full(games.size, self.seed, dtype = np.uint64)) + slot_counters * GOLDEN_GAMMA)
+        self.game_seeds[games] = seeds
+        self.games_played[games] += np.uint64(1)
+        # The snake starts on the start marker facing up, with its body trailing downwards
+        snake_length = settings.SNAKE_START_LENGTH + 2
+        cells = [self.start_position]
+        for _ in range(snake_length - 1):
+            cells.append(int(self.neighbors[cells[-1], settings.DIRECTIONS["down"]]))
+        snake_tiles = [SNAKE_HEAD] + [SNAKE_BODY] * (snake_length - 2) + [SNAKE_TAIL]
+
+        self.tiles[games] = self.level_tiles
+        self.tiles[np.ix_(games, cells)] = snake_tiles
+        self.body[games, :snake_length] = cells[::-1] #Tail first, head last
+        self.head_slot[games] = snake_length - 1
+        self.length[games] = snake_length
+        self.direction[games] = settings.SNAKE_START_DIRECTION
+        self.item_tiles[games] = -1
+        self.score[games] = 0
+        self.controls_reversed[games] = False
+        self.ticks[games] = 0
+        self.last_spawn_tick[games] = 0
+
+    def observe(self) -> np.ndarray:
+        """Returns a copy of every game's tile codes with shape (games, height, width)."""
+        return self.tiles.reshape(self.num_games, self.height, self.width).copy()
+
+    def step(self, directions: np.ndarray) -> tuple:
+        """Advances every game one tick. Directions are values from settings.DIRECTIONS, or -1 to keep going.
+        Returns (observations, rewards, dones); rewards are score gained this tick."""
+        games = self._games
+        capacity = self.total_tiles
+        requested = np.asarray(directions, dtype = np.int64)
+
+        # The snake can't double back on itself, and lemons reverse the controls
+        turning = (requested >= 0) & (requested != self.direction) & (requested != (self.direction + 2) % 4)
+        requested = np.where(self.controls_reversed, (requested + 2) % 4, requested)
+        self.direction = np.where(turning, requested, self.direction)
+
+        head = self.body[games, self.head_slot]
+        target = self.neighbors[head, self.direction]
+        target_code = self.tiles[games, target]
+        dones = self.gameover_lookup[target_code]
+        alive = ~dones
+
+        # Eat items
+        ate_apple = alive & (target_code == ITEM_APPLE)
+        ate_lemon = alive & (target_code == ITEM_LEMON)
+        previous_score = self.score.copy()
+        self.score += np.where(ate_apple, np.where(self.controls_reversed, 3, 1), 0)
+        self.score += np.where(ate_lemon & self.controls_reversed, 3, 0)
+        self.controls_reversed = np.where(ate_lemon, True, np.where(ate_apple, False, self.controls_reversed))
+        grow = ate_apple | ate_lemon
+        eaten = self.item_tiles[grow] == target[grow, None]
+        self.item_tiles[grow] = np.where(eaten, -1, self.item_tiles[grow])
+
+        # Move the head
+        moving = games[alive]
+        self.tiles[moving, head[alive]] = SNAKE_BODY
+        self.tiles[moving, target[alive]] = SNAKE_HEAD
+        self.head_slot[alive] = (self.head_slot[alive] + 1) % capacity
+        self.body[moving, self.head_slot[alive]] = target[alive]
+        # Move the tail if the snake is not getting longer
+        shrinking = alive & ~grow
+        tail_games = games[shrinking]
+        tail_slot = (self.head_slot[shrinking] - self.length[shrinking]) % capacity
+        self.tiles[tail_games, self.body[tail_games, tail_slot]] = EMPTY
+        self.tiles[tail_games, self.body[tail_games, (tail_slot + 1) % capacity]] = SNAKE_TAIL
+        self.length += grow
+
+        self.update_items(alive)
+        self.ticks += 1
+
+        rewards = self.score - previous_score
+        self.final_score = np.where(dones, self.score, self.final_score)
+        self.reset(dones)
+        return self.observe(), rewards, dones
+
+    def update_items(self, alive: np.ndarray):
+        """Spawns and despawns items in the games that are still running.
+        Only the games' item slots are looked at, so the cost follows the number of items rather than the grid size."""
+        spawning = np.flatnonzero(alive & (self.ticks - self.last_spawn_tick >= self.spawn_ticks))
+        if spawning.size:
+            self.last_spawn_tick[spawning] = self.ticks[spawning]
+            spawn_tiles = self.find_empty_tiles(spawning)
+            has_room = spawn_tiles >= 0
+            spawning, spawn_tiles = spawning[has_room], spawn_tiles[has_room]
+            slots = np.argmax(self.item_tiles[spawning] < 0, axis = 1) #First free slot, there's always one
+            item_draws = uniform(self.game_seeds[spawning], self.ticks[spawning], np.array([ITEM_DRAW]))[:, 0]
+            item_types = np.minimum(np.searchsorted(self.item_thresholds, item_draws, side = "right"), len(self.item_codes) - 1)
+            self.tiles[spawning, spawn_tiles] = self.item_codes[item_types]
+            self.item_tiles[spawning, slots] = spawn_tiles
+            self.item_despawn_tick[spawning, slots] = self.ticks[spawning] + self.despawn_ticks
+
+        expired = alive[:, None] & (self.item_tiles >= 0) & (self.ticks[:, None] >= self.item_despawn_tick)
+        if expired.any():
+            expired_games, expired_slots = np.nonzero(expired)
+            self.tiles[expired_games, self.item_tiles[expired_games, expired_slots]] = EMPTY
+            self.item_tiles[expired_games, expired_slots] = -1
+    def find_empty_tiles(self, games: np.ndarray) -> np.ndarray:
+        """Returns a uniformly random empty tile for each of the specified games, or -1 where a game has none.
+        A few random tiles are tried first, which nearly always finds one, and only games where they're
+        all taken fall back to ranking every tile by a random key."""
+        seeds, ticks = self.game_seeds[games], self.ticks[games]
+        samples = (uniform(seeds, ticks, np.arange(SPAWN_SAMPLES)) * self.total_tiles).astype(np.int64)
+        sample_empty = self.tiles[games[:, None], samples] == EMPTY
+        found = sample_empty.any(axis = 1)
+        empty_tiles = np.where(found, samples[np.arange(games.size), np.argmax(sample_empty, axis = 1)], -1)
+        crowded = np.flatnonzero(~found)
+        if crowded.size:
+            keys = uniform(seeds[crowded], ticks[crowded], np.arange(KEY_DRAWS, KEY_DRAWS + self.total_tiles))
+            keys[self.tiles[games[crowded]] != EMPTY] = -1.0
+            best = keys.argmax(axis = 1)
+            empty_tiles[crowded] = np.where(keys[np.arange(crowded.size), best] >= 0.0, best, -1)
+        return empty_tiles
@@ -0,0 +1,185 @@
+"""
+Grids much bigger than the screen, stored in square chunks that are only allocated once something is written to them.
+"""
+
+import settings, struct, common.utils as utils
+from array import array
+from common.animation import AnimationScheduler
+from common.grid import Grid, EMPTY
+
+# Width, height, start x, start y, number of allocated chunks, number of non-empty tiles
+STATE_HEADER = struct.Struct("<HHHHII")
+CHUNK_NUMBER = struct.Struct("<I")
+
+class ChunkedBuffer:
+    """Byte per tile buffer made of chunks allocated on the first non-zero write and freed again
+    when they go back to all zeros. Unallocated chunks read as 0.
+    Tile indices are chunk-major, so the chunk of an index is index >> shift."""
+    __slots__ = ("chunks", "counts", "shift", "mask", "total_tiles")
+
+    def __init__(self, chunk_bits: int, total_tiles: int):
+        self.chunks = {} #Chunk number -> bytearray of the chunk's tiles
+        self.counts = {} #Chunk number -> number of non-zero tiles in it
+        self.shift = 2 * chunk_bits
+        self.mask = (1 << self.shift) - 1
+        self.total_tiles = total_tiles
+
+    def __len__(self) -> int:
+        return self.total_tiles
+    def __getitem__(self, index: int) -> int:
+        chunk = self.chunks.get(index >> self.shift)
+        return 0 if chunk is None else chunk[index & self.mask]
+    def __setitem__(self, index: int, value: int):
+        number = index >> self.shift
+        chunk = self.chunks.get(number)
+        if chunk is None:
+            if value == 0:
+                return
+            chunk = self.chunks[number] = bytearray(self.mask + 1)
+            self.counts[number] = 0
+        offset = index & self.mask
+        if chunk[offset] == 0:
+            self.counts[number] += value != 0
+        elif value == 0:
+            self.counts[number] -= 1
+            if self.counts[number] == 0:
+                del self.chunks[number], self.counts[number]
+                return
+        chunk[offset] = value
+    def load(self, chunks: dict):
+        """Replaces the contents with chunks of bytes, by chunk number."""
+        self.chunks, self.counts = {}, {}
+        for number, chunk in chunks.items():
+            chunk = bytearray(chunk)
+            count = len(chunk) - chunk.count(0)
+            if count:
+                self.chunks[number], self.counts[number] = chunk, count
+    def __iter__(self):
+        """Yields every tile, which is as slow as the grid is big."""
+        for index in range(self.total_tiles):
+            yield self[index]
+
+class NeighborTable:
+    """Stands in for Grid.neighbors, working neighbors out on demand instead of storing 4 per tile."""
+    __slots__ = ("grid",)
+
+    def __init__(self, grid: "ChunkedGrid"):
+        self.grid = grid
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[entry] for entry in range(*key.indices(self.grid.total_tiles << 2))]
+        return self.grid.neighbor(key >> 2, key & 3)
+
+class ChunkedGrid(Grid):
+    """Wrap-around grid of any size that is a multiple of the chunk size, with the same interface as Grid.
+    Memory goes with the chunks that have been written to rather than the size of the grid, so most of
+    a huge grid costs nothing until the snake gets there. Indices number the tiles chunk by chunk,
+    so use index() and coordinates() rather than working them out from the width."""
+
+    def __init__(self, width: int, height: int, chunk_size: int = settings.CHUNK_SIZE):
+        chunk_bits = chunk_size.bit_length() - 1
+        if chunk_size != 1 << chunk_bits or width % chunk_size or height % chunk_size:
+            raise ValueError(f"Chunk size must be a power of 2 that divides the grid size, not {chunk_size} for {width}x{height}")
+        self.tilemap = None
+        self.width = width
+        self.height = height
+        self.total_tiles = width * height
+        self.chunk_size = chunk_size
+        self.chunk_bits = chunk_bits
+        self.chunks_per_row = width // chunk_size
+        self.types = ChunkedBuffer(chunk_bits, self.total_tiles) #Tile type codes, all empty
+        self.rotations = ChunkedBuffer(chunk_bits, self.total_tiles)
+        self.frames = ChunkedBuffer(chunk_bits, self.total_tiles) #Current animation frame of animated tiles
+        self.neighbors = NeighborTable(self)
+        self.empty_tiles = utils.ComplementSet(self.total_tiles) #Indices of empty tiles
+        self.updated_tiles = set() #Indices of tiles that have been updated since the last frame
+        self.animated_tiles = AnimationScheduler() #Indices of tiles that are currently animating
+        self.listeners = []
+        self.character_start_position = utils.Point(width // 2, height // 2)
+
+    def index(self, x: int, y: int) -> int:
+        """Returns the buffer index of the tile at (x,y), wrapping around the edges."""
+        x %= self.width
+        y %= self.height
+        bits, mask = self.chunk_bits, self.chunk_size - 1
+        chunk = (y >> bits) * self.chunks_per_row + (x >> bits)
+        return (chunk << (2 * bits)) | ((y & mask) << bits) | (x & mask)
+    def coordinates(self, index: int) -> tuple:
+        """Returns the (x,y) coordinates of a buffer index."""
+        bits, mask = self.chunk_bits, self.chunk_size - 1
+        chunk_y, chunk_x = divmod(index >> (2 * bits), self.chunks_per_row)
+        return ((chunk_x << bits) | (index & mask), (chunk_y << bits) | ((index >> bits) & mask))
+    def neighbor(self, index: int, direction: int = 0) -> int:
+        """Returns the buffer index of the neighboring tile in the specified direction."""
+        x, y = self.coordinates(index)
+        if direction == 0:
+            return self.index(x, y - 1)
+        elif direction == 1:
+            return self.index(x + 1, y)
+        elif direction == 2:
+            return self.index(x, y + 1)
+        return self.index(x - 1, y)
+
+    def allocated_chunks(self) -> int:
+        """Returns how many chunks hold tile types."""
+        return len(self.types.chunks)
+
+    def pack_state(self, output: bytearray):
+        """Appends the contents of the grid to output: the header, the number, tile types and rotations of
+        each allocated chunk, the non-empty tiles, the animations, then the frame of each animated tile.
+        Chunks and tiles are sorted, so the same grid always packs to the same bytes."""
+        excluded = array("I", sorted(self.empty_tiles.excluded))
+        output += STATE_HEADER.pack(self.width, self.height, *self.character_start_position, len(self.types.chunks), len(excluded))
+        chunk_tiles = self.types.mask + 1
+        for number in sorted(self.types.chunks):
+            output += CHUNK_NUMBER.pack(number)
+            output += self.types.chunks[number]
+            output += self.rotations.chunks.get(number) or bytes(chunk_tiles)
+        output += excluded
+        self.pack_animations(output)
+    def unpack_state(self, data: memoryview, offset: int) -> int:
+        """Restores contents written by pack_state() at offset in data on a grid of the same size, and
+        returns the offset after them. Tiles aren't marked as updated, so the whole grid needs redrawing afterwards."""
+        width, height, start_x, start_y, chunk_count, excluded_count = STATE_HEADER.unpack_from(data, offset)
+        if (width, height) != (self.width, self.height):
+            raise ValueError(f"State is for a {width}x{height} grid but the grid is {self.width}x{self.height}")
+        offset += STATE_HEADER.size
+        chunk_tiles = self.types.mask + 1
+        types, rotations = {}, {}
+        for _ in range(chunk_count):
+            number, = CHUNK_NUMBER.unpack_from(data, offset)
+            offset += CHUNK_NUMBER.size
+            types[number] = data[offset:offset + chunk_tiles]
+            rotations[number] = data[offset + chunk_tiles:offset + 2 * chunk_tiles]
+            offset += 2 * chunk_tiles
+        self.types.load(types)
+        self.rotations.load(rotations)
+        self.frames.load({})
+        excluded = array("I")
+        excluded.frombytes(data[offset:offset + 4 * excluded_count])
+        self.empty_tiles = utils.ComplementSet(self.total_tiles, excluded)
+        offset = self.unpack_animations(data, offset + 4 * excluded_count)
+        self.updated_tiles.clear()
+        self.character_start_position = utils.Point(start_x, start_y)
+        self.notify_replaced()
+        return offset
+    def load_compiled_level(self, level):
+        """Stamps a level from level_cache.CompiledLevel into the middle of the grid, which should be empty.
+        Tiles aren't marked as updated, so the whole grid needs redrawing afterwards."""
+        if level.width > self.width or level.height > self.height:
+            raise ValueError(f"Level is {level.width}x{level.height} but the grid is only {self.width}x{self.height}")
+        left, top = (self.width - level.width) // 2, (self.height - level.height) // 2
+        animated = dict(level.animated_tiles)
+        for level_index, (tile_code, rotation) in enumerate(zip(level.tile_codes(), level.rotations())):
+            if tile_code == EMPTY:
+                continue
+            y, x = divmod(level_index, level.width)
+            index = self.index(left + x, top + y)
+            self.set_tile(index, tile_code, rotation)
+            if level_index in animated:
+                self.start_animation(index, starting_frame = animated[level_index])
+        self.updated_tiles.clear()
+        self.character_start_position = utils.Point(left + level.character_start_position.x,
+                                                    top + level.character_start_position.y)
+        self.notify_replaced()
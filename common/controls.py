@@ -0,0 +1,48 @@
+"""
+Player input buffering and fixed-timestep simulation, so the game can be drawn and read from the keyboard
+much more often than the snake moves.
+"""
+
+import settings
+from collections import deque
+
+class InputQueue:
+    """Direction presses sampled every frame and handed out one per simulation tick,
+    so quick presses between ticks aren't lost and two quick turns take two ticks."""
+
+    def __init__(self, size: int = settings.INPUT_QUEUE_SIZE):
+        self._directions = deque(maxlen = size) #Oldest first. When full, the oldest press is dropped.
+
+    def __len__(self) -> int:
+        return len(self._directions)
+
+    def push(self, direction: int):
+        """Adds a pressed direction, unless it repeats the last one."""
+        if not self._directions or self._directions[-1] != direction:
+            self._directions.append(direction)
+    def peek(self) -> int:
+        """Returns the direction the next tick will get, or None."""
+        return self._directions[0] if self._directions else None
+    def pop(self) -> int:
+        """Returns and removes the oldest direction, or None if there isn't one."""
+        return self._directions.popleft() if self._directions else None
+    def clear(self):
+        self._directions.clear()
+
+class FixedTimestep:
+    """Works out how many simulation ticks are due each frame when ticks and frames run at different rates.
+    Counts in whole frames rather than reading the clock, so the same frames always give the same ticks."""
+
+    def __init__(self, tick_rate: int = settings.TICK_RATE, frame_rate: int = settings.FPS):
+        self.tick_rate = tick_rate
+        self.frame_rate = frame_rate
+        self._accumulator = 0 #Progress towards the next tick, in units of 1 / (tick_rate * frame_rate) seconds
+
+    def advance(self) -> int:
+        """Moves forward a frame and returns how many ticks are due."""
+        self._accumulator += self.tick_rate
+        ticks, self._accumulator = divmod(self._accumulator, self.frame_rate)
+        return ticks
+    def progress(self) -> float:
+        """Returns how far it is from the last tick to the next one, from 0 up to 1."""
+        return self._accumulator / self.frame_rate
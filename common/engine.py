@@ -0,0 +1,212 @@
+"""
+Headless snake game rules. Nothing here imports Pyxel or reads the wall clock,
+so games can be stepped as fast as the CPU allows for testing, bots and analysis.
+"""
+
+import settings, random, struct
+from common.level_cache import LevelCache
+from common.grid import Grid, TILE_NAMES, TILE_CODES, EMPTY, GAMEOVER_CODES
+from common.chunked_grid import ChunkedGrid
+from common.snake import Snake
+from common.item_manager import ItemManager
+from common.regions import Regions
+
+ITEM_APPLE = TILE_CODES["item_apple"]
+ITEM_LEMON = TILE_CODES["item_lemon"]
+ITEM_BOMB = TILE_CODES["item_bomb"]
+
+SNAPSHOT_MAGIC = b"SNKS"
+SNAPSHOT_VERSION = 2 #Bump whenever the layout of any part of a snapshot changes
+# Magic, version, tick, score, level, game over, cause of death, controls reversed
+SNAPSHOT_HEADER = struct.Struct("<4sHqiHBBB")
+# Mersenne Twister state words and position, whether there is a spare gauss() value, and that value
+RNG_STATE = struct.Struct("<625I?d")
+DEATH_CAUSES = [None, "self", *TILE_NAMES] #Cause of death codes in snapshots
+DEATH_CAUSE_CODES = {cause: code for code, cause in enumerate(DEATH_CAUSES)}
+
+class SnekEngine:
+    """Game state and rules for a single game, advanced one tick at a time."""
+
+    def __init__(self, levels: LevelCache = None, level: int = settings.STARTING_LEVEL, seed: int = None,
+                 world_size: tuple = None):
+        """Initialize game variables. Levels come from the asset file's level cache unless another is given,
+        or are generated from the seed if settings.PROCEDURAL_LEVELS is set. With a world_size of (width, height)
+        the level sits in the middle of a bigger, chunked world, which defaults to settings.WORLD_WIDTH/HEIGHT if those are set."""
+        if world_size is None and settings.WORLD_WIDTH is not None:
+            world_size = (settings.WORLD_WIDTH, settings.WORLD_HEIGHT)
+        self.world_size = world_size
+        self.seed = seed if seed is not None else random.randrange(2 ** 63) #Recorded so games can be replayed
+        self.rng = random.Random(self.seed) #All gameplay randomness comes from here
+        if levels is None and settings.PROCEDURAL_LEVELS:
+            from common.level_generator import LevelGenerator #Only needs NumPy when levels are generated
+            levels = LevelGenerator(self.seed)
+        self.levels = levels if levels is not None else LevelCache()
+        self.grid = None
+        self.regions = None #Regions of the level, for spawning items where the snake can reach
+        self.item_manager = None
+        self.snake = None
+        self.tick = 0 #Ticks since the engine was created
+        self.profiler = None #Optional profiler.FrameProfiler that times each phase of a tick
+
+        self.score = 0
+        self.level = level
+        self.game_over = False
+        self.death_cause = None #What ended the game: "self", or the tile type the snake ran into
+        self.controls_reversed = False
+
+        self.reset(level)
+
+    def create_grid(self) -> Grid:
+        """Returns an empty grid the size of a level, or of the world if there is one."""
+        if self.world_size is not None:
+            return ChunkedGrid(*self.world_size)
+        return Grid(None, settings.GRID_WIDTH, settings.GRID_HEIGHT)
+    def initialize_grid(self, level: int) -> Grid:
+        """Initializes the grid with the compiled level."""
+        grid = self.create_grid()
+        grid.load_compiled_level(self.levels.get(level))
+        return grid
+    def initialize_regions(self) -> Regions:
+        """Floods the level into the regions walls separate, or returns None in a big world."""
+        if self.world_size is not None:
+            return None
+        return Regions(self.grid)
+    def initialize_items(self) -> ItemManager:
+        """Initializes the item manager. Items spawn in the snake's region of the level,
+        or in a big world on the screen around the snake."""
+        if self.world_size is not None:
+            return ItemManager(self.grid, rng = self.rng, spawn_near = lambda: self.snake.head,
+                               spawn_area = (settings.GRID_WIDTH, settings.GRID_HEIGHT))
+        return ItemManager(self.grid, rng = self.rng, regions = self.regions, reachable_from = lambda: self.snake.head)
+    def initialize_snake(self) -> Snake:
+        """Initializes the snake."""
+        return Snake(self.grid, self.grid.character_start_position)
+
+    def reset(self, level: int):
+        """Initialize snake, score, items, etc."""
+        self.score = 0
+        self.level = level
+        self.game_over = False
+        self.death_cause = None
+        self.controls_reversed = False
+
+        self.grid = self.initialize_grid(level)
+        self.regions = self.initialize_regions()
+        self.item_manager = self.initialize_items()
+        self.snake = self.initialize_snake()
+    def end(self, cause: str = None):
+        """Ends the current game."""
+        self.game_over = True
+        self.death_cause = cause
+
+    def snapshot(self) -> bytes:
+        """Returns the full game state packed into bytes: a versioned header and the random number generator,
+        then the grid and its regions, snake and item manager. The same state always gives the same bytes."""
+        output = bytearray(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.tick, self.score, self.level,
+                                                self.game_over, DEATH_CAUSE_CODES[self.death_cause], self.controls_reversed))
+        _, internal_state, gauss = self.rng.getstate()
+        output += RNG_STATE.pack(*internal_state, gauss is not None, gauss or 0.0)
+        self.grid.pack_state(output)
+        if self.regions is not None:
+            self.regions.pack_state(output)
+        self.snake.pack_state(output)
+        self.item_manager.pack_state(output)
+        return bytes(output)
+    def restore(self, snapshot: bytes):
+        """Restores a snapshot taken with snapshot() by an engine with the same world size.
+        The grid is restored in place and its listeners told it was replaced. The snake and item manager are replaced."""
+        data = memoryview(snapshot)
+        magic, version, tick, score, level, game_over, death_cause, controls_reversed = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a game snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}, expected {SNAPSHOT_VERSION}")
+        offset = SNAPSHOT_HEADER.size
+        *internal_state, has_gauss, gauss = RNG_STATE.unpack_from(data, offset)
+        offset += RNG_STATE.size
+        grid = self.grid if self.grid is not None else self.create_grid()
+        offset = grid.unpack_state(data, offset)
+        if self.regions is not None:
+            offset = self.regions.unpack_state(data, offset) #Flooded again when the grid was replaced
+        snake, offset = Snake.unpack_state(grid, data, offset)
+
+        self.rng.setstate((3, tuple(internal_state), gauss if has_gauss else None))
+        self.tick, self.score, self.level = tick, score, level
+        self.game_over, self.death_cause, self.controls_reversed = bool(game_over), DEATH_CAUSES[death_cause], bool(controls_reversed)
+        self.grid, self.snake = grid, snake
+        self.item_manager = self.initialize_items()
+        self.item_manager.unpack_state(data, offset)
+
+    def resolve_direction(self, requested_direction: int = None) -> int:
+        """Returns the direction the snake will move in when the player asks for requested_direction.
+        The snake can't double back on itself, and lemons reverse the controls."""
+        current_direction = self.snake.direction
+        if requested_direction is None or requested_direction in (current_direction, (current_direction + 2) % 4):
+            return current_direction
+        if self.controls_reversed: #Turning the other way, still at right angles, so this can't double back either
+            return (requested_direction + 2) % 4
+        return requested_direction
+    def move_snake(self, direction: int):
+        """Checks if the snake can move and moves it."""
+        new_head = self.grid.neighbor(self.snake.head, direction)
+        tile_code = self.grid.types[new_head]
+        elongate_snake = False
+
+        #Check if the snake is going to collide with itself or an item
+        if self.snake.occupies(new_head):
+            self.end("self") #End the game if the snake is going to collide with itself
+        elif tile_code == ITEM_BOMB: #Explodes the snake
+            self.grid.update_tile(*self.grid.coordinates(new_head),
+                                  "animation.exploding_bomb", is_animated = True, animation_cycles = 1)
+            self.end(TILE_NAMES[ITEM_BOMB])
+        elif tile_code in GAMEOVER_CODES:
+            self.end(TILE_NAMES[tile_code]) #End the game if the snake is going to collide with a wall
+        elif tile_code in (EMPTY, ITEM_LEMON, ITEM_APPLE):
+            if tile_code == ITEM_LEMON: #Reverses controls until an apple is eaten
+                if self.controls_reversed:
+                    self.score += 3
+                self.controls_reversed = True
+                elongate_snake = True
+            elif tile_code == ITEM_APPLE: #Makes the snake longer
+                if self.controls_reversed == True:
+                    self.controls_reversed = False
+                    self.score += 3
+                else:
+                    self.score += 1
+                elongate_snake = True
+            if not self.game_over:
+                self.snake.move_forward(direction, elongate_snake)
+                if elongate_snake:
+                    self.item_manager.remove_item(new_head, clear_tile = False)
+
+    def idle(self):
+        """Advances a tick without moving the snake, e.g. while paused or after a game over."""
+        self.grid.update()
+        self.tick += 1
+    def step(self, requested_direction: int = None):
+        """Advances the game one tick, turning towards requested_direction if possible."""
+        if self.profiler is not None:
+            self.profiled_step(requested_direction)
+            return
+        self.grid.update()
+        if not self.game_over:
+            self.move_snake(self.resolve_direction(requested_direction))
+            #Update the items if the game is not over
+            if not self.game_over:
+                self.item_manager.update()
+        self.tick += 1
+    def profiled_step(self, requested_direction: int = None):
+        """Same as step(), timing each phase with the profiler."""
+        profiler = self.profiler
+        started = profiler.start()
+        self.grid.update()
+        profiler.stop("grid.update", started)
+        if not self.game_over:
+            started = profiler.start()
+            self.move_snake(self.resolve_direction(requested_direction))
+            profiler.stop("move_snake", started)
+            if not self.game_over:
+                started = profiler.start()
+                self.item_manager.update()
+                profiler.stop("item_manager.update", started)
+        self.tick += 1
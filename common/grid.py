@@ -1,219 +1,305 @@
-import settings, pyxel, common.utils as utils
+import settings, struct, common.utils as utils
+from array import array
+from functools import lru_cache
+from common.animation import AnimationScheduler
+
+# Integer codes for each tile type, in the order they are declared in settings.TILES.
+# "empty" is declared first, so a zeroed buffer is an empty grid.
+TILE_NAMES = list(settings.TILES)
+TILE_CODES = {tile_type: code for code, tile_type in enumerate(TILE_NAMES)}
+EMPTY = TILE_CODES["empty"]
+GAMEOVER_CODES = frozenset(TILE_CODES[tile_type] for tile_type in settings.GAMEOVER_TILES)
+STATIC_CODES = frozenset(TILE_CODES[tile_type] for tile_type in settings.STATIC_TILES)
+# Vertical spritesheet offset and number of animation frames (0 for static tiles) per tile code
+SPRITE_OFFSETS = [offset[0] if isinstance(offset, tuple) else offset for offset in settings.TILES.values()]
+ANIMATION_FRAMES = [offset[1] if isinstance(offset, tuple) else 0 for offset in settings.TILES.values()]
+# Tile code for each vertical spritesheet offset, used when reading levels from the tilemap
+SPRITE_CODES = {offset: code for code, offset in enumerate(SPRITE_OFFSETS)}
+# Width, height, start x, start y, number of empty tiles
+STATE_HEADER = struct.Struct("<HHHHI")
 
 class Tile:
-    """Tile object class."""
-    def __init__(self, grid_x: int, grid_y: int, tile_type: str, rotation: int):
-        # Tile variables
-        self._x: int = grid_x
-        self._y: int = grid_y
-        self._tile_type: str = tile_type
-        self._rotation: int = rotation
+    """Tile object class. A lightweight view of a single cell of a grid."""
+    __slots__ = ("_grid", "_index")
+
+    def __init__(self, grid: "Grid", index: int):
+        self._grid = grid
+        self._index = index
 
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Tile) and self._grid is other._grid and self._index == other._index
+    def __hash__(self) -> int:
+        return self._index
+
+    @property
+    def index(self) -> int:
+        """Returns the index of the tile in the grid buffers."""
+        return self._index
     @property
     def x(self) -> int:
         """Returns tile x coordinate as an integer."""
-        return self._x
+        return self._grid.coordinates(self._index)[0]
     @property
     def y(self) -> int:
         """Returns tile y coordinate as an integer."""
-        return self._y
+        return self._grid.coordinates(self._index)[1]
     @property
     def grid_coordinates(self) -> utils.Point:
         """Returns tile coordinates as a Point object."""
-        return utils.Point(self._x, self._y)
+        return utils.Point(*self._grid.coordinates(self._index))
+    @property
+    def tile_code(self) -> int:
+        """Returns tile type as an integer code."""
+        return self._grid.types[self._index]
     @property
     def tile_type(self) -> str:
         """Returns tile type as a string."""
-        return self._tile_type
+        return TILE_NAMES[self._grid.types[self._index]]
     @property
     def rotation(self) -> int:
         """Returns tile rotation as an integer."""
-        return self._rotation
+        return self._grid.rotations[self._index]
     @property
     def is_animated(self) -> bool:
         """Returns whether the tile is animated."""
         return False
 class AnimatedTile(Tile):
     """Animated tile object class."""
-    def __init__(self, grid_x: int, grid_y: int, tile_type: str, rotation: int, 
-                    animation_cycles: int = -1, 
-                    tile_type_after_animation: str = "empty", rotation_after_animation: int = 0):
-        super().__init__(grid_x, grid_y, tile_type, rotation)
-        # Animation variables
-        self.current_animation_frame: int = 0
-        self.animation_cycles_remaining: int = animation_cycles
-        self._total_animation_frames: int = settings.TILES[tile_type][1]
-        self._tile_type_after_animation: str = tile_type_after_animation
-        self._rotation_after_animation: int = rotation_after_animation
+    __slots__ = ()
 
+    @property
+    def current_animation_frame(self) -> int:
+        """Returns the current animation frame."""
+        return self._grid.frames[self._index]
+    @property
+    def animation_cycles_remaining(self) -> int:
+        """Returns how many more times the animation will play, or -1 if it loops forever."""
+        return self._grid.animated_tiles[self._index][0]
     @property
     def total_animation_frames(self) -> int:
         """Returns the total number of animation frames."""
-        return self._total_animation_frames
+        return ANIMATION_FRAMES[self._grid.types[self._index]]
     @property
     def is_animated(self) -> bool:
-            """Returns whether the tile is animated."""
-            return True
+        """Returns whether the tile is animated."""
+        return True
     @property
     def tile_type_after_animation(self) -> str:
         """Returns the tile type after the animation is complete."""
-        return self._tile_type_after_animation
+        return TILE_NAMES[self._grid.animated_tiles[self._index][1]]
     @property
     def rotation_after_animation(self) -> int:
         """Returns the rotation after the animation is complete."""
-        return self._rotation_after_animation
+        return self._grid.animated_tiles[self._index][2]
 class Grid:
-    """Grid object class."""
+    """Grid object class.
+    Tile type codes, rotations and animation frames are stored in flat buffers indexed by y * width + x.
+    Levels are read from any tilemap with a pget(x, y) method, such as pyxel.Tilemap or assets.PyxresTilemap,
+    or copied in from a compiled level. Without a tilemap the grid starts out empty."""
 
-    def __init__(self, tilemap: pyxel.Tilemap, width: int, height: int, level_x: int, level_y: int):
+    def __init__(self, tilemap, width: int, height: int, level_x: int = 0, level_y: int = 0):
         self.tilemap = tilemap
         self.width = width
         self.height = height
         self.total_tiles = width * height
-        self.tiles = [[] for _ in range(width)] #Initialize grid as a 2D list
-        #Fill grid with empty tiles and keep track of them in a list
-        self.empty_tiles = []
-        for i in range(self.total_tiles):
-            new_tile_x = i % width
-            new_tile_y = int(i / width)
-            self.tiles[new_tile_x].append(Tile(new_tile_x, new_tile_y, "empty", 0))
-            self.empty_tiles.append(self.tiles[new_tile_x][new_tile_y])
-        self.updated_tiles = [] #List of tiles that have been updated since the last frame
-        self.animated_tiles = [] #List of tiles that are currently animating
-        self.character_tiles = [] #List of tiles that are currently occupied by the character
-        self.character_start_position = self.load_level(level_x, level_y, self.tilemap) #Load the character's starting position from the level file
+        self.types = bytearray(self.total_tiles) #Tile type codes, all empty
+        self.rotations = bytearray(self.total_tiles)
+        self.frames = bytearray(self.total_tiles) #Current animation frame of animated tiles
+        self.neighbors = self.build_neighbor_table(width, height)
+        self.empty_tiles = utils.IndexedSet.full(self.total_tiles) #Indices of empty tiles
+        self.updated_tiles = set() #Indices of tiles that have been updated since the last frame
+        self.animated_tiles = AnimationScheduler() #Indices of tiles that are currently animating
+        # Callables told about every tile type change as listener(index, old_code, new_code),
+        # or listener(None, None, None) when the whole grid is replaced
+        self.listeners = []
+        self.character_start_position = utils.Point(width // 2, height // 2)
+        if tilemap is not None:
+            self.character_start_position = self.load_level(level_x, level_y, self.tilemap) #Load the character's starting position from the level file
 
+    @staticmethod
+    @lru_cache(maxsize = 8)
+    def build_neighbor_table(width: int, height: int) -> array:
+        """Returns a table of wrapped-around neighbor indices, 4 entries per tile in direction order.
+        Tables are shared between grids of the same size and must not be modified."""
+        neighbors = array("I")
+        for y in range(height):
+            up = ((y - 1) % height) * width
+            down = ((y + 1) % height) * width
+            row = y * width
+            for x in range(width):
+                neighbors.extend((up + x, row + (x + 1) % width, down + x, row + (x - 1) % width))
+        return neighbors
+
+    def index(self, x: int, y: int) -> int:
+        """Returns the buffer index of the tile at (x,y), wrapping around the edges."""
+        return (y % self.height) * self.width + (x % self.width)
+    def coordinates(self, index: int) -> tuple:
+        """Returns the (x,y) coordinates of a buffer index."""
+        return (index % self.width, index // self.width)
+    def tile_at(self, index: int) -> Tile:
+        """Returns a tile view for a buffer index."""
+        if index in self.animated_tiles:
+            return AnimatedTile(self, index)
+        return Tile(self, index)
     def get_tile(self, x: int, y: int) -> Tile:
         """Returns tile at (x,y)."""
-        return self.tiles[x % len(self.tiles)][y % len(self.tiles[0])]
+        return self.tile_at(self.index(x, y))
+
+    def set_tile(self, index: int, tile_code: int, rotation: int = 0):
+        """Changes the type and rotation of the tile at a buffer index without creating a tile view."""
+        old_code = self.types[index]
+        if old_code == tile_code and self.rotations[index] == rotation:
+            return
+        # Maintain list of empty tiles, which only changes when a tile becomes or stops being empty
+        if old_code == EMPTY and tile_code != EMPTY:
+            self.empty_tiles.discard(index)
+        elif old_code != EMPTY and tile_code == EMPTY:
+            self.empty_tiles.add(index)
+        if index in self.animated_tiles:
+            self.animated_tiles.stop(index)
+            self.frames[index] = 0
+        self.types[index] = tile_code
+        self.rotations[index] = rotation
+        self.updated_tiles.add(index)
+        if self.listeners and old_code != tile_code:
+            for listener in self.listeners:
+                listener(index, old_code, tile_code)
     def update_tile(self, x: int, y: int, tile_type: str, rotation: int = 0,
-                    is_animated: bool = False, 
-                    animation_cycles: int = -1, 
+                    is_animated: bool = False,
+                    animation_cycles: int = -1,
                     tile_type_after_animation: str = "empty",
                     rotation_after_animation: int = 0,
                     animation_starting_frame: int = 0) -> Tile:
-        """Change, draw, and return the tile at (x,y)."""
-        old_tile = self.get_tile(x, y)
-        new_tile = None
+        """Change and return the tile at (x,y)."""
+        index = self.index(x, y)
+        self.set_tile(index, TILE_CODES[tile_type], rotation)
         if is_animated:
-            new_tile = AnimatedTile(x, y, tile_type, rotation,
-                                           animation_cycles, tile_type_after_animation, rotation_after_animation)
-            new_tile.current_animation_frame = animation_starting_frame
-            self.animated_tiles.append(new_tile)
-        else:
-            new_tile = Tile(x, y, tile_type, rotation)
-
-        # Maintain list of empty tiles
-        if old_tile._tile_type == "empty":
-            self.empty_tiles.remove(old_tile)
-        if new_tile._tile_type == "empty":
-            self.empty_tiles.append(new_tile)
-
-        # Maintain list of updated tiles
-        if (
-            (old_tile._tile_type != new_tile._tile_type) or (old_tile._rotation != new_tile._rotation)
-            or (old_tile.is_animated and old_tile.current_animation_frame != new_tile.current_animation_frame)
-        ):
-            self.updated_tiles.append(new_tile)
+            self.start_animation(index, animation_cycles, TILE_CODES[tile_type_after_animation],
+                                 rotation_after_animation, animation_starting_frame)
+        return self.tile_at(index)
 
-        self.tiles[old_tile.x][old_tile.y] = new_tile
-        return new_tile
-
-    def load_level(self, level_x: int, level_y: int, tilemap: pyxel.Tilemap) -> utils.Point:
+    def load_level(self, level_x: int, level_y: int, tilemap) -> utils.Point:
         """Loads a level from a tilemap and sets character starting coordinates."""
         character_start_position = utils.Point(self.width // 2, self.height // 2) #Set default character starting coordinates to the middle of the grid
-        for i in range(self.total_tiles):
-            new_tile_x = i % len(self.tiles) #Convert tile to grid coordinates
-            new_tile_y = int(i / len(self.tiles))
-            tilemap_x = (i % self.width) + level_x #Convert tile to tilemap/level coordinates
-            tilemap_y = int(i / self.width) + level_y
-            spritesheet_x, spritesheet_y = tilemap.pget(tilemap_x, tilemap_y) #Get tile from tilemap
-            spritesheet_x *= 8; spritesheet_y *= 8 #Convert tile to pixel coordinates
-            tile_type = settings.REVERSE_TILES[spritesheet_y] #Get tile type
-            # Check if tile is animated
-            if tile_type.startswith("animation."):
-                animation_cycles = -1
-                tile_type_after_animation = "empty"
-                rotation_after_animation = 0
-                self.update_tile(new_tile_x, new_tile_y, tile_type, is_animated = True,
-                                 animation_starting_frame = (spritesheet_x // settings.TILE_size["width"]))
-            elif tile_type != "start_marker":
-                self.update_tile(new_tile_x, new_tile_y, tile_type, 
-                                 rotation = (spritesheet_x // settings.TILE_SIZE["width"]))
-            elif tile_type == "start_marker":
-                character_start_position = utils.Point(new_tile_x, new_tile_y)
+        start_marker = TILE_CODES["start_marker"]
+        for index in range(self.total_tiles):
+            x, y = self.coordinates(index)
+            spritesheet_x, spritesheet_y = tilemap.pget(x + level_x, y + level_y) #Get tile from tilemap
+            tile_code = SPRITE_CODES[spritesheet_y * settings.TILE_SIZE["height"]] #Get tile type
+            if tile_code == start_marker:
+                character_start_position = utils.Point(x, y)
+            elif ANIMATION_FRAMES[tile_code]: # Check if tile is animated
+                self.set_tile(index, tile_code)
+                self.start_animation(index, starting_frame = spritesheet_x)
+            else:
+                self.set_tile(index, tile_code, rotation = spritesheet_x)
         return character_start_position
+    def pack_state(self, output: bytearray):
+        """Appends the contents of the grid to output: the header, tile types, rotations, both buffers
+        of the empty tile set so it restores with a copy, the animations, then the frame of each animated tile."""
+        members, slots = self.empty_tiles.buffers()
+        output += STATE_HEADER.pack(self.width, self.height, *self.character_start_position, len(members))
+        output += self.types
+        output += self.rotations
+        output += members
+        output += slots
+        self.pack_animations(output)
+    def pack_animations(self, output: bytearray):
+        """Appends the animation scheduler state and the frame of each animated tile to output."""
+        self.animated_tiles.pack_state(output)
+        output += bytes(self.frames[index] for index in self.animated_tiles)
+    def unpack_state(self, data: memoryview, offset: int) -> int:
+        """Restores contents written by pack_state() at offset in data on a grid of the same size, and
+        returns the offset after them. Tiles aren't marked as updated, so the whole grid needs redrawing afterwards."""
+        width, height, start_x, start_y, empty_count = STATE_HEADER.unpack_from(data, offset)
+        if (width, height) != (self.width, self.height):
+            raise ValueError(f"State is for a {width}x{height} grid but the grid is {self.width}x{self.height}")
+        offset += STATE_HEADER.size
+        self.types[:] = data[offset:offset + self.total_tiles]
+        offset += self.total_tiles
+        self.rotations[:] = data[offset:offset + self.total_tiles]
+        offset += self.total_tiles
+        members_end = offset + 4 * empty_count
+        self.empty_tiles = utils.IndexedSet.from_buffers(data[offset:members_end], data[members_end:members_end + 4 * self.total_tiles])
+        offset = members_end + 4 * self.total_tiles
+        self.frames[:] = bytes(self.total_tiles)
+        offset = self.unpack_animations(data, offset)
+        self.updated_tiles.clear()
+        self.character_start_position = utils.Point(start_x, start_y)
+        self.notify_replaced()
+        return offset
+    def unpack_animations(self, data: memoryview, offset: int) -> int:
+        """Restores animations written by pack_animations() and returns the offset after them."""
+        offset = self.animated_tiles.unpack_state(data, offset)
+        for index in self.animated_tiles:
+            self.frames[index] = data[offset]
+            offset += 1
+        return offset
+    def load_compiled_level(self, level):
+        """Replaces the contents of the grid with a level from level_cache.CompiledLevel using bulk copies.
+        Tiles aren't marked as updated, so the whole grid needs redrawing afterwards."""
+        if (level.width, level.height) != (self.width, self.height):
+            raise ValueError(f"Level is {level.width}x{level.height} but the grid is {self.width}x{self.height}")
+        self.types[:] = level.tile_codes()
+        self.rotations[:] = level.rotations()
+        self.frames[:] = bytes(self.total_tiles)
+        self.animated_tiles.clear()
+        for index, starting_frame in level.animated_tiles:
+            self.start_animation(index, starting_frame = starting_frame)
+        self.empty_tiles = utils.IndexedSet.from_buffers(level.empty_tiles, level.empty_slots)
+        self.updated_tiles.clear()
+        self.character_start_position = level.character_start_position
+        self.notify_replaced()
+    def notify_replaced(self):
+        """Tells the listeners that every tile may have changed."""
+        for listener in self.listeners:
+            listener(None, None, None)
 
-    def screen_coordinates(self, x: int, y: int,
-                           horizontal_offset: int = 0, vertical_offset: int = 10) -> tuple:
-        """Returns the screen coordinates of a grid tile."""
-        return ((x * settings.TILE_SIZE["width"]) + horizontal_offset, (y * settings.TILE_SIZE["height"]) + vertical_offset)
-    def sprite_coordinates(self, tile_type: str, rotation: int = 0, animation_frame: int = 0) -> tuple:
-        """Returns the sprite coordinates of a tile from given animation frame or rotation value.
-        If the tile is animated, the animation frame is used to determine y value. 
-        Otherwise, the rotation value is used."""
-        if tile_type.startswith("animation."):
-            return (settings.TILES[tile_type][0], animation_frame * settings.TILE_SIZE["width"])
-        else:
-            return (settings.TILES[tile_type], rotation * settings.TILE_SIZE["width"])
-    def draw_all_tiles(self):
-        """Draws the entire grid of tiles on the screen."""
-        for row in self.tiles:
-            for tile in row:
-                if tile.is_animated: # Update animated tiles
-                    self.draw_tile(*self.screen_coordinates(tile.x, tile.y),
-                                    *self.sprite_coordinates(tile.tile_type, animation_frame = tile.current_animation_frame))
-                else: # Update static tiles
-                    self.draw_tile(*self.screen_coordinates(tile.x, tile.y),
-                                    *self.sprite_coordinates(tile.tile_type, tile.rotation))
-        self.updated_tiles = [] #Clear list of updated tiles
-    def draw_tile(self, x: int, y: int,
-                  sprite_x: int, sprite_y: int, spritesheet_number: int = 0,
-                  size_x = settings.TILE_SIZE["width"], size_y: int = settings.TILE_SIZE["height"]):
-        """Draws an individual tile on the screen at (x,y)."""
-        pyxel.blt(
-            x, y,
-            spritesheet_number,
-            sprite_y, sprite_x,
-            size_x, size_y,
-            settings.TRANSPARENT_COLOR)
-
-    def advance_animation(self, tile: AnimatedTile):
+    def start_animation(self, index: int, cycles: int = -1,
+                        tile_code_after_animation: int = EMPTY, rotation_after_animation: int = 0,
+                        starting_frame: int = 0, ticks_per_frame: int = 1):
+        """Starts animating the tile at a buffer index. Cycles of -1 loop forever."""
+        self.animated_tiles.start(index, cycles, tile_code_after_animation, rotation_after_animation, ticks_per_frame)
+        self.frames[index] = starting_frame
+        self.updated_tiles.add(index)
+    def advance_animation(self, index: int):
         """Advances the animation of the tile by one frame."""
-        if tile.current_animation_frame < (tile.total_animation_frames - 1):
-            tile.current_animation_frame += 1
-        else:
-            tile.current_animation_frame = 0
-            if tile.animation_cycles_remaining > 1 and tile.animation_cycles_remaining != -1:
-                tile.animation_cycles_remaining -= 1
-            else:
-                self.stop_animation(tile)
-    def stop_animation(self, tile: AnimatedTile):
-        """Stops the animation of the tile."""
-        self.update_tile(tile.x, tile.y, 
-                         tile.tile_type_after_animation, tile.rotation_after_animation)
-        self.animated_tiles.remove(tile)
+        self.updated_tiles.add(index)
+        if self.frames[index] < ANIMATION_FRAMES[self.types[index]] - 1:
+            self.frames[index] += 1
+            self.animated_tiles.reschedule(index)
+            return
+        self.frames[index] = 0
+        animation = self.animated_tiles[index]
+        if animation[0] > 1:
+            animation[0] -= 1
+        elif animation[0] != -1:
+            self.stop_animation(index)
+            return
+        self.animated_tiles.reschedule(index)
+    def stop_animation(self, index: int):
+        """Stops the animation of the tile and replaces it with its after-animation tile."""
+        tile_code_after_animation, rotation_after_animation = self.animated_tiles.stop(index)[1:3]
+        self.frames[index] = 0
+        self.set_tile(index, tile_code_after_animation, rotation_after_animation)
+        self.updated_tiles.add(index)
     def update(self):
-        """Advances animations by one frame and redraws updated tiles."""
-        for tile in self.animated_tiles:
-            self.advance_animation(tile)
+        """Advances the animations that are due a new frame this tick and marks their tiles as updated."""
+        for index in self.animated_tiles.advance():
+            self.advance_animation(index)
 
+    def neighbor(self, index: int, direction: int = 0) -> int:
+        """Returns the buffer index of the neighboring tile in the specified direction."""
+        return self.neighbors[(index << 2) | direction]
     def get_neighbor(self, tile: Tile, direction: int = 0) -> Tile:
         """Returns the neighboring tile in the specified direction."""
-        if direction == 0:
-            return self.get_tile(tile.x, tile.y - 1)
-        elif direction == 1:
-            return self.get_tile(tile.x + 1, tile.y)
-        elif direction == 2:
-            return self.get_tile(tile.x, tile.y + 1)
-        elif direction == 3:
-            return self.get_tile(tile.x - 1, tile.y)
+        return self.tile_at(self.neighbors[(tile.index << 2) | direction])
     def get_relative_neighbor(self, tile: Tile, direction: int = 0) -> Tile:
         """Returns the neighboring tile in the specified direction relative to the current rotation of the tile."""
-        return self.get_neighbor((tile.rotation + direction) % 4)
+        return self.get_neighbor(tile, (tile.rotation + direction) % 4)
     def get_next(self, tile: Tile) -> Tile:
         """Returns the tile in front."""
         return self.get_relative_neighbor(tile, 0)
     def get_previous(self, tile: Tile) -> Tile:
         """Returns the tile behind."""
-        return self.get_relative_neighbor(tile, 2)      
\ No newline at end of file
+        return self.get_relative_neighbor(tile, 2)
@@ -1,46 +1,102 @@
-import settings, common.grid as grid
+import settings, common.grid as grid, common.utils as utils
 
+import heapq
 import random
-import time
+import struct
+
+# Item type codes weighted by their spawn probability
+ITEM_TABLE = utils.AliasTable({grid.TILE_CODES[item_type]: probability
+                               for item_type, probability in settings.ITEM_PROBABILITY.items()})
+
+STATE_HEADER = struct.Struct("<qqII") #Tick, last spawn tick, number of items, number of queued despawns
+ITEM = struct.Struct("<Iq") #Grid index, spawn tick
+DESPAWN = struct.Struct("<qIq") #Despawn tick, grid index, spawn tick
 
 class ItemManager:
-    def __init__(self, grid: grid.Grid,):
+    """Spawns and despawns items. Time is counted in simulation ticks, one per call to update(),
+    and despawns are scheduled in a min-heap so each tick only looks at items that are due."""
+
+    SPAWN_TRIES = 16 #Random tiles tried near spawn_near() before giving up on a spawn
+
+    def __init__(self, grid: grid.Grid, rng: random.Random = random, spawn_near = None, spawn_area: tuple = None,
+                 regions = None, reachable_from = None):
+        """Items spawn on any empty tile, or if spawn_near is given, on an empty tile in a spawn_area sized
+        (width, height) rectangle centred on the grid index it returns, e.g. the snake's head in a big world.
+        With regions.Regions and reachable_from, they spawn on an empty tile in the region of the grid index
+        reachable_from returns, e.g. the snake's head, so never anywhere walled off from the snake."""
         self.grid = grid
-        self.spawn_interval = settings.ITEM_SPAWN_INTERVAL
-        self.despawn_interval = settings.ITEM_DESPAWN_INTERVAL
-        self.last_spawn_time = time.time()
-        self.items = []
+        self.rng = rng
+        self.spawn_near = spawn_near
+        self.spawn_area = spawn_area
+        self.regions = regions
+        self.reachable_from = reachable_from
+        # Intervals are set in seconds and converted to ticks at the game's tick rate
+        self.spawn_interval = round(settings.ITEM_SPAWN_INTERVAL * settings.TICK_RATE)
+        self.despawn_interval = round(settings.ITEM_DESPAWN_INTERVAL * settings.TICK_RATE)
+        self.tick = 0
+        self.last_spawn_tick = 0
+        self.items = {} #Grid index -> tick the item spawned on
+        self._despawn_queue = [] #Heap of (despawn tick, grid index, spawn tick)
 
     def update(self):
-        """Updates the item manager."""
+        """Advances the item manager one tick."""
         # Spawn items
-        if time.time() - self.last_spawn_time >= self.spawn_interval:
+        if self.tick - self.last_spawn_tick >= self.spawn_interval:
             self.spawn_item()
-            self.last_spawn_time = time.time()
-
-        # Despawn items
-        for item in self.items:
-            if time.time() - item["spawn_time"] >= self.despawn_interval:
-                self.remove_item(item)
-    def get_item(self, tile):
-        """Returns the item at the specified tile."""
-        for item in self.items:
-            if item["tile"] == tile:
-                return item
-        return None
+            self.last_spawn_tick = self.tick
+
+        # Despawn items that are due. Entries for items that were already removed are skipped.
+        queue = self._despawn_queue
+        while queue and queue[0][0] <= self.tick:
+            _, index, spawn_tick = heapq.heappop(queue)
+            if self.items.get(index) == spawn_tick:
+                self.remove_item(index)
+        self.tick += 1
+    def pack_state(self, output: bytearray):
+        """Appends the item manager state to output. The random number generator isn't included."""
+        output += STATE_HEADER.pack(self.tick, self.last_spawn_tick, len(self.items), len(self._despawn_queue))
+        for item in self.items.items():
+            output += ITEM.pack(*item)
+        for entry in self._despawn_queue:
+            output += DESPAWN.pack(*entry)
+    def unpack_state(self, data: memoryview, offset: int) -> int:
+        """Restores a state written by pack_state() at offset in data and returns the offset after it."""
+        self.tick, self.last_spawn_tick, item_count, despawn_count = STATE_HEADER.unpack_from(data, offset)
+        offset += STATE_HEADER.size
+        self.items = dict(ITEM.iter_unpack(data[offset:offset + item_count * ITEM.size]))
+        offset += item_count * ITEM.size
+        self._despawn_queue = list(DESPAWN.iter_unpack(data[offset:offset + despawn_count * DESPAWN.size])) #Already in heap order
+        return offset + despawn_count * DESPAWN.size
+    def get_item(self, index: int) -> int:
+        """Returns the tick the item at a grid index spawned on, or None if there is no item there."""
+        return self.items.get(index)
 
+    def choose_spawn_tile(self) -> int:
+        """Returns a random empty tile to spawn an item on, or None if there isn't one."""
+        if not self.grid.empty_tiles:
+            return None
+        if self.regions is not None:
+            return self.regions.choice(self.regions.region(self.reachable_from()), self.rng)
+        if self.spawn_near is None:
+            return self.grid.empty_tiles.choice(self.rng)
+        x, y = self.grid.coordinates(self.spawn_near())
+        width, height = self.spawn_area
+        for _ in range(self.SPAWN_TRIES):
+            index = self.grid.index(x + self.rng.randrange(width) - width // 2, y + self.rng.randrange(height) - height // 2)
+            if self.grid.types[index] == grid.EMPTY:
+                return index
+        return None
     def spawn_item(self):
         """Spawns an item at a random empty tile."""
-        item_types = list(settings.ITEM_PROBABILITY.keys())
-        item_weights = list(settings.ITEM_PROBABILITY.values())
-        item_type = random.choices(item_types, weights = item_weights, k = 1)[0]
-
-        if self.grid.empty_tiles:
-            spawn_tile = random.choice(self.grid.empty_tiles)
-            self.grid.update_tile(spawn_tile.x, spawn_tile.y, item_type, 0)
-            self.items.append({"tile": spawn_tile, "spawn_time": time.time()})
-    def remove_item(self, item):
-        """Removes an item from the grid and the item list."""
-        if item in self.items:
-            self.items.remove(item)
-            self.grid.update_tile(item["tile"].x, item["tile"].y, "empty")
\ No newline at end of file
+        item_code = ITEM_TABLE.choice(self.rng)
+
+        spawn_index = self.choose_spawn_tile()
+        if spawn_index is not None:
+            self.grid.set_tile(spawn_index, item_code)
+            self.items[spawn_index] = self.tick
+            heapq.heappush(self._despawn_queue, (self.tick + self.despawn_interval, spawn_index, self.tick))
+    def remove_item(self, index: int, clear_tile: bool = True):
+        """Removes the item at a grid index from the item list, and from the grid unless clear_tile is False
+        (e.g. when the snake has just moved onto it)."""
+        if self.items.pop(index, None) is not None and clear_tile:
+            self.grid.set_tile(index, grid.EMPTY)
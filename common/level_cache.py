@@ -0,0 +1,128 @@
+"""
+Levels compiled once from the asset file into a compact binary format and cached on disk,
+so restarting a level is a handful of bulk copies instead of a pget() per tile.
+The next level can be compiled and mapped on a background thread while the current one is played.
+"""
+
+import settings, hashlib, mmap, os, struct, sys, threading
+import common.utils as utils
+from common.assets import PyxresTilemap
+from common.grid import Grid
+
+FORMAT_VERSION = 1
+MAGIC = b"SNKL"
+# Magic, format version, width, height, start x, start y, number of animated tiles, number of empty tiles
+HEADER = struct.Struct("<4sHHHHHII")
+ANIMATED_TILE = struct.Struct("<IB") #Index, starting frame
+
+# Tables for bytes.translate() that split packed tiles back into codes and rotations
+TILE_CODE_TABLE = bytes(packed >> 2 for packed in range(256))
+ROTATION_TABLE = bytes(packed & 3 for packed in range(256))
+
+def pack_tile(tile_code: int, column: int) -> int:
+    """Packs a tile code and its rotation (or animation frame) into one byte."""
+    return (tile_code << 2) | column
+
+class CompiledLevel:
+    """A level in its compiled binary form, read from a memory-mapped cache file.
+    Tiles are one byte each, tile_code << 2 | rotation, with empty tiles and the grid's
+    empty-tile index stored alongside so a grid can be filled without looking at each tile."""
+
+    def __init__(self, data):
+        self.data = data
+        magic, version, self.width, self.height, start_x, start_y, animated_count, empty_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a compiled level in the current format")
+        self.total_tiles = self.width * self.height
+        self.character_start_position = utils.Point(start_x, start_y)
+        offset = HEADER.size
+        self.animated_tiles = [ANIMATED_TILE.unpack_from(data, offset + i * ANIMATED_TILE.size) for i in range(animated_count)]
+        offset += animated_count * ANIMATED_TILE.size
+        view = memoryview(data)
+        self.tiles = view[offset:offset + self.total_tiles]
+        offset += self.total_tiles
+        self.empty_tiles = view[offset:offset + 4 * empty_count] #Packed IndexedSet members
+        offset += 4 * empty_count
+        self.empty_slots = view[offset:offset + 4 * self.total_tiles] #Packed IndexedSet slots
+
+    def tile_codes(self) -> bytes:
+        """Returns the tile code of every tile."""
+        return self.tiles.tobytes().translate(TILE_CODE_TABLE)
+    def rotations(self) -> bytes:
+        """Returns the rotation of every tile, with 0 for animated tiles."""
+        rotations = bytearray(self.tiles.tobytes().translate(ROTATION_TABLE))
+        for index, _ in self.animated_tiles:
+            rotations[index] = 0
+        return rotations
+
+    @staticmethod
+    def compile(grid: Grid) -> bytes:
+        """Returns the compiled form of a grid that has just loaded a level."""
+        tiles = bytearray(grid.total_tiles)
+        for index, tile_code in enumerate(grid.types):
+            column = grid.frames[index] if index in grid.animated_tiles else grid.rotations[index]
+            tiles[index] = pack_tile(tile_code, column)
+        animated_tiles = b"".join(ANIMATED_TILE.pack(index, grid.frames[index]) for index in grid.animated_tiles)
+        members, slots = grid.empty_tiles.buffers()
+        return b"".join((
+            HEADER.pack(MAGIC, FORMAT_VERSION, grid.width, grid.height, *grid.character_start_position,
+                        len(grid.animated_tiles), len(members)),
+            animated_tiles, tiles, members.tobytes(), slots.tobytes()))
+
+def next_level(level: int) -> int:
+    """Returns the level after the specified one in settings.LEVELS, or None for the last level."""
+    levels = list(settings.LEVELS)
+    position = levels.index(level) + 1
+    return levels[position] if position < len(levels) else None
+
+class LevelCache:
+    """Compiles levels from the asset file on first use and keeps them in memory-mapped cache files.
+    Cache files are named after a hash of the asset file and the settings that affect level layout.
+    Safe to use from several threads, so levels can be prefetched in the background."""
+
+    def __init__(self, asset_file: str = settings.ASSET_FILE, cache_dir: str = settings.LEVEL_CACHE_DIR,
+                 width: int = settings.GRID_WIDTH, height: int = settings.GRID_HEIGHT):
+        self.asset_file = asset_file
+        self.cache_dir = cache_dir
+        self.width = width
+        self.height = height
+        self._levels = {}
+        self._lock = threading.Lock() #Held while getting a level, so a prefetch and get() never both compile it
+        with open(asset_file, "rb") as assets:
+            digest = hashlib.sha256(assets.read())
+        digest.update(repr((FORMAT_VERSION, sys.byteorder, width, height, settings.TILES)).encode())
+        self.asset_hash = digest.hexdigest()[:16]
+
+    def path(self, level: int) -> str:
+        """Returns the cache file path for a level."""
+        level_x, level_y = settings.LEVELS[level]['x'], settings.LEVELS[level]['y']
+        return os.path.join(self.cache_dir, f"{self.asset_hash}-{level_x}-{level_y}.level")
+    def compile(self, level: int) -> bytes:
+        """Loads a level from the tilemap the slow way and returns its compiled form.
+        Only the level's region of the tilemap is decoded."""
+        level_x, level_y = settings.LEVELS[level]['x'], settings.LEVELS[level]['y']
+        tilemap = PyxresTilemap(self.asset_file, region = (level_x, level_y, self.width, self.height))
+        return CompiledLevel.compile(Grid(tilemap, self.width, self.height, level_x, level_y))
+    def get(self, level: int) -> CompiledLevel:
+        """Returns a compiled level, compiling and caching it first if needed.
+        Waits for a prefetch of the same level to finish rather than compiling it again."""
+        with self._lock:
+            if level not in self._levels:
+                path = self.path(level)
+                if not os.path.exists(path):
+                    os.makedirs(self.cache_dir, exist_ok = True)
+                    temporary_path = f"{path}.{os.getpid()}.tmp"
+                    with open(temporary_path, "wb") as cache_file:
+                        cache_file.write(self.compile(level))
+                    os.replace(temporary_path, path) #Other processes never see a half-written file
+                with open(path, "rb") as cache_file:
+                    self._levels[level] = CompiledLevel(mmap.mmap(cache_file.fileno(), 0, access = mmap.ACCESS_READ))
+            return self._levels[level]
+    def prefetch(self, level: int) -> threading.Thread:
+        """Starts compiling and mapping a level on a background thread, so a later get() doesn't stall.
+        Returns the thread, or None if the level is already loaded or there is no such level."""
+        if level is None or level not in settings.LEVELS or level in self._levels:
+            return None
+        thread = threading.Thread(target = self.get, args = (level,), name = f"prefetch-level-{level}", daemon = True)
+        thread.start()
+        return thread
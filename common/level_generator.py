@@ -0,0 +1,129 @@
+"""
+Seeded procedural levels of any size, built with NumPy and handed to grids in the compiled level format,
+so a fresh layout loads with the same bulk copies as a cached level.
+
+Rooms are laid out one per square of a lattice and joined by corridors along a spanning tree of the lattice,
+plus a few extra corridors for loops, then a cellular automaton erodes the walls next to open tiles and fills
+the dead ends it made. Every step only opens tiles that touch tiles already connected, or closes tiles with
+a single open neighbor, which no path passes through, so every open tile can be reached from every other one
+without checking and retrying.
+"""
+
+import settings, random
+import numpy as np
+from common.grid import TILE_CODES, EMPTY
+from common.level_cache import CompiledLevel, HEADER, MAGIC, FORMAT_VERSION
+
+WALL = TILE_CODES["wall"]
+ROOM_CELL = 8 #Lattice square size, each holds one room with at least a tile of wall around it
+MIN_ROOM = 3 #Smallest room width and height
+LOOP_CHANCE = 0.15 #Chance of each extra corridor between lattice neighbors that the spanning tree didn't join
+PACKED_TILES = np.array([WALL << 2, EMPTY << 2], dtype = np.uint8) #Compiled tile for walls and open tiles, rotation 0
+EROSION_STEPS = 2
+EROSION_CHANCE = 31 #Chance out of 256 of a wall opening per open neighbor, each erosion step
+
+def carve_lines(open_tiles: np.ndarray, fixed: np.ndarray, starts: np.ndarray, ends: np.ndarray, horizontal: bool):
+    """Opens straight lines from starts to ends, inclusive and in either order, along rows (horizontal)
+    or columns at the fixed coordinates, all at once."""
+    low, high = np.minimum(starts, ends), np.maximum(starts, ends)
+    offsets = np.arange(int((high - low).max(initial = 0)) + 1)
+    along = low[:, None] + offsets
+    inside = offsets <= (high - low)[:, None]
+    across = np.broadcast_to(fixed[:, None], along.shape)
+    if horizontal:
+        open_tiles[across[inside], along[inside]] = True
+    else:
+        open_tiles[along[inside], across[inside]] = True
+
+def open_neighbors(open_tiles: np.ndarray) -> np.ndarray:
+    """Returns how many of each tile's four neighbors are open, wrapping around the edges like the grid."""
+    return (np.roll(open_tiles, 1, 0).astype(np.uint8) + np.roll(open_tiles, -1, 0)
+            + np.roll(open_tiles, 1, 1) + np.roll(open_tiles, -1, 1))
+
+def generate_level(width: int = settings.GRID_WIDTH, height: int = settings.GRID_HEIGHT, seed = 0,
+                   cell_size: int = ROOM_CELL) -> CompiledLevel:
+    """Returns a new level of walls and empty tiles, with room for the snake to start facing up near the middle.
+    The seed can be anything numpy.random.default_rng() takes, and the same seed always gives the same level."""
+    start_run = settings.SNAKE_START_LENGTH + 3 #The tile ahead, head, body and tail
+    if cell_size < max(MIN_ROOM + 1, start_run + 1) or width < cell_size or height < cell_size:
+        raise ValueError(f"Can't generate a {width}x{height} level from {cell_size}x{cell_size} rooms")
+    rng = np.random.default_rng(seed)
+    rows, columns = height // cell_size, width // cell_size
+
+    # A room in every lattice square, drawn by broadcasting each room's extent over the square's tiles
+    room_width = rng.integers(MIN_ROOM, cell_size, size = (rows, columns))
+    room_height = rng.integers(MIN_ROOM, cell_size, size = (rows, columns))
+    room_x = rng.integers(1, cell_size - room_width + 1)
+    room_y = rng.integers(1, cell_size - room_height + 1)
+    local = np.arange(cell_size)
+    inside_x = (local >= room_x[..., None]) & (local < (room_x + room_width)[..., None])
+    inside_y = (local >= room_y[..., None]) & (local < (room_y + room_height)[..., None])
+    rooms = inside_y[:, :, :, None] & inside_x[:, :, None, :] #Lattice row, column, tile y, tile x
+    open_tiles = np.zeros((height, width), dtype = bool)
+    open_tiles[:rows * cell_size, :columns * cell_size] = rooms.transpose(0, 2, 1, 3).reshape(rows * cell_size, columns * cell_size)
+    center_x = (np.arange(columns) * cell_size)[None, :] + room_x + room_width // 2
+    center_y = (np.arange(rows) * cell_size)[:, None] + room_y + room_height // 2
+
+    # Binary tree spanning tree: every square joins the square to its right or below, the last row and column
+    # can only go one way and the bottom right square is reached from the others. Extra corridors add loops.
+    go_right = rng.random((rows, columns)) < 0.5
+    go_right[-1, :], go_right[:, -1] = True, False
+    right = (go_right | (rng.random((rows, columns)) < LOOP_CHANCE))[:, :-1]
+    down = (~go_right | (rng.random((rows, columns)) < LOOP_CHANCE))[:-1, :]
+    for joined, (from_x, from_y), (to_x, to_y) in (
+            (right, (center_x[:, :-1], center_y[:, :-1]), (center_x[:, 1:], center_y[:, 1:])),
+            (down, (center_x[:-1, :], center_y[:-1, :]), (center_x[1:, :], center_y[1:, :]))):
+        from_x, from_y, to_x, to_y = from_x[joined], from_y[joined], to_x[joined], to_y[joined]
+        carve_lines(open_tiles, from_y, from_x, to_x, horizontal = True) #Along the first room's row...
+        carve_lines(open_tiles, to_x, from_y, to_y, horizontal = False) #...then the second room's column
+
+    # Erode walls next to open tiles, more likely the more open neighbors they have (wrapping around like the grid),
+    # then fill the dead ends that leaves, which only ever lead back the way they came
+    for _ in range(EROSION_STEPS):
+        open_tiles |= rng.integers(0, 256, size = (height, width), dtype = np.uint8) < open_neighbors(open_tiles) * np.uint8(EROSION_CHANCE)
+    for _ in range(EROSION_STEPS):
+        open_tiles &= open_neighbors(open_tiles) > 1
+
+    # A straight corridor down from the middle room to the room below it, with the snake starting on it facing up
+    # into the middle room. It runs from both rooms, so it isn't a dead end once the snake has left.
+    start_row, start_column = rows // 2, columns // 2
+    below_row = (start_row + 1) % rows
+    start_x = int(center_x[start_row, start_column])
+    below_x = int(center_x[below_row, start_column])
+    below_y = int(center_y[below_row, start_column]) + (height if below_row == 0 else 0) #Around the bottom edge if it wraps
+    ahead_y = min(int(center_y[start_row, start_column]), below_y - (start_run - 1))
+    corridor_y = np.arange(ahead_y, max(below_y, ahead_y + start_run - 1) + 1)
+    open_tiles[corridor_y % height, start_x] = True
+    carve_lines(open_tiles, np.array([below_y % height]), np.array([start_x]), np.array([below_x]), horizontal = True)
+
+    # Compiled level format, written straight into its buffer: the header, tiles, then the packed empty tile set and its slots
+    total_tiles, empty_count = width * height, int(np.count_nonzero(open_tiles))
+    data = bytearray(HEADER.size + total_tiles + 4 * empty_count + 4 * total_tiles)
+    HEADER.pack_into(data, 0, MAGIC, FORMAT_VERSION, width, height, start_x, (ahead_y + 1) % height, 0, empty_count)
+    tiles = np.frombuffer(data, np.uint8, total_tiles, HEADER.size)
+    empty_tiles = np.frombuffer(data, np.uint32, empty_count, HEADER.size + total_tiles)
+    slots = np.frombuffer(data, np.int32, total_tiles, HEADER.size + total_tiles + 4 * empty_count)
+    np.take(PACKED_TILES, open_tiles.ravel().view(np.uint8), out = tiles)
+    empty_tiles[:] = np.flatnonzero(open_tiles)
+    slots.fill(-1)
+    slots[empty_tiles] = np.arange(empty_count, dtype = np.int32)
+    return CompiledLevel(data)
+
+class LevelGenerator:
+    """Level source for SnekEngine that generates levels instead of reading them from the asset file.
+    Each level number gets its own layout from the seed, so a seed and level always give the same level."""
+
+    def __init__(self, seed: int = None, width: int = settings.GRID_WIDTH, height: int = settings.GRID_HEIGHT):
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.width = width
+        self.height = height
+        self._levels = {}
+
+    def get(self, level: int) -> CompiledLevel:
+        """Returns a level, generating it the first time it's asked for."""
+        if level not in self._levels:
+            self._levels[level] = generate_level(self.width, self.height, (self.seed, level))
+        return self._levels[level]
+    def prefetch(self, level: int):
+        """Levels generate in milliseconds, so there is nothing to prepare in the background."""
+        return None
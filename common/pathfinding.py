@@ -0,0 +1,116 @@
+"""
+Distance fields over the wrap-around grid, kept up to date from the grid's tile changes
+instead of being recomputed every tick.
+"""
+
+import heapq
+from array import array
+from collections import deque
+from common.grid import Grid
+
+INFINITY = 0xFFFFFFFF #Distance of tiles that can't reach a target
+
+class DistanceField:
+    """Number of moves from every tile to the nearest target tile, moving only through passable tiles.
+    Listens to the grid, so each change only revisits the tiles whose distance it affects:
+    a tile getting closer spreads outwards until distances stop improving, and a tile getting
+    further away (e.g. the snake's head moving onto it) clears the tiles whose every shortest
+    path went through it and fills them back in from their neighbors."""
+
+    def __init__(self, grid: Grid, target_codes, passable_codes):
+        self.grid = grid
+        # Tile code lookups. Targets count as passable.
+        self.targets = bytes(code in target_codes for code in range(256))
+        self.passable = bytes(code in passable_codes or code in target_codes for code in range(256))
+        self.distances = array("I", [INFINITY]) * grid.total_tiles
+        self.rebuild()
+        grid.listeners.append(self.tile_changed)
+
+    def detach(self):
+        """Stops following the grid's changes."""
+        self.grid.listeners.remove(self.tile_changed)
+
+    def rebuild(self):
+        """Recomputes every distance with a breadth-first search from all the targets at once."""
+        grid, distances = self.grid, self.distances
+        distances[:] = array("I", [INFINITY]) * grid.total_tiles
+        queue = deque()
+        for index, tile_code in enumerate(grid.types):
+            if self.targets[tile_code]:
+                distances[index] = 0
+                queue.append(index)
+        self._spread(queue)
+
+    def tile_changed(self, index: int, old_code: int, new_code: int):
+        """Grid listener, updates the distances affected by a tile changing type."""
+        if index is None:
+            self.rebuild()
+            return
+        distance = self._own_distance(index)
+        if distance < self.distances[index]:
+            self.distances[index] = distance
+            self._spread(deque((index,)))
+        elif distance > self.distances[index]:
+            self._raise(index)
+
+    def _own_distance(self, index: int) -> int:
+        """Returns the distance of a tile from its type and its neighbors' current distances."""
+        tile_code = self.grid.types[index]
+        if self.targets[tile_code]:
+            return 0
+        if not self.passable[tile_code]:
+            return INFINITY
+        neighbors, distances = self.grid.neighbors, self.distances
+        nearest = min(distances[neighbors[(index << 2) | direction]] for direction in range(4))
+        return INFINITY if nearest == INFINITY else nearest + 1
+
+    def _spread(self, queue: deque):
+        """Lowers the distances around tiles whose distance went down, breadth-first.
+        The queue must be in order of distance."""
+        grid, distances, passable, targets = self.grid, self.distances, self.passable, self.targets
+        types, neighbors = grid.types, grid.neighbors
+        while queue:
+            index = queue.popleft()
+            distance = distances[index] + 1
+            for neighbor in neighbors[index << 2:(index << 2) + 4]:
+                if distance < distances[neighbor] and passable[types[neighbor]] and not targets[types[neighbor]]:
+                    distances[neighbor] = distance
+                    queue.append(neighbor)
+
+    def _raise(self, index: int):
+        """Handles a tile whose distance went up, by clearing every tile that depended on it
+        and filling those back in from the tiles around them."""
+        grid, distances, passable, targets = self.grid, self.distances, self.passable, self.targets
+        types, neighbors = grid.types, grid.neighbors
+        # Find the tiles with no shortest path left that avoids the changed tile. Going outwards in order of
+        # distance, every affected tile one step closer is already known when a tile is checked.
+        affected = {index}
+        queue = deque((index,))
+        while queue:
+            tile = queue.popleft()
+            next_distance = distances[tile] + 1
+            for neighbor in neighbors[tile << 2:(tile << 2) + 4]:
+                if (distances[neighbor] != next_distance or neighbor in affected
+                        or not passable[types[neighbor]] or targets[types[neighbor]]):
+                    continue
+                if all(other in affected or distances[other] != next_distance - 1
+                       for other in neighbors[neighbor << 2:(neighbor << 2) + 4]):
+                    affected.add(neighbor)
+                    queue.append(neighbor)
+        for tile in affected:
+            distances[tile] = INFINITY
+        # Refill from the edge of the cleared region inwards, nearest first
+        heap = []
+        for tile in affected:
+            distance = self._own_distance(tile)
+            if distance != INFINITY:
+                heap.append((distance, tile))
+        heapq.heapify(heap)
+        while heap:
+            distance, tile = heapq.heappop(heap)
+            if distance >= distances[tile]:
+                continue
+            distances[tile] = distance
+            for neighbor in neighbors[tile << 2:(tile << 2) + 4]:
+                if distance + 1 < distances[neighbor] and passable[types[neighbor]] and not targets[types[neighbor]]:
+                    heapq.heappush(heap, (distance + 1, neighbor))
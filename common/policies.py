@@ -0,0 +1,94 @@
+"""
+Bot policies: functions that take a SnekEngine and return the direction to request this tick, or None to keep going.
+Policies only read the engine, so the same game plays out the same way for the same seed.
+"""
+
+import importlib
+from common.engine import SnekEngine, ITEM_APPLE, ITEM_LEMON
+from common.grid import EMPTY, GAMEOVER_CODES
+from common.pathfinding import DistanceField, INFINITY
+
+def request(engine: SnekEngine, direction: int) -> int:
+    """Returns the direction to ask for so the snake moves in direction, allowing for reversed controls."""
+    return (direction + 2) % 4 if engine.controls_reversed else direction
+
+def safe_directions(engine: SnekEngine) -> list:
+    """Returns the directions the snake can move in this tick without dying, straight ahead first."""
+    grid, snake = engine.grid, engine.snake
+    current = snake.direction
+    directions = []
+    for direction in (current, (current + 1) % 4, (current + 3) % 4):
+        index = grid.neighbor(snake.head, direction)
+        if not snake.occupies(index) and grid.types[index] not in GAMEOVER_CODES:
+            directions.append(direction)
+    return directions
+
+def straight(engine: SnekEngine) -> int:
+    """Never turns."""
+    return None
+
+def cautious(engine: SnekEngine) -> int:
+    """Keeps going straight unless that would end the game."""
+    directions = safe_directions(engine)
+    return request(engine, directions[0]) if directions else None
+
+def greedy(engine: SnekEngine) -> int:
+    """Heads for the nearest apple or lemon without dying on the next tick."""
+    directions = safe_directions(engine)
+    if not directions:
+        return None
+    grid = engine.grid
+    targets = [grid.coordinates(index) for index in engine.item_manager.items if grid.types[index] in (ITEM_APPLE, ITEM_LEMON)]
+    if not targets:
+        return request(engine, directions[0])
+    def distance(direction: int) -> int:
+        """Distance to the nearest target after moving in direction, going around the edges if that is shorter."""
+        x, y = grid.coordinates(grid.neighbor(engine.snake.head, direction))
+        return min(min(abs(x - target_x), grid.width - abs(x - target_x)) + min(abs(y - target_y), grid.height - abs(y - target_y))
+                   for target_x, target_y in targets)
+    return request(engine, min(directions, key = distance)) #min() keeps the first of equals, so straight wins ties
+
+class Autopilot:
+    """Follows a distance field to the nearest apple or lemon, keeping clear of anything that ends the game.
+    The field is updated from the grid's tile changes, so planning costs about the same every tick however
+    big the grid or long the snake. Follows one game at a time and starts a new field when the grid changes.
+    In big chunked worlds it steers like greedy() instead, since building a field over the whole world takes
+    far longer than a tick and items only spawn on the screen around the snake anyway."""
+
+    def __init__(self):
+        self.field = None
+
+    def __call__(self, engine: SnekEngine) -> int:
+        if engine.world_size is not None:
+            if self.field is not None:
+                self.field.detach()
+                self.field = None
+            return greedy(engine)
+        if self.field is None or self.field.grid is not engine.grid:
+            if self.field is not None:
+                self.field.detach()
+            self.field = DistanceField(engine.grid, (ITEM_APPLE, ITEM_LEMON), (EMPTY,))
+        directions = safe_directions(engine)
+        if not directions:
+            return None
+        grid, distances = engine.grid, self.field.distances
+        best = min(directions, key = lambda direction: distances[grid.neighbor(engine.snake.head, direction)])
+        if distances[grid.neighbor(engine.snake.head, best)] == INFINITY:
+            best = directions[0] #Nothing reachable, keep going straight if that's safe
+        return request(engine, best)
+
+POLICIES = {
+    "straight": straight,
+    "cautious": cautious,
+    "greedy": greedy,
+    "autopilot": Autopilot(),
+}
+
+def load_policy(name: str):
+    """Returns a built-in policy by name, or any other policy given as "module:function"."""
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(f"Unknown policy {name!r}, expected one of {', '.join(POLICIES)} or module:function")
+    return getattr(importlib.import_module(module_name), function_name)
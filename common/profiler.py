@@ -0,0 +1,84 @@
+"""
+Per-frame timers and counters with rolling percentiles, to see which phase of a frame blows the frame budget.
+"""
+
+import settings, csv, json, sys, time
+from collections import deque
+
+class FrameProfiler:
+    """Collects phase timings and counters for each frame and keeps the last few frames for percentiles.
+    Timings are plain perf_counter() pairs so the profiler costs next to nothing inside a frame:
+
+        started = profiler.start()
+        grid.update()
+        profiler.stop("grid.update", started)
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window: int = settings.PROFILE_WINDOW, budget: float = 1 / settings.FPS):
+        self.budget = budget #Seconds available per frame, by default a drawn frame, which runs however many ticks are due
+        self.frames = deque(maxlen = window) #Dicts of phase/counter name -> value, oldest first
+        self.frame_count = 0
+        self._current = {}
+        self._frame_started = 0.0
+        self._blocks_at_start = 0
+
+    def begin_frame(self):
+        """Starts collecting a new frame."""
+        self._current = {}
+        self._blocks_at_start = sys.getallocatedblocks()
+        self._frame_started = time.perf_counter()
+    def end_frame(self):
+        """Finishes the current frame, adding its total time and net allocated memory blocks."""
+        current = self._current
+        current["frame_time"] = time.perf_counter() - self._frame_started
+        current["allocated_blocks"] = sys.getallocatedblocks() - self._blocks_at_start
+        self.frames.append(current)
+        self.frame_count += 1
+
+    def start(self) -> float:
+        """Returns a start time to pass to stop()."""
+        return time.perf_counter()
+    def stop(self, phase: str, started: float):
+        """Adds the time since started to a phase of the current frame."""
+        self._current[phase] = self._current.get(phase, 0.0) + time.perf_counter() - started
+    def count(self, counter: str, amount: int = 1):
+        """Adds to a counter of the current frame."""
+        self._current[counter] = self._current.get(counter, 0) + amount
+
+    def names(self) -> list:
+        """Returns every phase and counter name seen in the window, in the order they first appeared."""
+        names = {}
+        for frame in self.frames:
+            names.update(dict.fromkeys(frame))
+        return list(names)
+    def percentiles(self, name: str) -> tuple:
+        """Returns the nearest-rank percentiles of a phase or counter over the window.
+        Frames where it didn't happen count as 0."""
+        values = sorted(frame.get(name, 0) for frame in self.frames)
+        if not values:
+            return tuple(0 for _ in self.PERCENTILES)
+        return tuple(values[min(len(values) - 1, len(values) * percent // 100)] for percent in self.PERCENTILES)
+    def summary(self) -> dict:
+        """Returns percentiles and the maximum of every phase and counter over the window."""
+        summary = {}
+        for name in self.names():
+            summary[name] = dict(zip((f"p{percent}" for percent in self.PERCENTILES), self.percentiles(name)))
+            summary[name]["max"] = max(frame.get(name, 0) for frame in self.frames)
+        return summary
+
+    def export_json(self, path: str):
+        """Writes the summary and every frame in the window as JSON. Times are in seconds."""
+        with open(path, "w") as output:
+            json.dump({"budget": self.budget, "frame_count": self.frame_count,
+                       "summary": self.summary(), "frames": list(self.frames)}, output, indent = 2)
+    def export_csv(self, path: str):
+        """Writes one row per frame in the window. Times are in seconds."""
+        names = self.names()
+        first_frame = self.frame_count - len(self.frames)
+        with open(path, "w", newline = "") as output:
+            writer = csv.writer(output)
+            writer.writerow(["frame"] + names)
+            for number, frame in enumerate(self.frames, first_frame):
+                writer.writerow([number] + [frame.get(name, 0) for name in names])
@@ -0,0 +1,153 @@
+"""
+Connected regions of a level, so items only spawn where the snake can reach them.
+"""
+
+import struct
+from array import array
+from functools import lru_cache
+from common.grid import Grid, EMPTY, STATIC_CODES
+
+NO_REGION = -1 #Region of static tiles, which belong to none
+STATE_HEADER = struct.Struct("<I") #Number of regions
+STATIC_TABLE = bytes(code in STATIC_CODES for code in range(256)) #Table for bytes.translate(), 1 for static tiles
+
+@lru_cache(maxsize = 8)
+def flood_fill(width: int, height: int, static: bytes) -> tuple:
+    """Returns the region of every tile of a wrap-around grid, or NO_REGION where static is set, and the tiles
+    of each region in breadth-first order. Results are shared between grids with the same walls,
+    so restarting a level doesn't flood it again, and must not be modified."""
+    neighbors = Grid.build_neighbor_table(width, height)
+    region_of = array("i", [NO_REGION]) * (width * height)
+    regions = []
+    for index in range(width * height):
+        if region_of[index] != NO_REGION or static[index]:
+            continue
+        region = len(regions)
+        region_of[index] = region
+        cells = array("I", (index,))
+        for cell in cells: #Grows while it's iterated, so this is a breadth-first search
+            for neighbor in neighbors[cell << 2:(cell << 2) + 4]:
+                if region_of[neighbor] == NO_REGION and not static[neighbor]:
+                    region_of[neighbor] = region
+                    cells.append(neighbor)
+        regions.append(cells)
+    return region_of, regions
+
+class Regions:
+    """Splits the wrap-around grid into the regions static tiles (walls) wall off from each other, with a flood fill
+    when a level is loaded (see flood_fill()). Each region has its cells and size, and an index of its empty tiles
+    that follows the grid's changes, so a random empty tile in a region is picked in O(1) however many regions there are.
+    The empty tiles of all regions share two buffers like an IndexedSet: each region has a block of _members
+    as long as the region, with its empty tiles packed at the start, and _slots gives a tile's position in it."""
+
+    def __init__(self, grid: Grid):
+        self.grid = grid
+        self.region_of = array("i") #Grid index -> region, or NO_REGION
+        self.cells = [] #Region -> its grid indices, in flood fill order
+        self.sizes = [] #Region -> number of tiles
+        self._starts = array("I") #Region -> start of its block in _members
+        self._counts = array("I") #Region -> number of empty tiles
+        self._members = array("I")
+        self._slots = array("i") #Grid index -> position in _members, or -1
+        self._indexed = False #False after the grid is replaced, until the index is restored or rebuilt
+        self.rebuild()
+        self.index_empty_tiles()
+        grid.listeners.append(self.tile_changed)
+
+    def detach(self):
+        """Stops following the grid's changes."""
+        self.grid.listeners.remove(self.tile_changed)
+
+    def rebuild(self):
+        """Floods the grid into regions, without indexing their empty tiles."""
+        grid = self.grid
+        self.region_of, self.cells = flood_fill(grid.width, grid.height, bytes(grid.types.translate(STATIC_TABLE)))
+        self.sizes = [len(cells) for cells in self.cells]
+        self._indexed = False
+    def index_empty_tiles(self):
+        """Indexes the empty tiles of every region from the grid."""
+        types = self.grid.types
+        self._starts = array("I")
+        self._counts = array("I")
+        self._members = array("I")
+        self._slots = array("i", [-1]) * self.grid.total_tiles
+        for cells in self.cells:
+            empty = array("I", [cell for cell in cells if types[cell] == EMPTY])
+            self._starts.append(len(self._members))
+            self._counts.append(len(empty))
+            for position, cell in enumerate(empty, len(self._members)):
+                self._slots[cell] = position
+            self._members += empty
+            self._members += array("I", bytes(4 * (len(cells) - len(empty)))) #Room for the rest of the region
+        self._indexed = True
+    def tile_changed(self, index: int, old_code: int, new_code: int):
+        """Grid listener, keeps the empty tile index up to date and floods the regions again if a wall changed."""
+        if index is None: #Indexed when next needed, so a restore doesn't index the grid before restoring the index
+            self.rebuild()
+        elif (old_code in STATIC_CODES) != (new_code in STATIC_CODES):
+            self.rebuild()
+            self.index_empty_tiles()
+        elif not self._indexed: #Indexing includes this change
+            self.index_empty_tiles()
+        elif new_code == EMPTY:
+            self._add(index)
+        elif old_code == EMPTY:
+            self._discard(index)
+
+    def _add(self, index: int):
+        region = self.region_of[index]
+        position = self._starts[region] + self._counts[region]
+        self._members[position] = index
+        self._slots[index] = position
+        self._counts[region] += 1
+    def _discard(self, index: int):
+        region = self.region_of[index]
+        position = self._slots[index]
+        self._counts[region] -= 1
+        last = self._members[self._starts[region] + self._counts[region]]
+        self._members[position] = last #Fill the hole with the region's last empty tile
+        self._slots[last] = position
+        self._slots[index] = -1
+
+    def region(self, index: int) -> int:
+        """Returns the region of a grid index, or NO_REGION for static tiles."""
+        return self.region_of[index]
+    def empty_count(self, region: int) -> int:
+        """Returns the number of empty tiles in a region."""
+        if not self._indexed:
+            self.index_empty_tiles()
+        return self._counts[region]
+    def choice(self, region: int, rng) -> int:
+        """Returns a uniformly random empty tile in a region, or None if it has none."""
+        if not self._indexed:
+            self.index_empty_tiles()
+        if region == NO_REGION or not self._counts[region]:
+            return None
+        return self._members[self._starts[region] + rng.randrange(self._counts[region])]
+
+    def pack_state(self, output: bytearray):
+        """Appends the empty tile index to output, whose order decides which tiles random choices pick.
+        The regions themselves aren't included, they're flooded again from the restored grid."""
+        if not self._indexed:
+            self.index_empty_tiles()
+        output += STATE_HEADER.pack(len(self._counts))
+        output += self._counts
+        output += self._members
+        output += self._slots
+    def unpack_state(self, data: memoryview, offset: int) -> int:
+        """Restores an index written by pack_state() after the grid has been restored, and returns the offset after it."""
+        region_count, = STATE_HEADER.unpack_from(data, offset)
+        if region_count != len(self.cells):
+            raise ValueError(f"State has {region_count} regions but the grid has {len(self.cells)}")
+        offset += STATE_HEADER.size
+        self._starts = array("I", [0])
+        for size in self.sizes[:-1]:
+            self._starts.append(self._starts[-1] + size)
+        for name, typecode, length in (("_counts", "I", region_count), ("_members", "I", sum(self.sizes)),
+                                       ("_slots", "i", self.grid.total_tiles)):
+            buffer = array(typecode)
+            buffer.frombytes(data[offset:offset + 4 * length])
+            setattr(self, name, buffer)
+            offset += 4 * length
+        self._indexed = True
+        return offset
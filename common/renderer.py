@@ -0,0 +1,255 @@
+import settings, pyxel
+from common.grid import Grid, TILE_CODES, EMPTY, STATIC_CODES, SPRITE_OFFSETS, ANIMATION_FRAMES
+
+# Tile code -> itself for static tiles and EMPTY for everything else, for bytes.translate()
+STATIC_TABLE = bytes(code if code in STATIC_CODES else EMPTY for code in range(256))
+IMAGE_BANK_SIZE = 256 #Width and height of a Pyxel image bank in pixels
+
+class GridRenderer:
+    """Draws a grid's tiles on the screen with Pyxel."""
+
+    def __init__(self, horizontal_offset: int = 0, vertical_offset: int = 10):
+        self.horizontal_offset = horizontal_offset
+        self.vertical_offset = vertical_offset #Leaves room for the score bar
+        self.blits = 0 #Tiles drawn so far, for profiling
+
+    def screen_coordinates(self, x: int, y: int) -> tuple:
+        """Returns the screen coordinates of a grid tile."""
+        return ((x * settings.TILE_SIZE["width"]) + self.horizontal_offset,
+                (y * settings.TILE_SIZE["height"]) + self.vertical_offset)
+    def sprite_coordinates(self, tile_type: str, rotation: int = 0, animation_frame: int = 0) -> tuple:
+        """Returns the sprite coordinates of a tile from given animation frame or rotation value.
+        If the tile is animated, the animation frame is used to determine y value.
+        Otherwise, the rotation value is used."""
+        tile_code = TILE_CODES[tile_type]
+        if ANIMATION_FRAMES[tile_code]:
+            return (SPRITE_OFFSETS[tile_code], animation_frame * settings.TILE_SIZE["width"])
+        else:
+            return (SPRITE_OFFSETS[tile_code], rotation * settings.TILE_SIZE["width"])
+    def index_sprite_coordinates(self, grid: Grid, index: int) -> tuple:
+        """Returns the sprite coordinates for the current state of the tile at a buffer index."""
+        tile_code = grid.types[index]
+        column = grid.frames[index] if ANIMATION_FRAMES[tile_code] else grid.rotations[index]
+        return (SPRITE_OFFSETS[tile_code], column * settings.TILE_SIZE["width"])
+
+    def index_screen_coordinates(self, grid: Grid, index: int) -> tuple:
+        """Returns the screen coordinates of the tile at a buffer index, or None if it is out of view."""
+        return self.screen_coordinates(*grid.coordinates(index))
+    def follow(self, grid: Grid, index: int) -> bool:
+        """Keeps a tile in view and returns whether the view moved. The whole grid is always in view."""
+        return False
+
+    def draw_all_tiles(self, grid: Grid):
+        """Draws the entire grid of tiles on the screen."""
+        for index in range(grid.total_tiles):
+            self.draw_tile(*self.screen_coordinates(*grid.coordinates(index)), *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.clear() #Clear set of updated tiles
+    def draw_updated_tiles(self, grid: Grid):
+        """Redraws only the tiles that changed since the last frame, including animation frame changes.
+        Assumes the rest of the screen still holds the previous frame."""
+        for index in grid.updated_tiles:
+            screen_x, screen_y = self.screen_coordinates(*grid.coordinates(index))
+            # Clear the old sprite first since sprites have transparent pixels
+            pyxel.rect(screen_x, screen_y, settings.TILE_SIZE["width"], settings.TILE_SIZE["height"],
+                       settings.BACKGROUND_COLOR)
+            self.draw_tile(screen_x, screen_y, *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.clear() #Clear set of updated tiles
+    def draw_moving_tile(self, grid: Grid, index: int, direction: int, progress: float):
+        """Draws the tile at a buffer index part of the way (0 to 1) towards its neighbor in direction, for smooth
+        movement between ticks. Both tiles are marked as updated so the next frame puts them back."""
+        neighbor = grid.neighbor(index, direction)
+        start = self.index_screen_coordinates(grid, index)
+        end = self.index_screen_coordinates(grid, neighbor)
+        if start is None:
+            return
+        offset_x, offset_y = (0, 0) if end is None else (end[0] - start[0], end[1] - start[1])
+        if (abs(offset_x), abs(offset_y)) not in ((settings.TILE_SIZE["width"], 0), (0, settings.TILE_SIZE["height"])):
+            offset_x, offset_y = 0, 0 #Don't slide across the wrap-around edge or out of view
+        pyxel.rect(*start, settings.TILE_SIZE["width"], settings.TILE_SIZE["height"], settings.BACKGROUND_COLOR)
+        self.draw_tile(start[0] + round(offset_x * progress), start[1] + round(offset_y * progress),
+                       *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.update((index, neighbor))
+    def draw_tile(self, x: int, y: int,
+                  sprite_x: int, sprite_y: int, spritesheet_number: int = settings.SPRITESHEET_NUMBER,
+                  size_x: int = settings.TILE_SIZE["width"], size_y: int = settings.TILE_SIZE["height"]):
+        """Draws an individual tile on the screen at (x,y)."""
+        self.blits += 1
+        pyxel.blt(
+            x, y,
+            spritesheet_number,
+            sprite_y, sprite_x,
+            size_x, size_y,
+            settings.TRANSPARENT_COLOR)
+
+class LayeredRenderer(GridRenderer):
+    """Draws a grid as two layers: static tiles like walls, prerendered once per level into a spare
+    image bank and drawn with a single blit, and everything else (snake, items, animations) on top.
+    Drawing a frame then costs one blit per dynamic tile instead of one per grid tile.
+    Grids too big for the image bank are drawn a tile at a time like GridRenderer does."""
+
+    def __init__(self, horizontal_offset: int = 0, vertical_offset: int = 10,
+                 image_bank: int = settings.BACKGROUND_IMAGE_BANK):
+        super().__init__(horizontal_offset, vertical_offset)
+        self.image_bank = image_bank
+        self._layer_grid = None #Grid the static layer was prerendered from
+        self._layer = b"" #Static tile code (or EMPTY) of every tile in the prerendered layer
+
+    def fits(self, grid: Grid) -> bool:
+        """Returns whether the static layer of a grid fits in the image bank."""
+        return (grid.width * settings.TILE_SIZE["width"] <= IMAGE_BANK_SIZE
+                and grid.height * settings.TILE_SIZE["height"] <= IMAGE_BANK_SIZE)
+    def prerender(self, grid: Grid):
+        """Draws the static tiles of a grid into the image bank."""
+        image = pyxel.images[self.image_bank]
+        image.cls(settings.BACKGROUND_COLOR)
+        self._layer = bytearray(grid.types.translate(STATIC_TABLE))
+        self._layer_grid = grid
+        for index, tile_code in enumerate(self._layer):
+            if tile_code != EMPTY:
+                self.draw_layer_tile(grid, index)
+    def draw_layer_tile(self, grid: Grid, index: int):
+        """Draws the current state of a static tile into the image bank."""
+        x, y = grid.coordinates(index)
+        sprite_x, sprite_y = self.index_sprite_coordinates(grid, index)
+        self.blits += 1
+        pyxel.images[self.image_bank].blt(
+            x * settings.TILE_SIZE["width"], y * settings.TILE_SIZE["height"],
+            settings.SPRITESHEET_NUMBER,
+            sprite_y, sprite_x,
+            settings.TILE_SIZE["width"], settings.TILE_SIZE["height"],
+            settings.TRANSPARENT_COLOR)
+    def update_layer_tile(self, grid: Grid, index: int):
+        """Redraws a tile of the image bank if the static tile there has changed, which levels normally don't do."""
+        tile_code = STATIC_TABLE[grid.types[index]]
+        if tile_code == self._layer[index]:
+            return
+        x, y = grid.coordinates(index)
+        pyxel.images[self.image_bank].rect(x * settings.TILE_SIZE["width"], y * settings.TILE_SIZE["height"],
+                                           settings.TILE_SIZE["width"], settings.TILE_SIZE["height"],
+                                           settings.BACKGROUND_COLOR)
+        self._layer[index] = tile_code
+        if tile_code != EMPTY:
+            self.draw_layer_tile(grid, index)
+
+    def draw_all_tiles(self, grid: Grid):
+        """Draws the static layer, prerendering it first for a new grid, then every dynamic tile on top."""
+        if not self.fits(grid):
+            super().draw_all_tiles(grid) #Tiles past the edge of the image bank would be clipped out of the layer
+            return
+        if self._layer_grid is not grid:
+            self.prerender(grid)
+        else:
+            for index in grid.updated_tiles:
+                self.update_layer_tile(grid, index)
+        self.blits += 1
+        pyxel.blt(self.horizontal_offset, self.vertical_offset, self.image_bank, 0, 0,
+                  grid.width * settings.TILE_SIZE["width"], grid.height * settings.TILE_SIZE["height"])
+        layer = self._layer
+        for index, tile_code in enumerate(grid.types):
+            if tile_code != EMPTY and tile_code != layer[index]:
+                self.draw_tile(*self.screen_coordinates(*grid.coordinates(index)), *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.clear() #Clear set of updated tiles
+    def draw_updated_tiles(self, grid: Grid):
+        """Redraws only the tiles that changed since the last frame, restoring the static layer underneath
+        each one first. Assumes the rest of the screen still holds the previous frame."""
+        if not self.fits(grid):
+            super().draw_updated_tiles(grid)
+            return
+        if self._layer_grid is not grid:
+            self.draw_all_tiles(grid)
+            return
+        layer = self._layer
+        for index in grid.updated_tiles:
+            self.update_layer_tile(grid, index)
+            x, y = grid.coordinates(index)
+            screen_x, screen_y = self.screen_coordinates(x, y)
+            # Clear the old sprite first since sprites have transparent pixels, copying back the static layer if it has a tile here
+            if layer[index] == EMPTY:
+                pyxel.rect(screen_x, screen_y, settings.TILE_SIZE["width"], settings.TILE_SIZE["height"],
+                           settings.BACKGROUND_COLOR)
+            else:
+                self.blits += 1
+                pyxel.blt(screen_x, screen_y, self.image_bank,
+                          x * settings.TILE_SIZE["width"], y * settings.TILE_SIZE["height"],
+                          settings.TILE_SIZE["width"], settings.TILE_SIZE["height"])
+            tile_code = grid.types[index]
+            if tile_code != EMPTY and tile_code != layer[index]:
+                self.draw_tile(screen_x, screen_y, *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.clear() #Clear set of updated tiles
+
+class ViewportRenderer(GridRenderer):
+    """Draws the part of a big wrap-around grid that fits on the screen, scrolling to follow a tile.
+    Only tiles inside the view are drawn, so drawing costs the same however big the grid is."""
+
+    def __init__(self, horizontal_offset: int = 0, vertical_offset: int = 10,
+                 view_width: int = settings.GRID_WIDTH, view_height: int = settings.GRID_HEIGHT,
+                 margin: int = settings.CAMERA_MARGIN):
+        super().__init__(horizontal_offset, vertical_offset)
+        self.view_width = view_width
+        self.view_height = view_height
+        self.margin = margin
+        self.left = 0 #Grid coordinates of the top left tile in view
+        self.top = 0
+
+    def center_on(self, grid: Grid, index: int):
+        """Moves the view so a tile is in the middle."""
+        x, y = grid.coordinates(index)
+        self.left = (x - self.view_width // 2) % grid.width
+        self.top = (y - self.view_height // 2) % grid.height
+    def follow(self, grid: Grid, index: int) -> bool:
+        """Scrolls just enough to keep a tile at least margin tiles inside the view and returns whether the view moved."""
+        x, y = grid.coordinates(index)
+        left = self._scroll(self.left, x, self.view_width, grid.width)
+        top = self._scroll(self.top, y, self.view_height, grid.height)
+        moved = (left, top) != (self.left, self.top)
+        self.left, self.top = left, top
+        return moved
+    def _scroll(self, start: int, position: int, view_size: int, grid_size: int) -> int:
+        """Returns the new start of the view along one axis."""
+        # Signed offset of the position from the middle of the view, the short way around the grid
+        offset = (position - start - view_size // 2 + grid_size // 2) % grid_size - grid_size // 2
+        limit = view_size // 2 - self.margin
+        if offset > limit:
+            start += offset - limit
+        elif offset < -limit:
+            start += offset + limit
+        return start % grid_size
+
+    def index_screen_coordinates(self, grid: Grid, index: int) -> tuple:
+        """Returns the screen coordinates of the tile at a buffer index, or None if it is out of view."""
+        view_position = self.view_coordinates(grid, index)
+        return None if view_position is None else self.screen_coordinates(*view_position)
+    def view_coordinates(self, grid: Grid, index: int) -> tuple:
+        """Returns the position of a tile in the view, or None if it is out of view."""
+        x, y = grid.coordinates(index)
+        view_x, view_y = (x - self.left) % grid.width, (y - self.top) % grid.height
+        if view_x < self.view_width and view_y < self.view_height:
+            return (view_x, view_y)
+        return None
+
+    def draw_all_tiles(self, grid: Grid):
+        """Clears the view and draws every tile in it."""
+        pyxel.rect(self.horizontal_offset, self.vertical_offset,
+                   self.view_width * settings.TILE_SIZE["width"], self.view_height * settings.TILE_SIZE["height"],
+                   settings.BACKGROUND_COLOR)
+        types = grid.types
+        for view_y in range(self.view_height):
+            for view_x in range(self.view_width):
+                index = grid.index(self.left + view_x, self.top + view_y)
+                if types[index] != EMPTY: #Empty tiles are fully transparent
+                    self.draw_tile(*self.screen_coordinates(view_x, view_y), *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.clear() #Clear set of updated tiles
+    def draw_updated_tiles(self, grid: Grid):
+        """Redraws only the tiles in view that changed since the last frame.
+        Assumes the view hasn't moved and the rest of the screen still holds the previous frame."""
+        for index in grid.updated_tiles:
+            view_position = self.view_coordinates(grid, index)
+            if view_position is None:
+                continue
+            screen_x, screen_y = self.screen_coordinates(*view_position)
+            # Clear the old sprite first since sprites have transparent pixels
+            pyxel.rect(screen_x, screen_y, settings.TILE_SIZE["width"], settings.TILE_SIZE["height"],
+                       settings.BACKGROUND_COLOR)
+            if grid.types[index] != EMPTY:
+                self.draw_tile(screen_x, screen_y, *self.index_sprite_coordinates(grid, index))
+        grid.updated_tiles.clear() #Clear set of updated tiles
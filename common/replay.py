@@ -0,0 +1,154 @@
+"""
+Deterministic replays. A recording is the engine's seed and starting level plus one input byte per frame,
+with compressed state snapshots every few frames so seeking only re-simulates from the nearest one.
+
+    python -m common.replay game.snkr --verify
+    python -m common.replay game.snkr --seek 5000
+"""
+
+import settings, argparse, bisect, hashlib, struct, sys, zlib
+from common.engine import SnekEngine
+
+FORMAT_VERSION = 4
+MAGIC = b"SNKR"
+# Magic, format version, seed, starting level, snapshot interval, frames, input bytes, snapshots
+HEADER = struct.Struct("<4sHQHIIII")
+SNAPSHOT_ENTRY = struct.Struct("<III") #Frame, offset into the inputs, compressed snapshot length
+
+# Input bytes. Directions are stored as themselves (0-3).
+NO_DIRECTION = 4 #step() without a direction
+IDLE = 5 #idle()
+RESET = 6 #reset(), followed by a byte with the level
+
+def state_hash(engine: SnekEngine) -> bytes:
+    """Returns a digest of the engine's full game state, to check that two games match."""
+    return hashlib.sha256(engine.snapshot()).digest()
+
+def apply_input(engine: SnekEngine, inputs: bytes, offset: int) -> int:
+    """Applies the frame starting at offset in inputs and returns the offset of the next frame."""
+    action = inputs[offset]
+    if action == IDLE:
+        engine.idle()
+    elif action == RESET:
+        engine.reset(inputs[offset + 1])
+        return offset + 2
+    else:
+        engine.step(None if action == NO_DIRECTION else action)
+    return offset + 1
+
+class ReplayRecorder:
+    """Records the input of every frame sent to an engine. Use it in place of the engine's
+    step(), idle() and reset() methods, then save() the recording."""
+
+    def __init__(self, engine: SnekEngine, snapshot_interval: int = settings.REPLAY_SNAPSHOT_INTERVAL):
+        self.engine = engine
+        self.snapshot_interval = snapshot_interval
+        self.seed = engine.seed
+        self.level = engine.level
+        self.frame_count = 0
+        self.inputs = bytearray()
+        self.snapshots = [] #(frame, input offset, compressed snapshot), starting with frame 0
+        self._snapshot()
+
+    def _snapshot(self):
+        """Stores the state before the next frame if a snapshot is due."""
+        if self.frame_count % self.snapshot_interval == 0:
+            self.snapshots.append((self.frame_count, len(self.inputs), zlib.compress(self.engine.snapshot())))
+    def _record(self, *data: int):
+        """Adds a frame's input."""
+        self.inputs.extend(data)
+        self.frame_count += 1
+
+    def step(self, requested_direction: int = None):
+        self._record(NO_DIRECTION if requested_direction is None else requested_direction)
+        self.engine.step(requested_direction)
+        self._snapshot()
+    def idle(self):
+        self._record(IDLE)
+        self.engine.idle()
+        self._snapshot()
+    def reset(self, level: int):
+        self._record(RESET, level)
+        self.engine.reset(level)
+        self._snapshot()
+
+    def save(self, path: str):
+        """Writes the recording so far, ending with a digest of the current state to verify replays against."""
+        with open(path, "wb") as output:
+            output.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.seed, self.level, self.snapshot_interval,
+                                     self.frame_count, len(self.inputs), len(self.snapshots)))
+            output.write(self.inputs)
+            for frame, offset, snapshot in self.snapshots:
+                output.write(SNAPSHOT_ENTRY.pack(frame, offset, len(snapshot)))
+            for _, _, snapshot in self.snapshots:
+                output.write(snapshot)
+            output.write(state_hash(self.engine))
+
+class Replay:
+    """A saved recording that can be re-simulated without rendering."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as replay_file:
+            data = replay_file.read()
+        (magic, version, self.seed, self.level, self.snapshot_interval,
+         self.frame_count, input_length, snapshot_count) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a replay in the current format")
+        offset = HEADER.size
+        self.inputs = data[offset:offset + input_length]
+        offset += input_length
+        entries = [SNAPSHOT_ENTRY.unpack_from(data, offset + i * SNAPSHOT_ENTRY.size) for i in range(snapshot_count)]
+        offset += snapshot_count * SNAPSHOT_ENTRY.size
+        self.snapshots = [] #(frame, input offset, compressed snapshot)
+        for frame, input_offset, length in entries:
+            self.snapshots.append((frame, input_offset, data[offset:offset + length]))
+            offset += length
+        self.final_hash = data[offset:offset + hashlib.sha256().digest_size]
+        self._snapshot_frames = [frame for frame, _, _ in self.snapshots]
+
+    def seek(self, frame: int, engine: SnekEngine = None) -> SnekEngine:
+        """Returns an engine in the state before the given frame, restored from the nearest snapshot
+        and re-simulated from there. Reuses engine if one is given."""
+        if not 0 <= frame <= self.frame_count:
+            raise IndexError(f"Frame {frame} is outside the replay (0-{self.frame_count})")
+        snapshot_frame, offset, snapshot = self.snapshots[bisect.bisect_right(self._snapshot_frames, frame) - 1]
+        if engine is None:
+            engine = SnekEngine(level = self.level, seed = self.seed)
+        engine.restore(zlib.decompress(snapshot))
+        for _ in range(frame - snapshot_frame):
+            offset = apply_input(engine, self.inputs, offset)
+        return engine
+    def run(self) -> SnekEngine:
+        """Re-simulates the whole replay from the start and returns the engine at the end."""
+        engine = SnekEngine(level = self.level, seed = self.seed)
+        engine.restore(zlib.decompress(self.snapshots[0][2]))
+        offset = 0
+        while offset < len(self.inputs):
+            offset = apply_input(engine, self.inputs, offset)
+        return engine
+    def verify(self) -> bool:
+        """Returns whether re-simulating the replay ends in the same state as the recorded game."""
+        return state_hash(self.run()) == self.final_hash
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("replay", help = "replay file to load")
+    parser.add_argument("--seek", type = int, metavar = "FRAME", help = "show the state before this frame instead of the end")
+    parser.add_argument("--verify", action = "store_true", help = "fail if the replay doesn't reproduce the recorded game")
+    options = parser.parse_args(arguments)
+
+    replay = Replay(options.replay)
+    engine = replay.run() if options.seek is None else replay.seek(options.seek)
+    print(f"frame {replay.frame_count if options.seek is None else options.seek}/{replay.frame_count}: "
+          f"level {engine.level} score {engine.score} length {engine.snake.length} game over {engine.game_over}")
+    if options.verify:
+        if options.seek is not None:
+            engine = replay.run()
+        if state_hash(engine) != replay.final_hash:
+            print("replay does not match the recorded game")
+            return 1
+        print("replay matches the recorded game")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
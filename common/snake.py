@@ -1,72 +1,149 @@
-import settings, common.utils as utils
-from common.grid import Grid, Tile
-from collections import deque
+import settings, struct, common.utils as utils
+from common.grid import Grid, Tile, TILE_CODES, EMPTY
+from array import array
 
-class Snake:
-    """Snake object class."""
+SNAKE_HEAD = TILE_CODES["snake_head"]
+SNAKE_BODY_STRAIGHT = TILE_CODES["snake_body_straight"]
+SNAKE_BODY_LEFT = TILE_CODES["snake_body_left"]
+SNAKE_BODY_RIGHT = TILE_CODES["snake_body_right"]
+SNAKE_TAIL = TILE_CODES["snake_tail"]
 
-    def __init__(self, grid: Grid, snake_start: utils.Point):
+STATE_HEADER = struct.Struct("<I") #Length, followed by the grid index of each cell from tail to head
+
+class Snake:
+    """Snake object class.
+    The body is a ring buffer of grid indices with the head at _head_slot and the tail
+    _length - 1 slots behind it, plus a bitset of occupied grid indices, so moving, growing and
+    checking for collisions don't depend on the length of the snake. The ring buffer doubles
+    in size when the snake outgrows it, so it goes with the snake's length rather than the grid's size."""
 
-        head_tile = grid.update_tile(snake_start.x, snake_start.y, "snake_head", 0)
-        body_tiles = [
-            grid.update_tile(
-                head_tile.grid_coordinates.x,
-                head_tile.grid_coordinates.y + (i + 1),
-                "snake_body_straight",
-                head_tile._rotation,
-            )
-            for i in range(settings.SNAKE_START_LENGTH)
-        ]
-        tail_tile = grid.update_tile(
-            head_tile.grid_coordinates.x,
-            body_tiles[-1].grid_coordinates.y + 1,
-            "snake_tail",
-            body_tiles[-1]._rotation,
-        )
+    INITIAL_CAPACITY = 64
 
-        # Include head and tail as part of the body deque
-        self._body = deque([head_tile] + body_tiles + [tail_tile])
+    def __init__(self, grid: Grid, snake_start: utils.Point):
         self._grid = grid
+        self._capacity = min(grid.total_tiles, self.INITIAL_CAPACITY)
+        self._cells = array("I", bytes(4 * self._capacity))
+        self._occupied = bytearray((grid.total_tiles + 7) // 8)
+        self._head_slot = 0
+        self._length = 0
+
+        # Lay out head, body and tail downwards from the start position, tail first
+        head = grid.index(*snake_start)
+        cells = [grid.index(snake_start.x, snake_start.y + i) for i in range(settings.SNAKE_START_LENGTH + 2)]
+        for cell in reversed(cells):
+            self._push_head(cell)
+        grid.set_tile(head, SNAKE_HEAD, 0)
+        for cell in cells[1:-1]:
+            grid.set_tile(cell, SNAKE_BODY_STRAIGHT, 0)
+        grid.set_tile(cells[-1], SNAKE_TAIL, 0)
 
     @property
-    def body(self) -> deque:
-        return self._body
+    def body(self) -> list:
+        """Returns tile views of the snake from head to tail."""
+        return [self._grid.tile_at(cell) for cell in self.cells()]
     @property
     def grid(self) -> Grid:
         return self._grid
+    @property
+    def head(self) -> int:
+        """Returns the grid index of the head."""
+        return self._cells[self._head_slot]
+    @property
+    def tail(self) -> int:
+        """Returns the grid index of the tail."""
+        return self._cells[(self._head_slot - self._length + 1) % self._capacity]
+    @property
+    def length(self) -> int:
+        """Returns the number of tiles the snake covers, including head and tail."""
+        return self._length
+    @property
+    def direction(self) -> int:
+        """Returns the direction the head is facing."""
+        return self._grid.rotations[self.head]
+
+    @classmethod
+    def unpack_state(cls, grid: Grid, data: memoryview, offset: int) -> tuple:
+        """Returns a snake restored from pack_state() at offset in data without touching the grid,
+        and the offset after it. The ring buffer is unrolled with the tail in slot 0."""
+        snake = cls.__new__(cls)
+        snake._grid = grid
+        snake._length, = STATE_HEADER.unpack_from(data, offset)
+        offset += STATE_HEADER.size
+        snake._cells = array("I")
+        snake._cells.frombytes(data[offset:offset + 4 * snake._length])
+        snake._capacity = min(grid.total_tiles, max(cls.INITIAL_CAPACITY, 1 << (snake._length - 1).bit_length()))
+        snake._cells.extend(array("I", bytes(4 * (snake._capacity - snake._length))))
+        snake._head_slot = snake._length - 1
+        snake._occupied = occupied = bytearray((grid.total_tiles + 7) // 8)
+        for index in snake._cells[:snake._length]:
+            occupied[index >> 3] |= 1 << (index & 7)
+        return snake, offset + 4 * snake._length
+    def pack_state(self, output: bytearray):
+        """Appends the snake's cells to output, copying the ring buffer in at most two slices."""
+        output += STATE_HEADER.pack(self._length)
+        tail_slot = (self._head_slot - self._length + 1) % self._capacity
+        if tail_slot <= self._head_slot:
+            output += self._cells[tail_slot:self._head_slot + 1]
+        else:
+            output += self._cells[tail_slot:]
+            output += self._cells[:self._head_slot + 1]
+
+    def cells(self):
+        """Yields the grid indices of the snake from head to tail."""
+        for i in range(self._length):
+            yield self._cells[(self._head_slot - i) % self._capacity]
+    def occupies(self, index: int) -> bool:
+        """Returns whether any part of the snake is on the grid index."""
+        return (self._occupied[index >> 3] >> (index & 7)) & 1 == 1
+    def _grow(self):
+        """Doubles the size of the ring buffer, unrolling it so the tail is in slot 0."""
+        cells = array("I", self.cells())
+        cells.reverse()
+        self._capacity *= 2
+        cells.extend(array("I", bytes(4 * (self._capacity - self._length))))
+        self._cells = cells
+        self._head_slot = self._length - 1
+    def _push_head(self, index: int):
+        """Adds a new head cell to the ring buffer and marks it occupied."""
+        if self._length == self._capacity:
+            self._grow()
+        self._head_slot = (self._head_slot + 1) % self._capacity
+        self._cells[self._head_slot] = index
+        self._occupied[index >> 3] |= 1 << (index & 7)
+        self._length += 1
+    def _pop_tail(self) -> int:
+        """Removes the tail cell from the ring buffer, marks it free and returns it."""
+        index = self.tail
+        self._occupied[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self._length -= 1
+        return index
 
-    def _body_tile_index(self, tile: Tile) -> int:
-        """Returns the index of a tile in the snake's body if it exists, or -1 if not found."""
-        indices = [index for index, body_tile in enumerate(self.body) if body_tile == tile]
-        return indices[0] if indices else -1
-    
     def get_next_tile(self, direction: int) -> Tile:
         """Returns the tile that the snake will move into if it moves in the specified direction."""
-        return self.grid.get_neighbor(self.body[0], direction)
+        return self.grid.tile_at(self.grid.neighbor(self.head, direction))
 
     def move_forward(self, new_direction: int, elongate_snake: bool = False):
         """Moves the snake 1 tile in the specified direction."""
-        current_head_position = self.body[0]
-        new_head_position = self.grid.get_neighbor(current_head_position, new_direction)
+        grid = self._grid
+        old_head = self.head
+        old_head_rotation = grid.rotations[old_head]
+        new_head = grid.neighbor(old_head, new_direction)
 
         #Move the head
-        new_head = self.grid.update_tile(new_head_position.x, new_head_position.y, "snake_head", new_direction)
-        old_head = self.body.popleft()
-        self.body.appendleft(new_head)
+        grid.set_tile(new_head, SNAKE_HEAD, new_direction)
+        self._push_head(new_head)
         #Update the previous head location with a new body tile
-        direction_change = (new_direction - old_head._rotation) % 4
-        body_tile_type = "snake_body_straight"
+        direction_change = (new_direction - old_head_rotation) % 4
+        body_tile_code = SNAKE_BODY_STRAIGHT
         if direction_change == 1:
-            body_tile_type = "snake_body_right"
+            body_tile_code = SNAKE_BODY_RIGHT
         elif direction_change == 3:
-            body_tile_type = "snake_body_left"
+            body_tile_code = SNAKE_BODY_LEFT
+        grid.set_tile(old_head, body_tile_code, old_head_rotation)
 
-        self.body.insert(1, old_head)
-        if settings.DEBUG:
-            print("Old head body tile index should always be 1:", self._body_tile_index(old_head))
-        self.grid.update_tile(old_head.x, old_head.y, body_tile_type, old_head._rotation)
         #Move the tail if the snake is not getting longer
         if not elongate_snake:
-            old_tail = self.body.pop()
-            self.grid.update_tile(old_tail.x, old_tail.y, "empty")
-            new_tail = self.grid.update_tile(self.body[-1].x, self.body[-1].y, "snake_tail", self.body[-2]._rotation)
\ No newline at end of file
+            grid.set_tile(self._pop_tail(), EMPTY)
+            # The tail points the same way as the body tile in front of it
+            in_front_of_tail = self._cells[(self._head_slot - self._length + 2) % self._capacity]
+            grid.set_tile(self.tail, SNAKE_TAIL, grid.rotations[in_front_of_tail])
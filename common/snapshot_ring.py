@@ -0,0 +1,32 @@
+"""
+Recent game states kept in memory, so the game can be rolled back a few seconds at a time.
+"""
+
+from collections import deque
+from common.engine import SnekEngine
+
+class SnapshotRing:
+    """Fixed number of the most recent engine snapshots, oldest first. Snapshots are the packed bytes
+    from SnekEngine.snapshot(), so pushing one every tick costs tens of microseconds and a few kilobytes."""
+
+    def __init__(self, capacity: int):
+        self._snapshots = deque(maxlen = capacity) #When full, the oldest is dropped
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def push(self, engine: SnekEngine):
+        """Stores the engine's current state."""
+        self._snapshots.append(engine.snapshot())
+    def rollback(self, engine: SnekEngine, steps: int = 1) -> bool:
+        """Restores the state from steps pushes ago, or the oldest one kept, and forgets everything newer.
+        The restored state stays in the ring so it can be rolled back to again.
+        Returns False if there is nothing to roll back to."""
+        if not self._snapshots:
+            return False
+        for _ in range(min(steps, len(self._snapshots) - 1)):
+            self._snapshots.pop()
+        engine.restore(self._snapshots[-1])
+        return True
+    def clear(self):
+        self._snapshots.clear()
@@ -0,0 +1,50 @@
+"""
+Startup timing, to see which imports and init phases stand between launching the game and its first frame or tick.
+"""
+
+import sys, time
+from contextlib import contextmanager
+
+class StartupProfiler:
+    """Times the phases of starting the game, one after another, from a start time taken as early as possible:
+
+        with startup.phase("import common.engine"):
+            from common.engine import SnekEngine
+
+    Time between phases isn't lost, the report shows it as "other". For the import tree inside a phase,
+    run with python -X importtime."""
+
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = [] #(name, seconds) in the order they ran
+        self.finished = None #Time of the first frame or tick, once it has happened
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the code inside the with block as a phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+    def finish(self) -> float:
+        """Marks startup as finished, if it isn't already, and returns the total startup time in seconds."""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        return self.finished - self.started
+
+    def to_dict(self) -> dict:
+        """Returns the phase times and total in milliseconds, e.g. for storing alongside benchmark results."""
+        total = self.finish()
+        phases = {name: seconds * 1000 for name, seconds in self.phases}
+        phases["other"] = max(total - sum(seconds for _, seconds in self.phases), 0) * 1000
+        return {"phases": phases, "total": total * 1000}
+    def report(self, file = None):
+        """Prints how long each phase took and its share of the total."""
+        file = file if file is not None else sys.stderr
+        timings = self.to_dict()
+        total = timings["total"]
+        print(f"{'startup phase':<30} {'ms':>8} {'share':>7}", file = file)
+        for name, milliseconds in timings["phases"].items():
+            print(f"{name:<30} {milliseconds:>8.2f} {milliseconds / total if total else 0:>7.1%}", file = file)
+        print(f"{'total':<30} {total:>8.2f}", file = file)
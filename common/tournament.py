@@ -0,0 +1,96 @@
+"""
+Plays many seeded games per bot policy across a process pool, with no window, and reports
+score, survival ticks and what ended each game.
+
+    python -m common.tournament straight cautious greedy --games 2000
+    python -m common.tournament mybots:chaser --level 2 --output results.json
+"""
+
+import settings, argparse, json, os, sys, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from common.engine import SnekEngine
+from common.level_cache import LevelCache
+from common.policies import POLICIES, load_policy
+
+DEFAULT_GAMES = 1000
+DEFAULT_MAX_TICKS = 10000 #Games still going after this many ticks end with the cause "timeout"
+DEFAULT_CHUNK_SIZE = 50 #Games sent to a worker at a time
+
+_levels = None #Each worker process keeps its own level cache, so levels are only mapped once per process
+
+def play_game(policy, level: int, seed: int, max_ticks: int = DEFAULT_MAX_TICKS, levels: LevelCache = None) -> tuple:
+    """Plays one game and returns (score, ticks survived, cause of death)."""
+    engine = SnekEngine(levels = levels, level = level, seed = seed)
+    while not engine.game_over and engine.tick < max_ticks:
+        engine.step(policy(engine))
+    return engine.score, engine.tick, engine.death_cause if engine.game_over else "timeout"
+
+def play_chunk(policy_name: str, level: int, seeds: range, max_ticks: int) -> list:
+    """Plays a game for each seed in a worker process. Policies are passed by name so they don't need pickling."""
+    global _levels
+    if _levels is None:
+        _levels = LevelCache()
+    policy = load_policy(policy_name)
+    return [play_game(policy, level, seed, max_ticks, _levels) for seed in seeds]
+
+def summarize(results: list) -> dict:
+    """Aggregates the results of one policy's games."""
+    scores = sorted(score for score, _, _ in results)
+    ticks = sorted(tick for _, tick, _ in results)
+    return {
+        "games": len(results),
+        "score_mean": sum(scores) / len(scores),
+        "score_median": scores[len(scores) // 2],
+        "score_max": scores[-1],
+        "ticks_mean": sum(ticks) / len(ticks),
+        "ticks_median": ticks[len(ticks) // 2],
+        "deaths": dict(Counter(cause for _, _, cause in results).most_common()),
+    }
+
+def run_tournament(policy_names: list, games: int = DEFAULT_GAMES, level: int = settings.STARTING_LEVEL,
+                   seed: int = 0, max_ticks: int = DEFAULT_MAX_TICKS, workers: int = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """Plays games seeded seed to seed + games - 1 for every policy, so every policy sees the same games,
+    and returns a summary per policy."""
+    for name in policy_names:
+        load_policy(name) #Fail early on unknown policies instead of in every worker
+    LevelCache().get(level) #Compile the level once up front instead of in every worker
+    results = {name: [] for name in policy_names}
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = [(name, pool.submit(play_chunk, name, level, range(start, min(start + chunk_size, seed + games)), max_ticks))
+                   for name in policy_names for start in range(seed, seed + games, chunk_size)]
+        for name, future in futures:
+            results[name].extend(future.result())
+    return {name: summarize(policy_results) for name, policy_results in results.items()}
+
+def main(arguments: list = None) -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("policies", nargs = "+", metavar = "POLICY",
+                        help = f"built-in policy ({', '.join(POLICIES)}) or module:function")
+    parser.add_argument("--games", type = int, default = DEFAULT_GAMES, help = "games per policy (default %(default)s)")
+    parser.add_argument("--level", type = int, default = settings.STARTING_LEVEL, choices = list(settings.LEVELS))
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the first game (default %(default)s)")
+    parser.add_argument("--max-ticks", type = int, default = DEFAULT_MAX_TICKS, help = "tick limit per game (default %(default)s)")
+    parser.add_argument("--workers", type = int, default = os.cpu_count(), help = "worker processes (default %(default)s)")
+    parser.add_argument("--chunk-size", type = int, default = DEFAULT_CHUNK_SIZE, help = "games per batch sent to a worker (default %(default)s)")
+    parser.add_argument("--output", help = "write the summaries to this JSON file")
+    options = parser.parse_args(arguments)
+
+    started = time.perf_counter()
+    summaries = run_tournament(options.policies, options.games, options.level, options.seed,
+                               options.max_ticks, options.workers, options.chunk_size)
+    elapsed = time.perf_counter() - started
+    print(f"{'policy':<20} {'games':>6} {'score':>7} {'median':>6} {'max':>5} {'ticks':>8}  deaths")
+    for name, summary in summaries.items():
+        deaths = " ".join(f"{cause}={count}" for cause, count in summary["deaths"].items())
+        print(f"{name:<20} {summary['games']:>6} {summary['score_mean']:>7.2f} {summary['score_median']:>6} "
+              f"{summary['score_max']:>5} {summary['ticks_mean']:>8.1f}  {deaths}")
+    print(f"{options.games * len(options.policies)} games in {elapsed:.1f}s with {options.workers} workers")
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(summaries, output, indent = 2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,126 @@
 from collections import namedtuple
+from array import array
+import random
 
-Point = namedtuple("Point", ["x", "y"])
\ No newline at end of file
+Point = namedtuple("Point", ["x", "y"])
+
+class IndexedSet:
+    """Set of integers in range(capacity) with O(1) add, discard and uniform random choice.
+    Members are kept densely packed in a list, and removing one moves the last member into its slot."""
+    __slots__ = ("_members", "_slots")
+
+    def __init__(self, capacity: int, members = ()):
+        self._members = array("I") #Packed members, in no particular order
+        self._slots = array("i", [-1]) * capacity #Member -> position in _members, or -1
+        for member in members:
+            self.add(member)
+
+    @classmethod
+    def full(cls, capacity: int) -> "IndexedSet":
+        """Returns a set containing every integer in range(capacity), built in bulk."""
+        indexed_set = cls(0)
+        indexed_set._members = array("I", range(capacity))
+        indexed_set._slots = array("i", range(capacity))
+        return indexed_set
+
+    @classmethod
+    def from_buffers(cls, members, slots) -> "IndexedSet":
+        """Returns a set built from the raw bytes of another set's buffers()."""
+        indexed_set = cls(0)
+        indexed_set._members.frombytes(members)
+        indexed_set._slots.frombytes(slots)
+        return indexed_set
+    def buffers(self) -> tuple:
+        """Returns the packed member array and the member -> slot array."""
+        return (self._members, self._slots)
+
+    def __len__(self) -> int:
+        return len(self._members)
+    def __contains__(self, member: int) -> bool:
+        return self._slots[member] >= 0
+    def __iter__(self):
+        return iter(self._members)
+    def __getitem__(self, position: int) -> int:
+        """Returns the member at a position, which lets random.choice() pick a member uniformly."""
+        return self._members[position]
+
+    def add(self, member: int):
+        """Adds a member if it isn't already in the set."""
+        if self._slots[member] < 0:
+            self._slots[member] = len(self._members)
+            self._members.append(member)
+    def discard(self, member: int):
+        """Removes a member if it is in the set."""
+        slot = self._slots[member]
+        if slot < 0:
+            return
+        last = self._members.pop()
+        if last != member: #Fill the hole with the last member
+            self._members[slot] = last
+            self._slots[last] = slot
+        self._slots[member] = -1
+    def choice(self, rng: random.Random = random) -> int:
+        """Returns a uniformly random member."""
+        return self._members[rng.randrange(len(self._members))]
+
+class ComplementSet:
+    """Set of integers in range(capacity) stored as the integers that are missing from it, with the same
+    interface as IndexedSet. For sets that are nearly full, like the empty tiles of a huge and mostly empty
+    grid, memory scales with the missing integers and choice() finds a member in a few random tries."""
+    __slots__ = ("capacity", "excluded")
+
+    MAX_TRIES = 64 #Random tries before choice() falls back to listing the members
+
+    def __init__(self, capacity: int, excluded = ()):
+        self.capacity = capacity
+        self.excluded = set(excluded)
+
+    def __len__(self) -> int:
+        return self.capacity - len(self.excluded)
+    def __contains__(self, member: int) -> bool:
+        return 0 <= member < self.capacity and member not in self.excluded
+    def __iter__(self):
+        return (member for member in range(self.capacity) if member not in self.excluded)
+
+    def add(self, member: int):
+        """Adds a member if it isn't already in the set."""
+        self.excluded.discard(member)
+    def discard(self, member: int):
+        """Removes a member if it is in the set."""
+        self.excluded.add(member)
+    def choice(self, rng: random.Random = random) -> int:
+        """Returns a uniformly random member."""
+        if len(self) <= 0:
+            raise IndexError("Cannot choose from an empty set")
+        for _ in range(self.MAX_TRIES):
+            member = rng.randrange(self.capacity)
+            if member not in self.excluded:
+                return member
+        return rng.choice(list(self)) #Few members left, so list them instead
+
+class AliasTable:
+    """Weighted random choice in O(1) per draw using Vose's alias method."""
+
+    def __init__(self, weights: dict):
+        self.keys = list(weights)
+        count = len(self.keys)
+        total = sum(weights.values())
+        scaled = [weights[key] * count / total for key in self.keys]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left over is 1.0 apart from rounding errors
+
+    def choice(self, rng: random.Random = random):
+        """Returns a random key with probability proportional to its weight."""
+        column = rng.randrange(len(self.keys))
+        if rng.random() < self.probabilities[column]:
+            return self.keys[column]
+        return self.keys[self.aliases[column]]
@@ -0,0 +1,14 @@
+"""
+Shared pytest setup. pytest.ini makes the repository root the rootdir and puts it on sys.path wherever pytest
+is started from, so tests import the game modules (settings, common.*) the same way the game does.
+"""
+
+import os
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+@pytest.fixture(autouse = True)
+def run_from_repository_root(monkeypatch):
+    """Runs every test from the repository root, where settings.ASSET_FILE and the level cache are."""
+    monkeypatch.chdir(ROOT)
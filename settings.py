@@ -3,11 +3,33 @@ DEBUG = False #Enable debug mode
 STARTING_LEVEL = 1 #Starting level
 GRID_WIDTH = 32 #Grid size in tiles
 GRID_HEIGHT = 32 #Grid size in tiles
+WORLD_WIDTH = None #World size in tiles, for worlds bigger than the screen that scroll with the snake.
+WORLD_HEIGHT = None #None plays on a single screen-sized level. Must be multiples of CHUNK_SIZE.
+CHUNK_SIZE = 32 #Big worlds are stored in square chunks of this many tiles, allocated when first used
+CAMERA_MARGIN = 8 #The camera scrolls when the snake gets closer than this many tiles to the edge of the screen
 TITLE = "SNEK - Eat Fruit, Don't Die!" #Game title
-FPS = 8 #Frames per second
+FPS = 60 #Frames drawn and input read per second, and the profiler's budget of 1 / FPS seconds per frame.
+#FPS used to be 8 and also set the game speed, which TICK_RATE sets now. Don't use it to convert seconds to ticks
+TICK_RATE = 8 #Simulation ticks (snake moves) per second, independent of FPS. Settings in seconds become ticks with this
+INPUT_QUEUE_SIZE = 3 #Direction presses buffered for the coming ticks
+INTERPOLATE_MOVEMENT = False #Slide the head towards the next tile between ticks
 SCALE = 2 #Scale of the game window
+RETAINED_RENDERING = True #Only redraw tiles that changed since the last frame instead of the whole grid
+PROFILE = False #Time each phase of every frame (F1 toggles the overlay, F2 exports the results)
+PROFILE_WINDOW = 240 #How many recent frames the profiler keeps for percentiles
+PROFILE_OUTPUT = "profile" #Profiler exports are written to this path plus .json and .csv
+REPLAY_RECORD = None #Record every game to this replay file (F3 saves the recording so far)
+REPLAY_SNAPSHOT_INTERVAL = 600 #Replay frames (ticks, not drawn frames) between state snapshots, seeking re-simulates at most this many
+AUTOPILOT = False #Let the autopilot steer (TAB toggles it). In WORLD_WIDTH/HEIGHT worlds it only heads for the nearest item
+REWIND_SECONDS = 5 #How much recent play is kept in memory for rewinding (BACKSPACE rewinds a second)
+SAVE_FILE = "snek.sav" #Quick save file (F5 saves, F9 loads)
+ARENA_PORT = 7777 #TCP port the multiplayer arena server listens on
+ARENA_KEYFRAME_INTERVAL = 40 #Ticks between full grid updates from the arena server, in between only changed tiles are sent
 ASSET_FILE = "bin.pyxres" #File containing assets
+LEVEL_CACHE_DIR = ".level_cache" #Where levels compiled from the asset file are cached
+PROCEDURAL_LEVELS = False #Generate each level's layout from the engine seed instead of reading it from the asset file, a new layout every run
 SPRITESHEET_NUMBER = 0
+BACKGROUND_IMAGE_BANK = 1 #Spare image bank the static level layer is prerendered into
 BACKGROUND_COLOR = 0 #Background is color 0 (black)
 TRANSPARENT_COLOR = 6 #Color 6 is transparent (light blue)
 TILE_SIZE = {
@@ -48,6 +70,10 @@ GAMEOVER_TILES = {
     "wall",
     "item_bomb",
 }
+# Tiles that never change during a level, prerendered once per level instead of drawn every frame
+STATIC_TILES = {
+    "wall",
+}
 # Levels and their corresponding starting coordinates
 LEVELS = {
     1: {'x': 0, 'y': 0},
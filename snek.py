@@ -0,0 +1,68 @@
+"""
+Starts SNEK. Only what the chosen mode needs is imported: headless games never import Pyxel or decode any images,
+and windowed games decode only the sprites before the first frame.
+
+    python -m snek
+    python -m snek --level 2 --seed 42
+    python -m snek --headless --ticks 10000 --policy autopilot
+    python -m snek --headless --profile-startup
+"""
+
+import time
+STARTED = time.perf_counter() #Startup is timed from here, before anything else is imported
+
+import settings, sys
+from common.startup import StartupProfiler
+
+def run_headless(options, startup: StartupProfiler) -> int:
+    """Plays a game without a window, steered by a policy, and prints how it ended."""
+    with startup.phase("import common.engine"):
+        from common.engine import SnekEngine
+    with startup.phase("import common.policies"):
+        from common.policies import load_policy
+    policy = load_policy(options.policy)
+    with startup.phase("engine"):
+        engine = SnekEngine(level = options.level, seed = options.seed)
+    with startup.phase("first tick"):
+        engine.step(policy(engine))
+    startup.finish()
+    if options.profile_startup:
+        startup.report()
+
+    while not engine.game_over and engine.tick < options.ticks:
+        engine.step(policy(engine))
+    print(f"level {engine.level} seed {engine.seed} ticks {engine.tick} score {engine.score} "
+          f"length {engine.snake.length} game over {engine.game_over}")
+    return 0
+
+def run_window(options, startup: StartupProfiler) -> int:
+    """Opens the game window and plays until it's closed."""
+    with startup.phase("import pyxel"):
+        import pyxel
+    with startup.phase("import snek_game"):
+        from snek_game import SnekGame
+    SnekGame(options.level, seed = options.seed, startup = startup if options.profile_startup else None)
+    return 0
+
+def parse_arguments(arguments: list = None):
+    """Returns the parsed command line options."""
+    import argparse #Imported here so its time counts towards parsing the arguments
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--headless", action = "store_true", help = "play without a window, steered by --policy")
+    parser.add_argument("--level", type = int, choices = list(settings.LEVELS), default = settings.STARTING_LEVEL,
+                        help = "level to start on (default %(default)s)")
+    parser.add_argument("--seed", type = int, help = "seed for the game's randomness, random if not given")
+    parser.add_argument("--profile-startup", action = "store_true",
+                        help = "print how long each import and init phase took before the first frame or tick")
+    parser.add_argument("--policy", default = "autopilot", help = "policy steering headless games, by name or module:function (default %(default)s)")
+    parser.add_argument("--ticks", type = int, default = 10000, help = "most ticks a headless game runs for (default %(default)s)")
+    return parser.parse_args(arguments)
+
+def main(arguments: list = None) -> int:
+    startup = StartupProfiler(STARTED)
+    with startup.phase("parse arguments"):
+        options = parse_arguments(arguments)
+    return (run_headless if options.headless else run_window)(options, startup)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,19 +2,21 @@
 Classic(ish) snake game using Pyxel library.
 """
 
-import time
+import os, time
 import pyxel, settings, common.utils as utils
-from common.grid import Grid
-from common.snake import Snake
-from common.item_manager import ItemManager
+from common.asset_manager import AssetManager
+from common.controls import InputQueue, FixedTimestep
+from common.engine import SnekEngine
+from common.policies import Autopilot
+from common.renderer import LayeredRenderer, ViewportRenderer
+from common.snapshot_ring import SnapshotRing
+from common.startup import StartupProfiler
 
-@staticmethod
 def center_text(text: str, page_width: int, char_width: int = pyxel.FONT_WIDTH):
     """Helper function for calculating the start x value for centered text."""
 
     text_width = len(text) * char_width
     return (page_width - text_width) // 2
-@staticmethod
 def level_coordinates(level: int) -> utils.Point:
     """Returns the tilemap coordinates for the specified level."""
     level_x = ((level - 1) * settings.GRID_WIDTH) % 256
@@ -22,77 +24,136 @@ def level_coordinates(level: int) -> utils.Point:
     return utils.Point(level_x, level_y)
 
 class SnekGame:
-    """Main game class."""
-    def __init__(self, starting_level: int = settings.STARTING_LEVEL):
-        """Initialize game and variables."""
+    """Main game class. Handles the window, input and drawing; the rules live in SnekEngine."""
+    def __init__(self, starting_level: int = settings.STARTING_LEVEL, seed: int = None, startup: StartupProfiler = None):
+        """Initialize game and variables. With a startup profiler, the init phases are timed
+        and the report is printed once the first frame has been drawn."""
+        self._startup = startup
+        startup = startup if startup is not None else StartupProfiler()
 
         #Initialize game window and load assets
-        pyxel.init(
-            width = settings.GRID_WIDTH * 8, 
-            height = (settings.GRID_HEIGHT * 8) + 8, 
-            title = settings.TITLE, 
-            fps = settings.FPS, 
-            display_scale = settings.SCALE
-            )
-        pyxel.load(settings.ASSET_FILE)
-
-        self._level_map = pyxel.tilemap(0) #Load the tilemap
-        self._grid = None
-        self._item_manager = None
-        self._snake = None
+        with startup.phase("pyxel.init"):
+            pyxel.init(
+                width = settings.GRID_WIDTH * 8,
+                height = (settings.GRID_HEIGHT * 8) + 8,
+                title = settings.TITLE,
+                fps = settings.FPS,
+                display_scale = settings.SCALE
+                )
+        #Only the sprites are needed up front, levels are compiled into the level cache as they're played
+        with startup.phase("load sprites"):
+            self._assets = AssetManager()
+            self._assets.load_image_banks()
+
+        with startup.phase("engine"):
+            self._engine = SnekEngine(levels = None if settings.PROCEDURAL_LEVELS else self._assets.levels,
+                                      level = starting_level, seed = seed)
+        self._assets.levels = self._engine.levels #Prefetch from wherever the engine's levels come from
+        #Worlds bigger than the screen scroll with the snake, levels fit on the screen
+        self._renderer = LayeredRenderer() if self._engine.world_size is None else ViewportRenderer()
+        #Frames go through the recorder when recording, so every input ends up in the replay
+        self._recorder = None
+        if settings.REPLAY_RECORD:
+            from common.replay import ReplayRecorder #Only imported when recording, like the profiler below
+            self._recorder = ReplayRecorder(self._engine)
+        self._frames = self._recorder or self._engine
+        self._history = SnapshotRing(settings.REWIND_SECONDS * settings.TICK_RATE + 1) #State after each of the last ticks
         self._space_released = True
+        self._autopilot = Autopilot() if settings.AUTOPILOT else None #Steers instead of the player when set
+        self._inputs = InputQueue() #Direction presses waiting for a tick
+        self._timestep = FixedTimestep() #The snake moves settings.TICK_RATE times a second, whatever the frame rate
+        self._full_redraw = True #Repaint the whole screen on the next frame
+        self._drawn_grid = None #Grid shown on screen, a new one needs a full repaint
+        self._drawn_overlay = None #Overlay shown on screen, a change needs a full repaint
 
         #Debug variables
         self._frame_count = 0
+        self._profiler = None
+        if settings.PROFILE:
+            from common.profiler import FrameProfiler
+            self._profiler = FrameProfiler()
+        self._engine.profiler = self._profiler
+        self._show_profile = settings.PROFILE #Draw the profiler overlay
 
         #Initialize game variables
-        self.score = 0 
-        self.level = starting_level
         self.game_paused = False
-        self.game_over = False
-        self.controls_reversed = False
 
-        self.start_level(self.level)
+        with startup.phase("start level"):
+            self.start_level(self.level)
         pyxel.run(self.update, self.draw)
 
+    @property
+    def score(self) -> int:
+        return self._engine.score
+    @property
+    def level(self) -> int:
+        return self._engine.level
+    @property
+    def game_over(self) -> bool:
+        return self._engine.game_over
+    @property
+    def controls_reversed(self) -> bool:
+        return self._engine.controls_reversed
+
     def start_level(self, level: int):
         """Starts the specified level."""
         self.pause()
         self.reset(level)
-        self.set_camera()
 
     def set_camera(self):
-        """Sets the camera to the current level."""
-        pyxel.camera(settings.LEVELS[self.level]['x'], settings.LEVELS[self.level]['y'])
-    def initialize_grid(self, level: int):
-        """Initializes the grid with the current level's tilemap."""
-        return Grid(self._level_map, settings.GRID_WIDTH, settings.GRID_HEIGHT, settings.LEVELS[self.level]['x'], settings.LEVELS[self.level]['y'])
-    def initialize_items(self):
-        """Initializes the item manager."""
-        return ItemManager(self._grid)
-    def initialize_snake(self):
-        """Initializes the snake."""
-        return Snake(self._grid, self._grid.character_start_position)
-    
+        """Points the camera at the snake. Levels are loaded into the grid at (0,0) whichever part
+        of the tilemap they come from, so Pyxel's own camera stays at the origin."""
+        pyxel.camera()
+        if isinstance(self._renderer, ViewportRenderer):
+            self._renderer.center_on(self._engine.grid, self._engine.snake.head)
+
     def clear(self):
         """Clears the screen."""
         pyxel.cls(settings.BACKGROUND_COLOR)
+    def request_full_redraw(self):
+        """Repaints the whole grid on the next frame instead of only the updated tiles."""
+        self._full_redraw = True
     def reset(self, level: int):
         """Initialize snake, score, items, etc."""
-        self.score = 0
-        self.level = level
-        self.game_over = False
-        self.controls_reversed = False
-
         self.clear()
-        self._grid = self.initialize_grid(self.level)
-        self._item_manager = self.initialize_items()
-        self._snake = self.initialize_snake()
+        self._frames.reset(level)
+        self._history.clear()
+        self._history.push(self._engine)
+        self._assets.prefetch_next_level(level)
+        self.set_camera()
+        self.request_full_redraw()
         # pyxel.playm(0, loop = True) #TODO: add music
+    def after_restore(self):
+        """Catches up with a state restored into the engine, then pauses so the player can get their bearings.
+        A recording can't jump between states, so recording starts again from the restored state."""
+        if self._recorder is not None:
+            from common.replay import ReplayRecorder
+            self._recorder = self._frames = ReplayRecorder(self._engine)
+        self._inputs.clear()
+        self.set_camera()
+        self.request_full_redraw()
+        self.pause()
+    def rewind(self):
+        """Rolls the game back about a second."""
+        if self._history.rollback(self._engine, settings.TICK_RATE):
+            self.after_restore()
+    def quick_save(self):
+        """Saves the game to settings.SAVE_FILE."""
+        with open(settings.SAVE_FILE, "wb") as save_file:
+            save_file.write(self._engine.snapshot())
+    def quick_load(self):
+        """Loads the game from settings.SAVE_FILE if there is one."""
+        if not os.path.exists(settings.SAVE_FILE):
+            return
+        with open(settings.SAVE_FILE, "rb") as save_file:
+            self._engine.restore(save_file.read())
+        self._history.clear()
+        self._history.push(self._engine)
+        self.after_restore()
 
     def end(self):
         """Ends the current game."""
-        self.game_over = True
+        self._engine.end()
     def pause(self):
         """Pauses the game."""
         self.game_paused = True
@@ -100,59 +161,44 @@ class SnekGame:
         """Unpauses the game."""
         self.game_paused = False
 
-    def move_snake(self, direction: int):
-        """Checks if the snake can move and moves it."""
-        new_head_position = self._snake.get_next_tile(direction)
-        elongate_snake = False
-
-        #Check if the snake is going to collide with itself or an item
-        if new_head_position.tile_type in [
-            "snake_body_straight",
-            "snake_body_left",
-            "snake_body_right",
-            "snake_tail",
-            "wall"
-            ]:
-            self.end() #End the game if the snake is going to collide with itself
-        elif new_head_position.tile_type in [
-            "item_bomb",
-            "item_lemon",
-            "item_apple",
-            "empty"
-            ]:
-            match new_head_position.tile_type:
-                case "empty": #Does nothing
-                    pass
-                case "item_bomb": #Explodes the snake
-                    self._grid.update_tile(*new_head_position.grid_coordinates,
-                                          "animation.exploding_bomb", is_animated = True, animation_cycles = 1)
-                    self.end()
-                    pass
-                case "item_lemon": #Reverses controls until an apple is eaten
-                    if self.controls_reversed:
-                        self.score += 3
-                    self.controls_reversed = True
-                    elongate_snake = True
-                    pass
-                case "item_apple": #Makes the snake longer
-                    if self.controls_reversed == True:
-                        self.controls_reversed = False
-                        self.score += 3
-                    else:
-                        self.score += 1
-                    elongate_snake = True
-                    pass
-                case _:
-                    pass
-            if not self.game_over:
-                self._snake.move_forward(direction, elongate_snake)
-                if elongate_snake:
-                    self._item_manager.remove_item(new_head_position.grid_coordinates)
+    def read_pressed_directions(self) -> list:
+        """Returns the directions of the arrow or WASD keys pressed since the last frame."""
+        keys = ((pyxel.KEY_UP, pyxel.KEY_W, "up"), (pyxel.KEY_DOWN, pyxel.KEY_S, "down"),
+                (pyxel.KEY_LEFT, pyxel.KEY_A, "left"), (pyxel.KEY_RIGHT, pyxel.KEY_D, "right"))
+        return [settings.DIRECTIONS[name] for arrow_key, letter_key, name in keys
+                if pyxel.btnp(arrow_key) or pyxel.btnp(letter_key)]
+    def read_direction(self) -> int:
+        """Returns the direction of the arrow or WASD key being held, or None."""
+        if pyxel.btn(pyxel.KEY_UP) or pyxel.btn(pyxel.KEY_W):
+            return settings.DIRECTIONS["up"]
+        elif pyxel.btn(pyxel.KEY_DOWN) or pyxel.btn(pyxel.KEY_S):
+            return settings.DIRECTIONS["down"]
+        elif pyxel.btn(pyxel.KEY_LEFT) or pyxel.btn(pyxel.KEY_A):
+            return settings.DIRECTIONS["left"]
+        elif pyxel.btn(pyxel.KEY_RIGHT) or pyxel.btn(pyxel.KEY_D):
+            return settings.DIRECTIONS["right"]
+        return None
 
     def update(self):
-        """Update game logic."""
-
-        self._grid.update()
+        """Update game logic, timing it if profiling is on."""
+        if self._profiler is None:
+            self.update_game()
+            return
+        self._profiler.begin_frame()
+        started = self._profiler.start()
+        self.update_game()
+        self._profiler.stop("update", started)
+        if pyxel.btnp(pyxel.KEY_F1):
+            self._show_profile = not self._show_profile
+        if pyxel.btnp(pyxel.KEY_F2):
+            self._profiler.export_json(settings.PROFILE_OUTPUT + ".json")
+            self._profiler.export_csv(settings.PROFILE_OUTPUT + ".csv")
+    def save_replay(self):
+        """Saves the recording so far if recording is on."""
+        if self._recorder is not None:
+            self._recorder.save(settings.REPLAY_RECORD)
+    def update_game(self):
+        """Reads input every frame and runs the simulation ticks that are due."""
 
         # Pause/unpause game if space is pressed
         if pyxel.btn(pyxel.KEY_SPACE):
@@ -171,51 +217,106 @@ class SnekGame:
         else:
             self._space_released = True
 
-        
-        if not (self.game_paused or self.game_over):
-            # Update game if not paused       
-            if not self.game_over and not self.game_paused:   
-                # Check for key presses and change direction accordingly
-                current_direction = self._snake.body[0]._rotation
-                new_direction = None
-                # Ensure the snake doesn't double back on itself
-                if pyxel.btn(pyxel.KEY_UP) or pyxel.btn(pyxel.KEY_W):
-                    if not current_direction == settings.DIRECTIONS["down"]:
-                        new_direction = settings.DIRECTIONS["up"]
-                elif pyxel.btn(pyxel.KEY_DOWN) or pyxel.btn(pyxel.KEY_S):
-                    if not current_direction == settings.DIRECTIONS["up"]:
-                        new_direction = settings.DIRECTIONS["down"]
-                elif pyxel.btn(pyxel.KEY_LEFT) or pyxel.btn(pyxel.KEY_A):
-                    if not current_direction == settings.DIRECTIONS["right"]:
-                        new_direction = settings.DIRECTIONS["left"]
-                elif pyxel.btn(pyxel.KEY_RIGHT) or pyxel.btn(pyxel.KEY_D):
-                    if not current_direction == settings.DIRECTIONS["left"]:
-                        new_direction = settings.DIRECTIONS["right"]        
-            
-            if settings.DEBUG:
-                print("New direction:", new_direction)
-                print("Before move - Snake body coordinates:", [tile.grid_coordinates for tile in self._snake.body])
-
-            if new_direction is not None and new_direction != current_direction:
-                if self.controls_reversed: #TODO: verify snake can't double back on itself
-                    # Reverse the direction if controls are reversed
-                    new_direction = (new_direction + 2) % 4
-                self.move_snake(new_direction)
-            else:
-                self.move_snake(current_direction)
-                if settings.DEBUG:
-                    print("After move - Snake body coordinates:", [tile.grid_coordinates for tile in self._snake.body])
-                    print("New head position coordinates:", self._snake.body[0].grid_coordinates)
-
-            #Update the items if the game is not over
-            if not self.game_over:
-                self._item_manager.update()
+        if pyxel.btnp(pyxel.KEY_F3):
+            self.save_replay()
+        if pyxel.btnp(pyxel.KEY_TAB):
+            self._autopilot = None if self._autopilot else Autopilot()
+        if pyxel.btnp(pyxel.KEY_BACKSPACE):
+            self.rewind()
+        if pyxel.btnp(pyxel.KEY_F5):
+            self.quick_save()
+        if pyxel.btnp(pyxel.KEY_F9):
+            self.quick_load()
+
+        for direction in self.read_pressed_directions():
+            self._inputs.push(direction)
+        for _ in range(self._timestep.advance()):
+            self.update_tick()
+    def update_tick(self):
+        """Advances the game one simulation tick."""
+        if self.game_paused or self.game_over:
+            self._inputs.clear() #Don't act on presses from before the game was running
+            self._frames.idle() #Keep animations running
+            return
+
+        if self._autopilot is not None:
+            new_direction = self._autopilot(self._engine)
+        else:
+            new_direction = self._inputs.pop()
+            if new_direction is None:
+                new_direction = self.read_direction() #Keep steering towards a held key
+        if settings.DEBUG:
+            print("New direction:", new_direction)
+            print("Before move - Snake body coordinates:", [tile.grid_coordinates for tile in self._engine.snake.body])
+
+        self._frames.step(new_direction)
+        self._history.push(self._engine)
+        if self.game_over:
+            self.save_replay()
+
+        if settings.DEBUG:
+            print("After move - Snake body coordinates:", [tile.grid_coordinates for tile in self._engine.snake.body])
+            print("New head position coordinates:", self._engine.snake.body[0].grid_coordinates)
 
     def draw(self):
+        """Draw game graphics, timing them if profiling is on."""
+        if self._startup is not None:
+            self.report_startup()
+            return
+        if self._profiler is None:
+            self.draw_game()
+            return
+        blits = self._renderer.blits
+        self._profiler.count("tile_updates", len(self._engine.grid.updated_tiles))
+        started = self._profiler.start()
+        self.draw_game()
+        self._profiler.stop("draw", started)
+        self._profiler.count("blits", self._renderer.blits - blits)
+        self._profiler.end_frame()
+        if self._show_profile:
+            self.draw_profile()
+    def report_startup(self):
+        """Draws the first frame and prints how long it took to get there."""
+        startup, self._startup = self._startup, None
+        with startup.phase("first frame"):
+            self.draw_game()
+        startup.finish()
+        startup.report()
+    def draw_profile(self):
+        """Draws frame time and phase percentiles over the bottom of the grid."""
+        profiler = self._profiler
+        milliseconds = lambda name: "/".join(f"{value * 1000:.2f}" for value in profiler.percentiles(name))
+        lines = [
+            f"frame p50/95/99 {milliseconds('frame_time')}ms of {profiler.budget * 1000:.0f}",
+            *(f"{phase} {milliseconds(phase)}ms" for phase in ("update", "grid.update", "move_snake", "item_manager.update", "draw")),
+            "p95 blits {} tiles {} allocs {}".format(*(profiler.percentiles(name)[1] for name in ("blits", "tile_updates", "allocated_blocks"))),
+        ]
+        top = pyxel.height - len(lines) * 7 - 2
+        pyxel.rect(0, top, pyxel.width, pyxel.height - top, 1)
+        for i, line in enumerate(lines):
+            pyxel.text(2, top + 2 + i * 7, line, pyxel.COLOR_YELLOW)
+
+    def draw_game(self):
         """Draw game graphics."""
 
-        self.clear() #Clear the screen
-        self._grid.draw_all_tiles() #Draw the grid
+        grid = self._engine.grid
+        if self._renderer.follow(grid, self._engine.snake.head):
+            self.request_full_redraw() #Everything on screen moved
+        overlay = ("game_over" if self.game_over else "paused" if self.game_paused else None, self._show_profile)
+        if self._drawn_grid is not grid or self._drawn_overlay != overlay:
+            self.request_full_redraw() #Level changed or an overlay appeared/disappeared
+            self._drawn_grid = grid
+            self._drawn_overlay = overlay
+        if self._full_redraw or not settings.RETAINED_RENDERING:
+            self.clear() #Clear the screen
+            self._renderer.draw_all_tiles(grid) #Draw the grid
+            self._full_redraw = False
+        else:
+            self._renderer.draw_updated_tiles(grid) #Only redraw what changed since the last frame
+        if settings.INTERPOLATE_MOVEMENT and not (self.game_paused or self.game_over):
+            #Slide the head towards where it will be on the next tick
+            next_direction = self._engine.resolve_direction(self._inputs.peek())
+            self._renderer.draw_moving_tile(grid, self._engine.snake.head, next_direction, self._timestep.progress())
 
         # Draw the score with dark blue background
         pyxel.rect(0, 0, pyxel.width, 10, 1)
@@ -227,20 +328,21 @@ class SnekGame:
 
         if self.game_over:
             #Draw the game over screen
-            pyxel.text(center_text("GAME OVER", pyxel.width), 
-                   pyxel.height // 2, 
-                   "GAME OVER", 
+            pyxel.text(center_text("GAME OVER", pyxel.width),
+                   pyxel.height // 2,
+                   "GAME OVER",
                    pyxel.COLOR_RED)
-            pyxel.text(center_text("press SPACE to restart", pyxel.width), 
-                    pyxel.height // 2 + 10, 
-                    "press SPACE to restart", 
+            pyxel.text(center_text("press SPACE to restart", pyxel.width),
+                    pyxel.height // 2 + 10,
+                    "press SPACE to restart",
                     pyxel.COLOR_WHITE)
         elif self.game_paused:
             #Draw the start screen
             for i, line in enumerate(settings.START_TEXT):
                 pyxel.text(center_text(line, pyxel.width),
-                        pyxel.height // 2 - 20 + (i * 10), 
-                        line, 
+                        pyxel.height // 2 - 20 + (i * 10),
+                        line,
                         pyxel.COLOR_WHITE)
-    
-SnekGame()
\ No newline at end of file
+
+if __name__ == "__main__":
+    SnekGame()
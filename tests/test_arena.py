@@ -0,0 +1,89 @@
+import settings
+import numpy as np
+from common.arena import Arena
+from common.engine import ITEM_APPLE
+from common.snake import SNAKE_HEAD, SNAKE_BODY_STRAIGHT, SNAKE_BODY_LEFT, SNAKE_BODY_RIGHT, SNAKE_TAIL
+
+SNAKE_CODES = [SNAKE_HEAD, SNAKE_BODY_STRAIGHT, SNAKE_BODY_LEFT, SNAKE_BODY_RIGHT, SNAKE_TAIL]
+UP, RIGHT, DOWN, LEFT = (settings.DIRECTIONS[name] for name in ("up", "right", "down", "left"))
+
+def empty_arena() -> Arena:
+    arena = Arena(12, 12, level = None, seed = 1)
+    arena.item_manager.spawn_interval = 10 ** 9 #Items are placed by the tests
+    return arena
+
+def place_snake(arena: Arena, cells: list, direction: int):
+    """Adds a player whose snake is on the given (x, y) cells, head first, heading in direction."""
+    player = arena.join()
+    arena.clear_snakes([player.slot])
+    cells = [arena.grid.index(x, y) for x, y in cells]
+    arena.types[cells] = [SNAKE_HEAD] + [SNAKE_BODY_STRAIGHT] * (len(cells) - 2) + [SNAKE_TAIL]
+    arena.rotations[cells] = direction
+    arena.owners[cells] = player.slot
+    arena.toward_head[cells[1:]] = cells[:-1]
+    arena.alive[player.slot] = True
+    arena.heads[player.slot], arena.tails[player.slot], arena.lengths[player.slot] = cells[0], cells[-1], len(cells)
+    arena.directions[player.slot] = direction
+    return player
+
+def assert_consistent(arena: Arena):
+    """Every live snake's cells, followed from its tail, are owned by it and are the only snake tiles."""
+    snake_cells = set()
+    for slot in np.flatnonzero(arena.alive).tolist():
+        cell = int(arena.tails[slot])
+        for _ in range(int(arena.lengths[slot])):
+            assert arena.owners[cell] == slot
+            snake_cells.add(cell)
+            cell = int(arena.toward_head[cell])
+    assert set(np.flatnonzero(arena.owners >= 0).tolist()) == snake_cells
+    assert set(np.flatnonzero(np.isin(arena.types, SNAKE_CODES)).tolist()) == snake_cells
+
+def test_equal_length_snakes_meeting_head_on_both_die():
+    arena = empty_arena()
+    left = place_snake(arena, [(3, 4), (2, 4), (1, 4)], RIGHT)
+    right = place_snake(arena, [(5, 4), (6, 4), (7, 4)], LEFT)
+    arena.step()
+    assert not left.alive and not right.alive
+    assert left.death_cause == right.death_cause == "head-on"
+    assert left.kills == right.kills == 0
+    assert_consistent(arena)
+
+def test_longer_snake_survives_a_head_on():
+    arena = empty_arena()
+    longer = place_snake(arena, [(3, 4), (2, 4), (1, 4), (0, 4)], RIGHT)
+    shorter = place_snake(arena, [(5, 4), (6, 4), (7, 4)], LEFT)
+    arena.step()
+    assert longer.alive and not shorter.alive
+    assert shorter.death_cause == "head-on"
+    assert longer.head == arena.grid.index(4, 4) and longer.kills == 1
+    assert_consistent(arena)
+
+def test_moving_onto_a_tail_that_moves_away_is_allowed():
+    arena = empty_arena()
+    mover = place_snake(arena, [(3, 4), (2, 4), (1, 4)], RIGHT)
+    leaver = place_snake(arena, [(4, 2), (4, 3), (4, 4)], UP)
+    arena.step()
+    assert mover.alive and leaver.alive
+    assert mover.head == arena.grid.index(4, 4)
+    assert arena.tails[leaver.slot] == arena.grid.index(4, 3)
+    assert_consistent(arena)
+
+def test_moving_onto_the_tail_of_a_snake_that_is_eating_kills():
+    arena = empty_arena()
+    mover = place_snake(arena, [(3, 4), (2, 4), (1, 4)], RIGHT)
+    eater = place_snake(arena, [(4, 2), (4, 3), (4, 4)], UP)
+    arena.grid.set_tile(arena.grid.index(4, 1), ITEM_APPLE)
+    arena.step()
+    assert not mover.alive and eater.alive
+    assert mover.death_cause == "snake"
+    assert eater.kills == 1 and eater.length == 4 and eater.score == 1
+    assert_consistent(arena)
+
+def test_a_snake_can_follow_its_own_tail():
+    """Unlike in SnekEngine, where the tail still counts as part of the snake when the head moves."""
+    arena = empty_arena()
+    circler = place_snake(arena, [(4, 4), (5, 4), (5, 5), (4, 5)], LEFT)
+    arena.steer(circler.player_id, DOWN)
+    arena.step()
+    assert circler.alive and circler.head == arena.grid.index(4, 5)
+    assert_consistent(arena)
@@ -0,0 +1,43 @@
+import socket, threading
+import pytest
+from common.arena_client import ArenaClient
+from common.arena_protocol import frame, encode_keyframe, WELCOME, WELCOME_PAYLOAD, STATUS, STATUS_PAYLOAD
+from common.grid import Grid, TILE_CODES
+
+def serve_once(messages: bytes) -> tuple:
+    """Listens on a free local port and sends messages in a single write to the first connection.
+    Returns the port and the thread, which closes the connection once the client has."""
+    listener = socket.create_server(("127.0.0.1", 0))
+    def send():
+        connection, _ = listener.accept()
+        with connection:
+            connection.sendall(messages)
+            connection.shutdown(socket.SHUT_WR) #Nothing more to send
+            connection.recv(1) #Wait for the client to close
+        listener.close()
+    thread = threading.Thread(target = send, daemon = True)
+    thread.start()
+    return listener.getsockname()[1], thread
+
+def test_keyframe_and_status_sent_with_the_welcome_are_applied():
+    grid = Grid(None, 16, 12)
+    grid.set_tile(grid.index(5, 7), TILE_CODES["wall"])
+    messages = (frame(WELCOME, WELCOME_PAYLOAD.pack(3, grid.width, grid.height, 8)) + encode_keyframe(grid, 42)
+                + frame(STATUS, STATUS_PAYLOAD.pack(9, grid.index(2, 2), True)))
+    port, thread = serve_once(messages)
+    client = ArenaClient("127.0.0.1", port)
+    try:
+        assert client.player_id == 3
+        assert client.grid is not None #Without waiting for the next periodic keyframe
+        assert client.tick == 42
+        assert client.grid.types == grid.types
+        assert (client.score, client.head, client.alive) == (9, grid.index(2, 2), True)
+    finally:
+        client.close()
+        thread.join(5)
+
+def test_connection_closed_before_the_welcome_raises():
+    port, thread = serve_once(b"")
+    with pytest.raises(ConnectionError):
+        ArenaClient("127.0.0.1", port)
+    thread.join(5)
@@ -0,0 +1,91 @@
+import random
+import numpy as np
+import settings
+from common.batch_env import BatchEnv, SNAKE_HEAD, SNAKE_BODY, SNAKE_TAIL
+from common.engine import SnekEngine
+from common.grid import TILE_CODES, EMPTY
+
+ITEM_CODES = [TILE_CODES[item_type] for item_type in settings.ITEM_PROBABILITY]
+SNAKE_CODES = [SNAKE_HEAD, SNAKE_BODY, SNAKE_TAIL]
+NO_SPAWNS = 10 ** 9 #Spawn interval that never comes round, items are placed by the test instead
+
+def place_item(env: BatchEnv, game: int, index: int, item_code: int):
+    """Puts an item on an empty tile of a game like update_items() would."""
+    slot = int(np.argmax(env.item_tiles[game] < 0))
+    env.tiles[game, index] = item_code
+    env.item_tiles[game, slot] = index
+    env.item_despawn_tick[game, slot] = env.ticks[game] + env.despawn_ticks
+
+def start_engine(seed: int) -> SnekEngine:
+    engine = SnekEngine(seed = seed)
+    engine.item_manager.spawn_interval = NO_SPAWNS
+    return engine
+
+def test_batch_games_follow_the_engine_rules():
+    """Every game in the batch gets the same inputs and items as its own SnekEngine, and must end up
+    with the same score, length, controls and done flags, with its snake on the same tiles."""
+    games = 8
+    env = BatchEnv(games, seed = 1)
+    env.spawn_ticks = NO_SPAWNS
+    engines = [start_engine(seed) for seed in range(games)]
+    inputs = random.Random(2)
+    finished = 0
+    for _ in range(600):
+        for game, engine in enumerate(engines):
+            if inputs.random() < 0.2: #Same item on the same empty tile in both, often right next to the head
+                index = engine.grid.neighbor(engine.snake.head, inputs.randrange(4))
+                if engine.grid.types[index] != EMPTY or inputs.random() < 0.3:
+                    index = engine.grid.empty_tiles.choice(inputs)
+                item_code = inputs.choice(ITEM_CODES)
+                assert env.tiles[game, index] == EMPTY
+                engine.grid.set_tile(index, item_code)
+                place_item(env, game, index, item_code)
+        directions = [inputs.choice((0, 1, 2, 3)) if inputs.random() < 0.3 else -1 for _ in range(games)]
+        _, rewards, dones = env.step(np.array(directions))
+        for game, engine in enumerate(engines):
+            score = engine.score
+            engine.step(None if directions[game] < 0 else directions[game])
+            assert bool(dones[game]) == engine.game_over
+            assert rewards[game] == engine.score - score
+            if engine.game_over:
+                assert env.final_score[game] == engine.score
+                engines[game] = start_engine(game)
+                finished += 1
+                continue
+            assert env.score[game] == engine.score
+            assert env.length[game] == engine.snake.length
+            assert env.controls_reversed[game] == engine.controls_reversed
+            assert set(np.flatnonzero(np.isin(env.tiles[game], SNAKE_CODES)).tolist()) == set(engine.snake.cells())
+    assert finished > 0
+
+def test_batch_invariants_hold_with_random_spawns():
+    """Snake tiles match each snake's length and item tiles match the item slots, every tick."""
+    games = 32
+    env = BatchEnv(games, seed = 3)
+    directions = np.random.default_rng(4)
+    for _ in range(800):
+        env.step(directions.integers(-1, 4, size = games))
+        for game in range(games):
+            tiles = env.tiles[game]
+            assert np.count_nonzero(np.isin(tiles, SNAKE_CODES)) == env.length[game]
+            assert np.count_nonzero(tiles == SNAKE_HEAD) == 1
+            items = env.item_tiles[game][env.item_tiles[game] >= 0]
+            assert set(np.flatnonzero(np.isin(tiles, ITEM_CODES)).tolist()) == set(items.tolist())
+            assert (env.item_despawn_tick[game][env.item_tiles[game] >= 0] > env.ticks[game]).all()
+
+def test_a_game_replays_from_its_seed_in_any_slot_of_any_batch():
+    def play(games: int, slot: int) -> list:
+        env = BatchEnv(games, seed = 5)
+        mask = np.zeros(games, dtype = bool)
+        mask[slot] = True
+        env.reset(mask, np.array([1234], dtype = np.uint64))
+        alive = np.ones(games, dtype = bool)
+        frames = []
+        for tick in range(800):
+            if tick == 200:
+                env.reset(~mask) #Other games restarting mustn't change this one
+            env.update_items(alive)
+            env.ticks += 1
+            frames.append(env.tiles[slot].copy())
+        return frames
+    assert all((a == b).all() for a, b in zip(play(2, 1), play(40, 17)))
@@ -0,0 +1,29 @@
+import settings
+import pytest
+from common.engine import SnekEngine
+
+UP, DOWN = settings.DIRECTIONS["up"], settings.DIRECTIONS["down"]
+
+@pytest.mark.parametrize("controls_reversed", [False, True])
+def test_snake_never_doubles_back(controls_reversed):
+    engine = SnekEngine(seed = 20)
+    engine.controls_reversed = controls_reversed
+    for current in range(4):
+        engine.grid.rotations[engine.snake.head] = current
+        for requested in (None, *range(4)):
+            direction = engine.resolve_direction(requested)
+            assert direction != (current + 2) % 4
+            if requested is not None and requested % 2 != current % 2: #Turns, the other way with reversed controls
+                assert direction == ((requested + 2) % 4 if controls_reversed else requested)
+            else:
+                assert direction == current
+
+@pytest.mark.parametrize("controls_reversed", [False, True])
+def test_asking_to_double_back_keeps_going(controls_reversed):
+    engine = SnekEngine(seed = 21)
+    engine.controls_reversed = controls_reversed
+    assert engine.snake.direction == UP
+    head = engine.snake.head
+    engine.step(DOWN)
+    assert not engine.game_over
+    assert engine.snake.head == engine.grid.neighbor(head, UP)
@@ -0,0 +1,32 @@
+from common.grid import Grid, TILE_CODES, EMPTY
+
+class BlankTilemap:
+    """Tilemap of empty tiles, all drawn from the same column of the spritesheet, which is their rotation."""
+    def __init__(self, column: int = 0):
+        self.column = column
+    def pget(self, x: int, y: int) -> tuple:
+        return (self.column, 0)
+
+def test_rotating_an_empty_tile_keeps_it_in_the_empty_index():
+    grid = Grid(BlankTilemap(), 8, 8, 0, 0)
+    index = grid.index(3, 4)
+    grid.set_tile(index, EMPTY, 1)
+    assert grid.types[index] == EMPTY
+    assert grid.rotations[index] == 1
+    assert index in grid.empty_tiles
+    assert len(grid.empty_tiles) == grid.total_tiles
+
+def test_loading_rotated_empty_tiles_keeps_them_in_the_empty_index():
+    grid = Grid(BlankTilemap(column = 1), 8, 8, 0, 0)
+    assert sorted(grid.empty_tiles) == list(range(grid.total_tiles))
+
+def test_empty_index_follows_tiles_becoming_and_stopping_being_empty():
+    grid = Grid(BlankTilemap(), 8, 8, 0, 0)
+    index = grid.index(3, 4)
+    grid.set_tile(index, TILE_CODES["wall"], 2)
+    grid.set_tile(index, TILE_CODES["wall"], 3)
+    assert index not in grid.empty_tiles
+    assert len(grid.empty_tiles) == grid.total_tiles - 1
+    grid.set_tile(index, EMPTY, 1)
+    assert index in grid.empty_tiles
+    assert len(grid.empty_tiles) == grid.total_tiles
@@ -0,0 +1,27 @@
+import random
+from common.engine import SnekEngine, ITEM_APPLE, ITEM_LEMON
+from common.grid import EMPTY, TILE_CODES
+from common.pathfinding import DistanceField
+from common.policies import Autopilot
+
+def full_rebuild(field: DistanceField) -> list:
+    """Returns the distances a field following nothing computes from scratch."""
+    fresh = DistanceField(field.grid, (ITEM_APPLE, ITEM_LEMON), (EMPTY,))
+    fresh.detach()
+    return fresh.distances.tolist()
+
+def test_incremental_updates_match_a_full_rebuild_every_tick():
+    engine = SnekEngine(seed = 9)
+    autopilot = Autopilot()
+    changes = random.Random(10)
+    wall = TILE_CODES["wall"]
+    for _ in range(400):
+        engine.step(autopilot(engine))
+        if engine.game_over:
+            engine.reset(engine.level)
+            engine.step(autopilot(engine)) #Follows the new grid
+        if changes.random() < 0.2: #Walls coming and going, on top of the snake and items moving
+            index = changes.randrange(engine.grid.total_tiles)
+            if engine.grid.types[index] in (EMPTY, wall) and not engine.snake.occupies(index):
+                engine.grid.set_tile(index, wall if engine.grid.types[index] == EMPTY else EMPTY)
+        assert autopilot.field.distances.tolist() == full_rebuild(autopilot.field)
@@ -0,0 +1,23 @@
+from common.engine import SnekEngine
+from common.policies import Autopilot, greedy
+
+def test_autopilot_steers_like_greedy_in_big_worlds_without_a_field():
+    engine = SnekEngine(seed = 11, world_size = (1024, 1024))
+    autopilot = Autopilot()
+    for _ in range(300):
+        direction = autopilot(engine)
+        assert direction == greedy(engine)
+        engine.step(direction)
+        if engine.game_over:
+            break
+    assert autopilot.field is None
+    assert engine.score > 0
+
+def test_autopilot_drops_its_field_when_moved_to_a_big_world():
+    autopilot = Autopilot()
+    level = SnekEngine(seed = 12)
+    autopilot(level)
+    field = autopilot.field
+    assert field.tile_changed in level.grid.listeners
+    autopilot(SnekEngine(seed = 12, world_size = (256, 256)))
+    assert autopilot.field is None and field.tile_changed not in level.grid.listeners
@@ -0,0 +1,44 @@
+import random
+from common.engine import SnekEngine
+from common.grid import EMPTY, TILE_CODES
+from common.policies import cautious
+from common.regions import Regions
+
+WALL = TILE_CODES["wall"]
+
+def build_walls(engine: SnekEngine):
+    """Splits level 1 into four regions with a wall across the middle each way, the snake in the bottom right one."""
+    grid = engine.grid
+    for i in range(grid.width):
+        grid.set_tile(grid.index(i, 16), WALL)
+        grid.set_tile(grid.index(16, i), WALL)
+
+def assert_index_matches_grid(regions: Regions):
+    grid = regions.grid
+    for region, cells in enumerate(regions.cells):
+        start, count = regions._starts[region], regions.empty_count(region)
+        indexed = regions._members[start:start + count]
+        for position, index in enumerate(indexed, start):
+            assert grid.types[index] == EMPTY
+            assert regions.region(index) == region
+            assert regions._slots[index] == position
+        assert sorted(indexed) == sorted(cell for cell in cells if grid.types[cell] == EMPTY)
+
+def test_empty_tile_index_and_spawns_follow_the_regions():
+    engine = SnekEngine(level = 1, seed = 13)
+    moves = random.Random(14)
+    spawned = 0
+    for _ in range(1500):
+        if engine.game_over or engine.tick == 0:
+            engine.reset(1)
+            build_walls(engine)
+            regions = engine.regions
+            assert len(regions.sizes) == 4
+        items = set(engine.item_manager.items)
+        engine.step(cautious(engine) if moves.random() < 0.9 else moves.randrange(4))
+        assert_index_matches_grid(regions)
+        head_region = regions.region(engine.snake.head)
+        for index in set(engine.item_manager.items) - items:
+            assert regions.region(index) == head_region
+            spawned += 1
+    assert spawned > 10
@@ -0,0 +1,35 @@
+import sys
+import benchmarks.stub_pyxel as stub_pyxel
+sys.modules["pyxel"] = stub_pyxel #Draw into the stub instead of a window, like the benchmarks
+
+from common.grid import Grid, TILE_CODES
+from common.renderer import LayeredRenderer, IMAGE_BANK_SIZE
+
+WALL = TILE_CODES["wall"]
+
+def walled_grid(width: int, height: int) -> Grid:
+    """Returns an empty grid with a wall along its last column, the one furthest into the image bank."""
+    grid = Grid(None, width, height)
+    for y in range(height):
+        grid.set_tile(grid.index(width - 1, y), WALL)
+    return grid
+
+def test_grid_that_fits_the_image_bank_is_prerendered():
+    renderer = LayeredRenderer()
+    grid = walled_grid(32, 32)
+    stub_pyxel.reset_calls()
+    renderer.draw_all_tiles(grid)
+    assert stub_pyxel.calls["image.blt"] == grid.height #The wall, drawn once into the layer
+    assert stub_pyxel.calls["blt"] == 1 #The whole layer, with nothing dynamic on top
+
+def test_grid_wider_than_the_image_bank_draws_every_tile():
+    renderer = LayeredRenderer()
+    grid = walled_grid(IMAGE_BANK_SIZE // 8 + 8, 32)
+    stub_pyxel.reset_calls()
+    renderer.draw_all_tiles(grid)
+    assert stub_pyxel.calls["image.blt"] == 0
+    assert stub_pyxel.calls["blt"] == grid.total_tiles #Walls past the edge of the image bank included
+    grid.set_tile(grid.index(grid.width - 1, 3), TILE_CODES["empty"])
+    stub_pyxel.reset_calls()
+    renderer.draw_updated_tiles(grid)
+    assert stub_pyxel.calls["image.blt"] == 0 and stub_pyxel.calls["blt"] == 1
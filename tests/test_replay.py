@@ -0,0 +1,52 @@
+import settings, pytest
+from common.engine import SnekEngine
+from common.policies import greedy
+from common.replay import Replay, ReplayRecorder, state_hash, apply_input, HEADER, IDLE, RESET
+
+SNAPSHOT_INTERVAL = 25
+
+@pytest.fixture(scope = "module")
+def recording(tmp_path_factory) -> tuple:
+    """Records a game over several levels, with idle frames and a restart after every game over.
+    Returns the replay's path and the state hash before every frame."""
+    engine = SnekEngine(level = 1, seed = 8)
+    recorder = ReplayRecorder(engine, SNAPSHOT_INTERVAL)
+    hashes = [state_hash(engine)]
+    for frame in range(400):
+        if engine.game_over or frame in (120, 260):
+            recorder.reset(engine.level % len(settings.LEVELS) + 1)
+        elif frame % 37 == 0:
+            recorder.idle()
+        else:
+            recorder.step(greedy(engine))
+        hashes.append(state_hash(engine))
+    path = tmp_path_factory.mktemp("replay") / "game.snkr"
+    recorder.save(path)
+    return path, hashes
+
+def test_seeking_matches_a_full_resimulation(recording):
+    path, hashes = recording
+    replay = Replay(path)
+    engine = SnekEngine(level = replay.level, seed = replay.seed)
+    offset = 0
+    for frame in range(replay.frame_count + 1):
+        assert state_hash(engine) == hashes[frame]
+        if frame % SNAPSHOT_INTERVAL in (SNAPSHOT_INTERVAL - 1, 0, 1): #Before, on and after each snapshot
+            assert state_hash(replay.seek(frame)) == hashes[frame]
+        if frame < replay.frame_count:
+            offset = apply_input(engine, replay.inputs, offset)
+
+def test_recorded_games_verify(recording):
+    path, _ = recording
+    replay = Replay(path)
+    assert RESET in replay.inputs
+    assert replay.verify()
+
+def test_corrupting_one_input_fails_verification(recording, tmp_path):
+    path, _ = recording
+    data = bytearray(path.read_bytes())
+    assert data[HEADER.size + 3] != IDLE
+    data[HEADER.size + 3] = IDLE #The snake stays put for a tick instead of moving
+    corrupted = tmp_path / "corrupted.snkr"
+    corrupted.write_bytes(bytes(data))
+    assert not Replay(corrupted).verify()
@@ -0,0 +1,49 @@
+import settings, random
+from collections import deque
+from common.grid import Grid
+from common.snake import Snake
+from common.utils import Point
+
+UP, RIGHT, DOWN, LEFT = (settings.DIRECTIONS[name] for name in ("up", "right", "down", "left"))
+
+def start_snake(width: int, height: int) -> tuple:
+    """Returns a snake on an empty wrap-around grid and its cells, head first, as a deque to check it against."""
+    grid = Grid(None, width, height)
+    snake = Snake(grid, Point(width // 2, height // 2))
+    cells = deque(grid.index(width // 2, height // 2 + i) for i in range(settings.SNAKE_START_LENGTH + 2))
+    return snake, cells
+
+def assert_matches(snake: Snake, cells: deque):
+    """The snake's cells are the expected ones in order, and exactly those are marked occupied."""
+    assert list(snake.cells()) == list(cells)
+    assert snake.head == cells[0] and snake.tail == cells[-1] and snake.length == len(cells)
+    occupied = set(cells)
+    assert all(snake.occupies(index) == (index in occupied) for index in range(snake.grid.total_tiles))
+
+def move(snake: Snake, cells: deque, directions, growth: float, rng: random.Random):
+    """Moves the snake in each of the directions, getting longer with the given probability."""
+    grid = snake.grid
+    for direction in directions:
+        elongate = rng.random() < growth
+        snake.move_forward(direction, elongate)
+        cells.appendleft(grid.neighbor(cells[0], direction))
+        if not elongate:
+            cells.pop()
+        assert_matches(snake, cells)
+
+def test_ring_buffer_wraps_past_its_capacity():
+    snake, cells = start_snake(16, 16)
+    rng = random.Random(18)
+    for _ in range(5 * Snake.INITIAL_CAPACITY): #Random turns that never run into the body
+        free = [direction for direction in range(4) if snake.grid.neighbor(cells[0], direction) not in list(cells)[:-1]]
+        move(snake, cells, [rng.choice(free)], 0.0, rng)
+    assert snake._capacity == Snake.INITIAL_CAPACITY
+
+def test_growing_past_capacity_doubles_the_buffer_keeping_the_body():
+    snake, cells = start_snake(8, 512)
+    rng = random.Random(19)
+    zigzag = [UP, RIGHT, UP, LEFT] * 50 #Upwards without ever coming back to a tile
+    move(snake, cells, zigzag[:100], 0.0, rng) #Wrap first, so growing has to unroll the ring
+    move(snake, cells, zigzag[100:], 0.8, rng)
+    assert snake.length > Snake.INITIAL_CAPACITY
+    assert snake._capacity == 2 * Snake.INITIAL_CAPACITY
@@ -0,0 +1,60 @@
+import pytest
+from common.engine import SnekEngine, SNAPSHOT_HEADER
+from common.policies import greedy
+from common.snapshot_ring import SnapshotRing
+
+def play(engine: SnekEngine, ticks: int) -> list:
+    """Steps the engine with the greedy policy and returns the directions it asked for."""
+    directions = []
+    for _ in range(ticks):
+        directions.append(greedy(engine))
+        engine.step(directions[-1])
+    return directions
+
+def test_restoring_a_snapshot_gives_the_same_bytes():
+    engine = SnekEngine(seed = 1)
+    play(engine, 150)
+    snapshot = engine.snapshot()
+    assert engine.score > 0 #Something to restore besides the starting state
+    play(engine, 50)
+    engine.restore(snapshot)
+    assert engine.snapshot() == snapshot
+    fresh = SnekEngine(seed = 2)
+    fresh.restore(snapshot)
+    assert fresh.snapshot() == snapshot
+
+def test_restored_games_play_on_the_same():
+    engine, fresh = SnekEngine(seed = 3), SnekEngine(seed = 4)
+    play(engine, 100)
+    fresh.restore(engine.snapshot())
+    directions = play(engine, 200)
+    for direction in directions:
+        fresh.step(direction)
+    assert fresh.snapshot() == engine.snapshot()
+
+def test_rewinding_and_replaying_the_same_inputs_reaches_the_same_state():
+    engine = SnekEngine(seed = 5)
+    ring = SnapshotRing(30)
+    play(engine, 50)
+    directions = []
+    for _ in range(20):
+        ring.push(engine)
+        directions += play(engine, 1)
+    ring.push(engine)
+    expected = engine.snapshot()
+    assert ring.rollback(engine, 20)
+    assert engine.tick == 50
+    for direction in directions:
+        engine.step(direction)
+    assert engine.snapshot() == expected
+
+@pytest.mark.parametrize("magic, version", [(b"SNKX", None), (None, 999)])
+def test_snapshots_with_the_wrong_magic_or_version_are_rejected(magic, version):
+    engine = SnekEngine(seed = 6)
+    snapshot = bytearray(engine.snapshot())
+    header = list(SNAPSHOT_HEADER.unpack_from(snapshot))
+    header[0] = magic or header[0]
+    header[1] = version or header[1]
+    SNAPSHOT_HEADER.pack_into(snapshot, 0, *header)
+    with pytest.raises(ValueError):
+        SnekEngine(seed = 7).restore(bytes(snapshot))
@@ -0,0 +1,58 @@
+import settings, random
+from collections import Counter
+from common.item_manager import ITEM_TABLE
+from common.grid import TILE_CODES
+from common.utils import IndexedSet, AliasTable
+
+DRAWS = 200000
+TOLERANCE = 0.005 #About four standard deviations at this many draws
+
+def assert_consistent(indexed_set: IndexedSet, expected: set, capacity: int):
+    """The packed members are the expected ones, and the slot of every integer points back at it or is -1."""
+    members, slots = indexed_set.buffers()
+    assert len(indexed_set) == len(expected) and set(indexed_set) == expected
+    for position, member in enumerate(members):
+        assert slots[member] == position
+    for member in range(capacity):
+        assert (member in indexed_set) == (member in expected)
+        if member not in expected:
+            assert slots[member] == -1
+
+def test_indexed_set_keeps_its_slots_consistent():
+    capacity = 50
+    indexed_set, expected = IndexedSet(capacity), set()
+    rng = random.Random(15)
+    for _ in range(2000):
+        member = rng.randrange(capacity)
+        if rng.random() < 0.5:
+            indexed_set.add(member)
+            expected.add(member)
+        else:
+            indexed_set.discard(member)
+            expected.discard(member)
+        assert_consistent(indexed_set, expected, capacity)
+
+def test_discarding_moves_the_last_member_into_the_hole():
+    indexed_set = IndexedSet(10, [4, 7, 2, 9])
+    indexed_set.discard(7)
+    assert list(indexed_set) == [4, 9, 2]
+    assert_consistent(indexed_set, {4, 9, 2}, 10)
+    indexed_set.discard(2) #The last member itself
+    assert_consistent(indexed_set, {4, 9}, 10)
+
+def test_full_set_matches_one_built_member_by_member():
+    assert_consistent(IndexedSet.full(20), set(range(20)), 20)
+
+def test_alias_table_draws_items_in_proportion_to_their_probability():
+    total = sum(settings.ITEM_PROBABILITY.values())
+    rng = random.Random(16)
+    counts = Counter(ITEM_TABLE.choice(rng) for _ in range(DRAWS))
+    for item_type, probability in settings.ITEM_PROBABILITY.items():
+        assert abs(counts[TILE_CODES[item_type]] / DRAWS - probability / total) < TOLERANCE
+
+def test_alias_table_with_uneven_weights():
+    weights = {"a": 1, "b": 2, "c": 3, "d": 10, "e": 0}
+    rng = random.Random(17)
+    counts = Counter(AliasTable(weights).choice(rng) for _ in range(DRAWS))
+    for key, weight in weights.items():
+        assert abs(counts[key] / DRAWS - weight / 16) < TOLERANCE